@@ -0,0 +1,355 @@
+import sqlite3
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ingestDb import (
+    DEFAULT_DB_NAME, DEFAULT_BATCH_SIZE, JSON_PATH_MAPPING, VALIDATION_MODES, TikTokIngester
+)
+from normalizer import PRESETS
+from jsonStream import DEFAULT_CHUNK_SIZE
+from parallelIngest import merge_shard
+from storageLayout import table_layouts, plain_table_sql, storage_table
+from summaryTables import refresh_summaries, rebuild_monthly_activity, verify_row_counts
+
+EXPORT_EXTENSIONS = ('.json', '.zip')
+FILE_STEP = '*'
+
+CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    file_path TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    row_count INTEGER DEFAULT 0,
+    user_id INTEGER,
+    file_size INTEGER,
+    file_mtime REAL,
+    message TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (file_path, table_name)
+);
+'''
+
+
+def ensure_checkpoint_table(conn):
+    conn.executescript(CHECKPOINT_SCHEMA)
+
+
+def discover_exports(directory):
+    """All .json/.zip exports below directory, in a stable order"""
+    found = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(EXPORT_EXTENSIONS):
+                found.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(found)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def _last_signature(path):
+    """_file_signature(), or (None, None) once the file is gone"""
+    try:
+        return _file_signature(path)
+    except OSError:
+        return None, None
+
+
+def load_checkpoints(conn, file_path):
+    """{table_name: (status, row_count, file_size, file_mtime)} for one export"""
+    rows = conn.execute(
+        "SELECT table_name, status, row_count, file_size, file_mtime "
+        "FROM ingest_checkpoints WHERE file_path = ?", (file_path,)
+    ).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def set_checkpoint(conn, file_path, table_name, status, row_count=0, user_id=None,
+                   signature=(None, None), message=None):
+    conn.execute(
+        "INSERT INTO ingest_checkpoints "
+        "(file_path, table_name, status, row_count, user_id, file_size, file_mtime, message) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(file_path, table_name) DO UPDATE SET "
+        "status = excluded.status, row_count = excluded.row_count, "
+        "user_id = COALESCE(excluded.user_id, user_id), file_size = excluded.file_size, "
+        "file_mtime = excluded.file_mtime, message = excluded.message, "
+        "updated_at = CURRENT_TIMESTAMP",
+        (file_path, table_name, status, row_count, user_id, signature[0], signature[1], message)
+    )
+
+
+def _convert_export(task):
+    """Worker: load one export into a private shard database"""
+    export_path, shard_path, table_ddl, batch_size, chunk_size, normalize = task
+
+    conn = sqlite3.connect(shard_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for sql in table_ddl.values():
+        conn.execute(sql)
+    conn.commit()
+
+    ingester = TikTokIngester(shard_path, batch_size=batch_size, verbose=False,
+                              streaming=True, chunk_size=chunk_size, normalize=normalize)
+    ingester.conn = conn
+    try:
+        # ZIP exports stream straight from the archive member
+        result = ingester.ingest_file(export_path)
+    finally:
+        ingester.close()
+
+    result['user'] = ingester.user
+    return export_path, shard_path, result
+
+
+class BatchIngester:
+    """Ingest a directory of exports through a bounded process-pool queue
+
+    Workers turn each export into a shard database; this process is the only
+    writer and merges shards into db_name. Every merged table is recorded in
+    ingest_checkpoints in the same transaction, so an interrupted run resumes
+    with the next unfinished file (and skips tables that were already merged).
+    """
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, workers=None, max_pending=None,
+                 batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                 retry_failed=False, bulk_load=False, validation='triggers', normalize=None,
+                 verbose=True):
+        self.db_name = db_name
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.retry_failed = retry_failed
+        self.normalize = normalize
+        self.verbose = verbose
+        self.ingester = TikTokIngester(db_name, batch_size=batch_size, verbose=False,
+                                       bulk_load=bulk_load, validation=validation)
+        self.results = {'done': 0, 'skipped': 0, 'failed': 0, 'changed': 0, 'records': 0}
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def pending_exports(self, conn, paths):
+        """Exports that still need work, resetting checkpoints of changed files"""
+        todo = []
+        for path in paths:
+            signature = _file_signature(path)
+            checkpoints = load_checkpoints(conn, path)
+            file_state = checkpoints.get(FILE_STEP)
+            if file_state and tuple(file_state[2:]) != signature and file_state[0] != 'changed':
+                if not self.unmerge_export(conn, path, checkpoints):
+                    continue
+                file_state = None
+            # 'changed' files need their old rows removed by hand; --retry-failed would duplicate them
+            if file_state and file_state[0] in ('done', 'changed'):
+                self.results['skipped'] += 1
+                continue
+            if file_state and file_state[0] == 'failed' and not self.retry_failed:
+                self.results['skipped'] += 1
+                continue
+            todo.append(path)
+        return todo
+
+    def unmerge_export(self, conn, path, checkpoints):
+        """Remove the rows a since-changed export merged, so it can be merged again
+
+        Its user's rows are deleted from the tables it merged and the
+        summaries recounted. When another export merged rows for the same
+        user they cannot be told apart, so the file is marked 'changed' and
+        reported instead; returns False in that case.
+        """
+        merged = [table for table, state in checkpoints.items()
+                  if table != FILE_STEP and state[0] == 'done' and state[1]]
+        user_id = conn.execute(
+            "SELECT MAX(user_id) FROM ingest_checkpoints WHERE file_path = ?", (path,)
+        ).fetchone()[0]
+        if merged and user_id is not None:
+            shared = conn.execute(
+                "SELECT file_path FROM ingest_checkpoints WHERE user_id = ? AND file_path != ? "
+                "AND status = 'done' LIMIT 1", (user_id, path)
+            ).fetchone()
+            if shared:
+                set_checkpoint(conn, path, FILE_STEP, 'changed', message=(
+                    f"changed after merging; user {user_id} also has rows from {shared[0]}, "
+                    f"not merged again"))
+                conn.commit()
+                self.results['changed'] += 1
+                self.log(f"  CHANGED {path}: already merged for user {user_id} together with "
+                         f"{shared[0]}; not merged again")
+                return False
+            layouts = table_layouts(conn)
+            try:
+                for table in merged:
+                    conn.execute(f"DELETE FROM {storage_table(table, layouts)} WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM ingest_checkpoints WHERE file_path = ?", (path,))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            refresh_summaries(conn, [user_id])
+            rebuild_monthly_activity(conn, [user_id])
+            verify_row_counts(conn, merged)
+            self.log(f"  {os.path.basename(path)} changed: removed its earlier rows for user {user_id}")
+        else:
+            conn.execute("DELETE FROM ingest_checkpoints WHERE file_path = ?", (path,))
+            conn.commit()
+        return True
+
+    def run(self, directory):
+        started = time.perf_counter()
+        conn = self.ingester.connect()
+        ensure_checkpoint_table(conn)
+
+        paths = self.pending_exports(conn, discover_exports(directory))
+        self.log(f"{len(paths)} export(s) to ingest, {self.results['skipped']} already done or skipped")
+        if not paths:
+            self.ingester.close()
+            return self.summary(started)
+
+        # A bulk load spans the whole run: indexes and triggers come back at the end
+        self.ingester.begin_load()
+
+        tables = sorted({mapping['table'] for mapping in JSON_PATH_MAPPING.values()})
+        # Shards always use plain tables, even when the main database is encoded
+        layouts = table_layouts(conn)
+        table_ddl = {table: plain_table_sql(conn, table, layouts) for table in tables}
+        shard_dir = tempfile.mkdtemp(prefix='tik_batch_', dir=os.path.dirname(os.path.abspath(self.db_name)))
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = {}
+                for index, path in enumerate(paths):
+                    # Bounded queue: never hold more than max_pending exports in flight
+                    while len(pending) >= self.max_pending:
+                        self._drain(conn, pending, FIRST_COMPLETED)
+                    set_checkpoint(conn, path, FILE_STEP, 'running', signature=_file_signature(path))
+                    conn.commit()
+                    shard_path = os.path.join(shard_dir, f"export_{index}.db")
+                    task = (path, shard_path, table_ddl, self.batch_size, self.chunk_size, self.normalize)
+                    pending[pool.submit(_convert_export, task)] = path
+                while pending:
+                    self._drain(conn, pending, FIRST_COMPLETED)
+            if self.ingester.validation == 'set':
+                self.log("Validating merged rows...")
+            self.ingester.finish_load()
+        finally:
+            self.ingester.close()
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+        return self.summary(started)
+
+    def _drain(self, conn, pending, return_when):
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            path = pending.pop(future)
+            try:
+                export_path, shard_path, result = future.result()
+                self.merge_export(conn, export_path, shard_path, result)
+                os.remove(shard_path)
+            except Exception as e:
+                conn.rollback()
+                set_checkpoint(conn, path, FILE_STEP, 'failed',
+                               signature=_last_signature(path), message=str(e))
+                conn.commit()
+                self.results['failed'] += 1
+                self.log(f"  FAILED {path}: {e}")
+
+    def merge_export(self, conn, export_path, shard_path, result):
+        """Merge one converted export, checkpointing each table"""
+        signature = _file_signature(export_path)
+        user_id = self.ingester.register_user(result['user'])
+        checkpoints = load_checkpoints(conn, export_path)
+
+        tables = [
+            table for table, count in result['statistics'].items()
+            if count and table != 'users'
+            and checkpoints.get(table, ('',))[0] != 'done'
+        ]
+
+        def record(conn, table_name, count):
+            self.ingester.record_deltas({table_name: count})
+            set_checkpoint(conn, export_path, table_name, 'done', count, user_id, signature)
+
+        # The registry may resolve the username to an existing or de-collided id
+        merged = merge_shard(conn, shard_path, tables, on_merged=record, user_id=user_id)
+        total = sum(merged.values()) + 1
+        set_checkpoint(conn, export_path, FILE_STEP, 'done', total, user_id, signature)
+        conn.commit()
+
+        self.results['done'] += 1
+        self.results['records'] += total
+        self.log(f"  {os.path.basename(export_path)}: {result['username']} "
+                 f"({total:,} records)")
+
+    def summary(self, started):
+        summary = dict(self.results)
+        summary['elapsed'] = time.perf_counter() - started
+        return summary
+
+
+def ingest_directory(directory, db_name=DEFAULT_DB_NAME, workers=None, max_pending=None,
+                     retry_failed=False, bulk_load=False, validation='triggers', normalize=None):
+    """Convenience wrapper around BatchIngester"""
+    return BatchIngester(db_name, workers=workers, max_pending=max_pending,
+                         retry_failed=retry_failed, bulk_load=bulk_load,
+                         validation=validation, normalize=normalize).run(directory)
+
+
+def checkpoint_report(db_name=DEFAULT_DB_NAME):
+    """Count of exports per file status"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return dict(conn.execute(
+            "SELECT status, COUNT(*) FROM ingest_checkpoints "
+            "WHERE table_name = ? GROUP BY status", (FILE_STEP,)
+        ).fetchall())
+    finally:
+        conn.close()
+
+
+def main():
+    """Command line entry point: python batchIngest.py exports_dir [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Ingest a directory of TikTok exports')
+    parser.add_argument('directory', help='Directory containing .json or .zip exports')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='Maximum exports queued or in flight at once')
+    parser.add_argument('--retry-failed', action='store_true')
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Defer indexes and validation until every export is merged')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers')
+    parser.add_argument('--normalize', nargs='?', const='default', choices=sorted(PRESETS))
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Directory {args.directory} not found!")
+        return
+
+    print("=" * 60)
+    print("TikTok Batch Ingester")
+    print("=" * 60)
+
+    result = ingest_directory(args.directory, args.db_name, workers=args.workers,
+                              max_pending=args.max_pending, retry_failed=args.retry_failed,
+                              bulk_load=args.bulk_load, validation=args.validation,
+                              normalize=args.normalize)
+
+    print(f"\nIngested: {result['done']}  Skipped: {result['skipped']}  Failed: {result['failed']}"
+          f"  Changed (not re-merged): {result['changed']}")
+    print(f"Records loaded: {result['records']:,}")
+    print(f"Total time: {result['elapsed']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
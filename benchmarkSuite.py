@@ -0,0 +1,416 @@
+import sqlite3
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+from statistics import median
+
+from createDb import SCHEMA_SQL, profile_settings
+from ingestDb import JSON_PATH_MAPPING, PROFILE_PATH, VALIDATION_MODES, TikTokIngester
+from schemaManager import build_template, ensure_template, SCHEMA_VERSION
+from validationEngine import run_validation
+
+# rows per table (across all users), users
+SCALES = {
+    'tiny': (1000, 1),
+    'small': (10000, 10),
+    'medium': (100000, 100),
+    'large': (1000000, 1000),
+    'xlarge': (10000000, 10000),
+}
+DEFAULT_VIEW_TIMEOUT = 60.0
+DEFAULT_THRESHOLD = 1.25
+# Rows per key of a dynamic map (chat histories)
+DYNAMIC_GROUP_SIZE = 200
+
+_WORDS = ('dance', 'cat', 'recipe', 'travel', 'music', 'funny', 'news', 'diy', 'fitness', 'art',
+          'gaming', 'prank', 'makeup', 'fashion', 'pets', 'science', 'history', 'cars', 'food', 'tips')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+# 2021-01-01 to 2024-12-31, as Unix seconds
+_DATE_RANGE = (1609459200, 1735603200)
+
+
+def _date_text(rng):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(rng.randint(*_DATE_RANGE)))
+
+
+def _field_value(rng, mapping, source_key, column, index):
+    """A plausible export value for one mapped field"""
+    name = column.lower()
+    if column in mapping.get('date_fields', ()):
+        return _date_text(rng)
+    if column in mapping.get('numeric_fields', ()) or column in mapping.get('integer_fields', ()):
+        return str(rng.randint(0, 50000))
+    if 'link' in name or 'url' in name or 'uri' in name:
+        # A few thousand distinct videos, so links repeat like real exports
+        return f"https://www.tiktokv.com/share/video/{7000000000000000000 + rng.randint(0, 5000)}/"
+    if 'username' in name or source_key in ('From', 'UserName'):
+        return f"user{rng.randint(0, 20000)}"
+    if name.startswith('ip'):
+        return f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+    if name == 'room_id':
+        return str(7200000000000000000 + index)
+    words = rng.randint(1, 12) if 'content' in name or 'text' in name or 'comment' in name else 2
+    return ' '.join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _item(rng, mapping, index):
+    return {source_key: _field_value(rng, mapping, source_key, column, index)
+            for source_key, column in mapping['columns'].items()}
+
+
+def synthetic_profile(username, rng):
+    return {
+        'userName': username,
+        'displayName': username.replace('_', ' ').title(),
+        'emailAddress': f"{username}@example.com",
+        'bioDescription': ' '.join(rng.choice(_WORDS) for _ in range(6)),
+        'birthDate': f"{rng.randint(1, 28):02d}-{rng.choice(_MONTHS)}-{rng.randint(1960, 2008)}",
+        'accountRegion': rng.choice(('US', 'GB', 'DE', 'BR', 'JP')),
+        'followerCount': str(rng.randint(0, 100000)),
+        'followingCount': str(rng.randint(0, 5000)),
+    }
+
+
+def _export_tree():
+    """Nested {key: subtree or (path, mapping, child)} of every mapping
+
+    A nested-array mapping (WatchLiveMap.*.Comments) rides along with the
+    dynamic mapping of its parent path.
+    """
+    tree = {}
+    children = {path.partition('.*.')[0]: (path, mapping) for path, mapping in JSON_PATH_MAPPING.items()
+                if mapping.get('is_nested_array')}
+    for path, mapping in JSON_PATH_MAPPING.items():
+        if mapping.get('is_nested_array'):
+            continue
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = (path, mapping, children.get(path))
+    return tree
+
+
+def _write_leaf(handle, rng, leaf, rows, profile):
+    path, mapping, child = leaf
+    dumps = json.dumps
+    if path == PROFILE_PATH:
+        handle.write(dumps(profile))
+        return
+    if mapping.get('is_array'):
+        handle.write('[')
+        for index in range(rows):
+            handle.write((',' if index else '') + dumps(_item(rng, mapping, index)))
+        handle.write(']')
+        return
+    handle.write('{')
+    if child:
+        # One object per key (a watched live) holding its child row
+        child_path, child_mapping = child
+        child_key = child_path.partition('.*.')[2]
+        for index in range(rows):
+            entry = _item(rng, mapping, index)
+            entry[child_key] = [_item(rng, child_mapping, index)]
+            handle.write((',' if index else '') + dumps(str(7200000000000000000 + index)) + ':' + dumps(entry))
+    else:
+        for group, start in enumerate(range(0, rows, DYNAMIC_GROUP_SIZE)):
+            items = [_item(rng, mapping, index) for index in range(start, min(start + DYNAMIC_GROUP_SIZE, rows))]
+            handle.write((',' if group else '') + dumps(f"Chat History with user{group}:") + ':' + dumps(items))
+    handle.write('}')
+
+
+def _write_tree(handle, rng, node, rows, profile):
+    handle.write('{')
+    for position, (key, value) in enumerate(node.items()):
+        handle.write((',' if position else '') + json.dumps(key) + ':')
+        if isinstance(value, dict):
+            _write_tree(handle, rng, value, rows, profile)
+        else:
+            _write_leaf(handle, rng, value, rows, profile)
+    handle.write('}')
+
+
+def write_synthetic_export(path, username, rows, seed=0):
+    """Write a user_data.json with rows items for every JSON_PATH_MAPPING table
+
+    Items are written one at a time, so memory does not grow with rows.
+    The same username, rows and seed always produce the same file.
+    """
+    rng = random.Random(f"{seed}:{username}")
+    with open(path, 'w', encoding='utf-8') as handle:
+        _write_tree(handle, rng, _export_tree(), rows, synthetic_profile(username, rng))
+    return path
+
+
+def generate_exports(directory, rows, users, seed=0):
+    """One synthetic export per user; rows per table are spread across users"""
+    os.makedirs(directory, exist_ok=True)
+    per_user, extra = divmod(rows, users)
+    paths = []
+    for index in range(users):
+        path = os.path.join(directory, f"user_{index:05d}.json")
+        write_synthetic_export(path, f"bench_user_{index:05d}", per_user + (index < extra), seed)
+        paths.append(path)
+    return paths
+
+
+def time_schema(directory, repeat=3):
+    """Seconds to build the schema by script, to build the template and to copy it"""
+    results = {'script': [], 'template_build': [], 'template_copy': []}
+    for run in range(repeat):
+        path = os.path.join(directory, f"schema_{run}.db")
+        started = time.perf_counter()
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA_SQL)
+        conn.close()
+        results['script'].append(time.perf_counter() - started)
+
+        template = os.path.join(directory, f"template_{run}.db")
+        started = time.perf_counter()
+        build_template(template)
+        results['template_build'].append(time.perf_counter() - started)
+
+        copy = os.path.join(directory, f"copy_{run}.db")
+        started = time.perf_counter()
+        shutil.copyfile(template, copy)
+        results['template_copy'].append(time.perf_counter() - started)
+        for name in (path, template, copy):
+            os.remove(name)
+    return {name: {'median': median(times), 'runs': times} for name, times in results.items()}
+
+
+def time_ingest(db_name, export_paths, **options):
+    """Ingest every export with one TikTokIngester; returns totals and per-table rows/s"""
+    ingester = TikTokIngester(db_name, verbose=False, streaming=True, **options)
+    # Build the schema template up front so it is not part of the timing
+    ensure_template(profile_settings(ingester.pragma_profile).get('page_size', 4096))
+    rows = {}
+    table_seconds = {}
+    started = time.perf_counter()
+    try:
+        for path in export_paths:
+            result = ingester.ingest_file(path)
+            for table, count in result['statistics'].items():
+                rows[table] = rows.get(table, 0) + count
+            for table in result['statistics']:
+                if table in result['timings']:
+                    table_seconds[table] = table_seconds.get(table, 0) + result['timings'][table]
+    finally:
+        ingester.close()
+    elapsed = time.perf_counter() - started
+    total = sum(rows.values())
+    return {
+        'seconds': elapsed,
+        'rows': total,
+        'rows_per_second': total / elapsed if elapsed else 0,
+        'tables': {table: {'rows': count, 'seconds': table_seconds.get(table)} for table, count in rows.items()}
+    }
+
+
+def time_validation(conn):
+    """A full set-based validation pass over every loaded row"""
+    started = time.perf_counter()
+    report = run_validation(conn)
+    conn.commit()
+    return {
+        'seconds': time.perf_counter() - started,
+        'issues': sum(item['issues'] for item in report),
+        'rules': {item['rule']: item['seconds'] for item in report}
+    }
+
+
+def _deadline_handler(deadline):
+    return lambda: 1 if time.perf_counter() > deadline else 0
+
+
+def time_query(conn, sql, repeat=3, timeout=DEFAULT_VIEW_TIMEOUT):
+    """Median seconds to fetch every row of sql; stops a run after timeout"""
+    runs = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.set_progress_handler(_deadline_handler(started + timeout), 10000)
+        try:
+            rows = sum(1 for _ in conn.execute(sql))
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                raise
+            return {'rows': None, 'median': None, 'runs': runs, 'timed_out': True}
+        finally:
+            conn.set_progress_handler(None, 0)
+        runs.append(time.perf_counter() - started)
+    return {'rows': rows, 'median': median(runs), 'runs': runs, 'timed_out': False}
+
+
+def report_views(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='view' AND name LIKE 'vw_%' ORDER BY name"
+    )]
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'schema_version': SCHEMA_VERSION,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def run_benchmark(rows, users, work_dir, seed=0, repeat=3, view_timeout=DEFAULT_VIEW_TIMEOUT,
+                  views=None, verbose=True, **options):
+    """Generate exports, then time schema creation, ingestion, validation and views"""
+    def log(message):
+        if verbose:
+            print(message)
+
+    results = {
+        'environment': environment(),
+        'config': {'rows': rows, 'users': users, 'seed': seed, 'repeat': repeat,
+                   'view_timeout': view_timeout, 'options': options},
+    }
+
+    log(f"Generating {users} export(s) with {rows:,} rows per table...")
+    started = time.perf_counter()
+    export_paths = generate_exports(os.path.join(work_dir, 'exports'), rows, users, seed)
+    results['generate'] = {
+        'seconds': time.perf_counter() - started,
+        'bytes': sum(os.path.getsize(path) for path in export_paths),
+        'rows_per_table': {table: rows for table in sorted({m['table'] for m in JSON_PATH_MAPPING.values()})},
+    }
+
+    log("Timing schema creation...")
+    results['schema'] = time_schema(work_dir, repeat)
+
+    db_name = os.path.join(work_dir, 'bench.db')
+    if os.path.exists(db_name):
+        os.remove(db_name)
+    log("Timing ingestion...")
+    results['ingest'] = time_ingest(db_name, export_paths, **options)
+    log(f"  {results['ingest']['rows']:,} rows in {results['ingest']['seconds']:.2f}s "
+        f"({results['ingest']['rows_per_second']:,.0f} rows/s)")
+
+    conn = sqlite3.connect(db_name)
+    try:
+        log("Timing validation...")
+        results['validation'] = time_validation(conn)
+        conn.execute("ANALYZE")
+        results['views'] = {}
+        for view in views or report_views(conn):
+            log(f"  {view}...")
+            results['views'][view] = time_query(conn, f"SELECT * FROM {view}", repeat, view_timeout)
+    finally:
+        conn.close()
+    results['database_bytes'] = os.path.getsize(db_name)
+    return results
+
+
+def _metrics(results):
+    """Flat {name: seconds} of the timings compared between runs"""
+    metrics = {f"schema.{name}": item['median'] for name, item in results.get('schema', {}).items()}
+    if 'ingest' in results:
+        metrics['ingest'] = results['ingest']['seconds']
+    if 'validation' in results:
+        metrics['validation'] = results['validation']['seconds']
+    for view, item in results.get('views', {}).items():
+        if item['median'] is not None:
+            metrics[f"view.{view}"] = item['median']
+    return metrics
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """[(metric, baseline seconds, current seconds, ratio)] slower than threshold x baseline"""
+    old, new = _metrics(baseline), _metrics(current)
+    regressions = []
+    for name, seconds in new.items():
+        # Sub-millisecond timings are noise
+        if name in old and old[name] > 0.001 and seconds / old[name] > threshold:
+            regressions.append((name, old[name], seconds, seconds / old[name]))
+    return regressions
+
+
+def print_results(results):
+    schema = results['schema']
+    print(f"\nSchema: script {schema['script']['median'] * 1000:.1f}ms, "
+          f"template build {schema['template_build']['median'] * 1000:.1f}ms, "
+          f"template copy {schema['template_copy']['median'] * 1000:.2f}ms")
+    ingest = results['ingest']
+    print(f"Ingest: {ingest['rows']:,} rows in {ingest['seconds']:.2f}s ({ingest['rows_per_second']:,.0f} rows/s)")
+    print(f"Validation: {results['validation']['seconds']:.2f}s ({results['validation']['issues']} issue(s))")
+    print("Views:")
+    for view, item in results['views'].items():
+        if item['timed_out']:
+            print(f"  {view:40} timed out after {results['config']['view_timeout']:.0f}s")
+        else:
+            print(f"  {view:40} {item['median'] * 1000:10.1f}ms  {item['rows']:,} rows")
+    print(f"Database size: {results['database_bytes']:,} bytes")
+
+
+def main():
+    """Command line entry point: python benchmarkSuite.py [--scale small] [--output results.json]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark schema creation, ingestion, validation and views')
+    parser.add_argument('--scale', choices=list(SCALES), default='tiny')
+    parser.add_argument('--rows', type=int, help='Rows per table across all users (overrides --scale)')
+    parser.add_argument('--users', type=int, help='Number of users (overrides --scale)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per schema and view timing')
+    parser.add_argument('--view-timeout', type=float, default=DEFAULT_VIEW_TIMEOUT)
+    parser.add_argument('--view', action='append', dest='views')
+    parser.add_argument('--bulk-load', action='store_true')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers')
+    parser.add_argument('--links', action='store_true')
+    parser.add_argument('--epoch-dates', action='store_true')
+    parser.add_argument('--work-dir', help='Where exports and the database go (default: a temp directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON; exit with status 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    rows, users = SCALES[args.scale]
+    rows = args.rows or rows
+    users = args.users or users
+    if args.compare and not os.path.exists(args.compare):
+        print(f"Results file {args.compare} not found!")
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='tik_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_benchmark(rows, users, work_dir, seed=args.seed, repeat=args.repeat,
+                                view_timeout=args.view_timeout, views=args.views,
+                                bulk_load=args.bulk_load, validation=args.validation,
+                                links=args.links, epoch_dates=args.epoch_dates)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as handle:
+            regressions = compare_results(json.load(handle), results, args.threshold)
+        for name, old, new, ratio in regressions:
+            print(f"  REGRESSION {name}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
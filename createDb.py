@@ -1,26 +1,82 @@
 import sqlite3
 import os
-from google.colab import files
-
-def create_database():
-    """Create SQLite database from schema.sql file"""
-    
-    # Database file name
-    db_name = "tikData.db"
-    
-    print(f"Creating database: {db_name}")
-    
-    # Your updated schema content with FIXED trigger syntax
-    schema_content = '''-- TikTok Database Schema with Multi-User Support
+import re
+import time
+
+from validationEngine import row_watermarks, run_validation
+from storageLayout import table_layouts, layout_statement
+
+# Connection settings per workload, applied by connect(). cache_size is in
+# KiB when negative. page_size only takes effect while a database is empty,
+# and mmap_size is capped by the SQLite build (2 GB by default).
+PRAGMA_PROFILES = {
+    # Everyday reads and writes: WAL, so readers never block the writer
+    'default': {
+        'page_size': 4096,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'locking_mode': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+        'defer_foreign_keys': 'OFF',
+    },
+    # One writer loading a large export: no fsyncs and no shared-memory
+    # locking, a rollback journal kept in memory. A crash mid-load can
+    # corrupt the file, so only use it for databases that can be rebuilt.
+    # Never picked implicitly: ask for it with --pragmas bulk_load.
+    'bulk_load': {
+        'page_size': 8192,
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'locking_mode': 'EXCLUSIVE',
+        'cache_size': -524288,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+        'defer_foreign_keys': 'ON',
+    },
+    # Reporting over multi-GB databases: pages are read through the mmap
+    # and a large cache keeps view scans and sorts off the disk
+    'analytics': {
+        'page_size': 8192,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'locking_mode': 'NORMAL',
+        'cache_size': -262144,
+        'mmap_size': 8589934592,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+        'defer_foreign_keys': 'OFF',
+    },
+    # Every commit survives power loss
+    'durable': {
+        'page_size': 4096,
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'locking_mode': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'foreign_keys': 'ON',
+        'defer_foreign_keys': 'OFF',
+    },
+}
+
+# page_size has to precede journal_mode: WAL fixes the page size of a new file
+PRAGMA_ORDER = ['page_size', 'locking_mode', 'journal_mode', 'synchronous', 'cache_size',
+                'mmap_size', 'temp_store', 'foreign_keys', 'defer_foreign_keys']
+
+# Your updated schema content with FIXED trigger syntax
+SCHEMA_SQL = '''-- TikTok Database Schema with Multi-User Support
 -- Generated: [TIMESTAMP]
 -- Version: 3.0
 -- Description: Complete TikTok data schema with triggers, views, and multi-user support
 
+-- Journal, sync and cache settings come from PRAGMA_PROFILES in createDb.py
+
 PRAGMA foreign_keys = ON;
-PRAGMA journal_mode = WAL;
-PRAGMA synchronous = NORMAL;
-PRAGMA cache_size = -2000;
-PRAGMA temp_store = MEMORY;
 
 CREATE TABLE IF NOT EXISTS users (
     user_id INTEGER PRIMARY KEY,
@@ -318,7 +374,8 @@ CREATE TABLE IF NOT EXISTS data_validation_log (
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
-CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+-- Usernames are unique: userRegistry.py upserts on this index
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
 CREATE INDEX IF NOT EXISTS idx_users_is_deleted ON users(is_deleted);
 
@@ -472,16 +529,6 @@ BEGIN
     WHERE NEW.email IS NOT NULL AND NEW.email != '' AND NEW.email NOT LIKE '%_@_%._%';
 END;
 
--- FIXED: Simplified duplicate username check
-CREATE TRIGGER IF NOT EXISTS prevent_duplicate_username
-BEFORE INSERT ON users
-FOR EACH ROW
-WHEN EXISTS (SELECT 1 FROM users WHERE username = NEW.username)
-BEGIN
-    INSERT INTO data_validation_log (table_name, user_id, column_name, issue_type, invalid_value, validation_type)
-    VALUES ('users', NEW.user_id, 'username', 'duplicate_username', NEW.username, 'data_validation');
-END;
-
 CREATE TRIGGER IF NOT EXISTS update_user_timestamp
 AFTER UPDATE ON users
 FOR EACH ROW
@@ -776,51 +823,215 @@ SELECT
 FROM login_history
 
 ORDER BY row_count DESC;'''
+
+def iter_schema_statements(sql=SCHEMA_SQL):
+    """Split a schema script into complete statements (trigger bodies stay whole)"""
+    pending = ''
+    for line in sql.splitlines(keepends=True):
+        if not pending and (not line.strip() or line.lstrip().startswith('--')):
+            continue
+        pending += line
+        if sqlite3.complete_statement(pending):
+            yield pending.strip()
+            pending = ''
+    if pending.strip():
+        yield pending.strip()
+
+def profile_settings(profile='default', **overrides):
+    """PRAGMA values for a named profile (or a dict of them), with overrides applied"""
+    if isinstance(profile, dict):
+        settings = dict(profile)
+    elif profile in PRAGMA_PROFILES:
+        settings = dict(PRAGMA_PROFILES[profile])
+    else:
+        raise ValueError(f"Unknown PRAGMA profile {profile!r}; choose from {', '.join(PRAGMA_PROFILES)}")
+    settings.update(overrides)
+    return settings
+
+def apply_profile(conn, profile='default', **overrides):
+    """Apply a PRAGMA profile to an open connection and return the resulting settings
+
+    page_size is skipped unless the database is still empty. Run outside a
+    transaction: journal_mode cannot change inside one. Leaving WAL needs the
+    only connection to the file, so otherwise the current journal mode stays.
+    """
+    settings = profile_settings(profile, **overrides)
+    empty = conn.execute("PRAGMA page_count").fetchone()[0] == 0
+    applied = {}
+    for name in PRAGMA_ORDER:
+        if name not in settings or (name == 'page_size' and not empty):
+            continue
+        try:
+            row = conn.execute(f"PRAGMA {name} = {settings[name]}").fetchone()
+        except sqlite3.OperationalError:
+            if name != 'journal_mode':
+                raise
+            row = conn.execute("PRAGMA journal_mode").fetchone()
+        applied[name] = row[0] if row else settings[name]
+    return applied
+
+def connect(db_name, profile='default', **overrides):
+    """Open db_name with a PRAGMA profile: default, bulk_load, analytics or durable"""
+    conn = sqlite3.connect(db_name)
+    apply_profile(conn, profile, **overrides)
+    return conn
+
+def begin_transaction(conn, profile='default'):
+    """Re-arm per-transaction settings before the first write of a transaction
+
+    SQLite switches defer_foreign_keys off at every COMMIT and ROLLBACK.
+    """
+    if not conn.in_transaction and profile_settings(profile).get('defer_foreign_keys') == 'ON':
+        conn.execute("PRAGMA defer_foreign_keys = ON")
+
+def statement_kind(statement):
+    """'pragma', 'table', 'index', 'trigger' or 'view' for a schema statement"""
+    words = statement.split(None, 3)
+    if words[0].upper() == 'PRAGMA':
+        return 'pragma'
+    kind = words[2] if words[1].upper() == 'UNIQUE' else words[1]
+    return kind.lower()
+
+def is_deferred_trigger(statement):
+    """BEFORE INSERT triggers are skipped during bulk loads"""
+    return statement_kind(statement) == 'trigger' and 'BEFORE INSERT' in statement.upper()
+
+def is_deferred_index(statement):
+    """Plain indexes are built after bulk loads; UNIQUE ones are constraints and stay"""
+    return statement_kind(statement) == 'index' and statement.split(None, 2)[1].upper() != 'UNIQUE'
+
+def _schema_object_name(statement):
+    match = re.match(r'CREATE\s+(?:UNIQUE\s+)?\w+\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', statement, re.I)
+    return match.group(1) if match else None
+
+def deferred_statements():
+    """Index and BEFORE INSERT trigger DDL that a bulk load builds afterwards"""
+    statements = list(iter_schema_statements())
+    indexes = [s for s in statements if is_deferred_index(s)]
+    triggers = [s for s in statements if is_deferred_trigger(s)]
+    return indexes, triggers
+
+def ensure_schema(conn, bulk_load=False):
+    """Create the schema on an open connection if the users table is missing
+
+    With bulk_load=True non-unique indexes and BEFORE INSERT triggers are left out;
+    call finish_bulk_load() after loading to build them.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='users'"
+    ).fetchone()
+    if not exists:
+        if bulk_load:
+            for statement in iter_schema_statements():
+                if not is_deferred_index(statement) and not is_deferred_trigger(statement):
+                    conn.execute(statement)
+            conn.commit()
+            _save_bulk_watermarks(conn, {})
+        else:
+            # executescript keeps trigger bodies intact (no naive split on ';')
+            conn.executescript(SCHEMA_SQL)
+    return not exists
+
+def _save_bulk_watermarks(conn, watermarks):
+    # Persisted so an interrupted load still validates every row on the next finish
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS bulk_load_state ("
+        "table_name TEXT PRIMARY KEY, watermark INTEGER NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO bulk_load_state (table_name, watermark) VALUES (?, ?)",
+        list(watermarks.items())
+    )
+    # users ids are hashes, not increasing rowids: remember which users already
+    # existed instead, once, so a resumed load keeps the first snapshot
+    snapshot = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='bulk_load_users'"
+    ).fetchone()
+    if snapshot:
+        conn.execute("CREATE TABLE bulk_load_users (user_id INTEGER PRIMARY KEY)")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='users'").fetchone():
+            conn.execute("INSERT INTO bulk_load_users (user_id) SELECT user_id FROM users")
+    conn.commit()
+
+def begin_bulk_load(conn, defer_indexes=True):
+    """Drop the per-row validation triggers (and schema indexes) ahead of a load
+
+    The highest existing rowid of every validated table is recorded so
+    finish_bulk_load() only validates the rows loaded in between.
+    """
+    _save_bulk_watermarks(conn, row_watermarks(conn))
+
+    indexes, triggers = deferred_statements()
+    for statement in triggers:
+        conn.execute(f"DROP TRIGGER IF EXISTS {_schema_object_name(statement)}")
+    if defer_indexes:
+        for statement in indexes:
+            conn.execute(f"DROP INDEX IF EXISTS {_schema_object_name(statement)}")
+    conn.commit()
+
+def finish_bulk_load(conn, verbose=True):
+    """Build deferred indexes, validate loaded rows in bulk, then restore triggers
+
+    Leaves the database with exactly the objects SCHEMA_SQL creates.
+    """
+    has_state = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='bulk_load_state'"
+    ).fetchone()
+    watermarks = dict(conn.execute("SELECT table_name, watermark FROM bulk_load_state")) if has_state else {}
+    # Loads begun before bulk_load_users existed re-check every user
+    users_before = 'bulk_load_users' if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='bulk_load_users'"
+    ).fetchone() else None
+    timings = {}
+    # Encoded tables keep their indexes and triggers on <table>_enc
+    layouts = table_layouts(conn)
+    indexes, triggers = [[layout_statement(s, layouts) for s in group] for group in deferred_statements()]
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    indexes = [s for s in indexes if _schema_object_name(s) not in existing]
+
+    started = time.perf_counter()
+    for statement in indexes:
+        conn.execute(statement)
+    conn.commit()
+    timings['indexes'] = time.perf_counter() - started
+    if verbose and indexes:
+        print(f"  Built {len(indexes)} indexes in {timings['indexes']:.2f}s")
+
+    report = run_validation(conn, since=watermarks, verbose=verbose, users_before=users_before)
+    timings['validation'] = sum(item['seconds'] for item in report)
+    timings['validation_rules'] = {item['rule']: item['seconds'] for item in report}
+    if verbose:
+        issues = sum(item['issues'] for item in report)
+        print(f"  Validated loaded rows in {timings['validation']:.2f}s ({issues} issue(s) logged)")
+
+    for statement in triggers:
+        conn.execute(statement)
+    conn.execute("DROP TABLE IF EXISTS bulk_load_state")
+    conn.execute("DROP TABLE IF EXISTS bulk_load_users")
+    conn.commit()
+    return timings
+
+def create_database():
+    """Create tikData.db from the schema template, or migrate it in place if it exists"""
+    from schemaManager import create_database as provision_schema
+    
+    # Database file name
+    db_name = "tikData.db"
     
-    # Remove existing database if it exists
-    if os.path.exists(db_name):
-        os.remove(db_name)
-        print(f"Removed existing {db_name}")
+    print(f"Creating database: {db_name}")
     
-    # Create new database and execute schema
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
+        # Existing data is kept: older schema versions are upgraded instead of deleted
+        info = provision_schema(db_name, 'durable')
         
-        # Enable foreign keys
-        cursor.execute("PRAGMA foreign_keys = ON")
-        
-        print("Executing schema...")
-        
-        # Execute the schema in smaller chunks to catch errors
-        sql_commands = schema_content.split(';')
-        
-        for i, command in enumerate(sql_commands, 1):
-            command = command.strip()
-            if command:  # Skip empty commands
-                try:
-                    # Skip comment lines
-                    if command.startswith('--'):
-                        continue
-                    
-                    # Print first few words of each command for debugging
-                    if i <= 10 or "TRIGGER" in command or "VIEW" in command:
-                        print(f"  Executing: {command[:50]}...")
-                    
-                    cursor.execute(command)
-                except sqlite3.Error as e:
-                    print(f"  Error in command {i}: {e}")
-                    print(f"  Command: {command[:100]}...")
-                    # Continue with next command
-        
-        # Commit changes
-        conn.commit()
+        conn = connect(db_name, 'durable')
+        cursor = conn.cursor()
         
         # Verify tables were created
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
         tables = cursor.fetchall()
         
-        print(f"\nDatabase created successfully!")
+        print(f"\nDatabase {'created' if info['created'] else 'up to date'} (schema version {info['version']})")
         print(f"Number of tables created: {len(tables)}")
         
         # Show table names (first 10)
@@ -856,26 +1067,6 @@ ORDER BY row_count DESC;'''
         db_size = os.path.getsize(db_name)
         print(f"\nDatabase file size: {db_size:,} bytes ({db_size/1024:.2f} KB)")
         
-        # Test that database works by inserting a test user
-        print("\nTesting database functionality...")
-        try:
-            # Insert a test user
-            cursor.execute("INSERT INTO users (user_id, username, display_name) VALUES (1, 'test_user', 'Test User')")
-            cursor.execute("SELECT COUNT(*) FROM users")
-            user_count = cursor.fetchone()[0]
-            print(f"  Test user inserted. Total users: {user_count}")
-            
-            # Test a view
-            cursor.execute("SELECT COUNT(*) FROM vw_active_users")
-            view_test = cursor.fetchone()[0]
-            print(f"  vw_active_users returns: {view_test} rows")
-            
-            # Clean up test data
-            cursor.execute("DELETE FROM users WHERE user_id = 1")
-            
-        except sqlite3.Error as e:
-            print(f"  Test error (but database was created): {e}")
-        
         # Close connection
         conn.close()
         
@@ -894,6 +1085,8 @@ ORDER BY row_count DESC;'''
 
 def download_database(db_name):
     """Download the database file"""
+    from google.colab import files
+    
     if db_name and os.path.exists(db_name):
         print(f"\nDownloading {db_name}...")
         files.download(db_name)
@@ -0,0 +1,225 @@
+import os
+import time
+from itertools import groupby
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from createDb import connect, iter_schema_statements, statement_kind, _schema_object_name
+from storageLayout import table_layouts, is_epoch_column
+
+DEFAULT_BATCH_SIZE = 65536
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+# Arrow IPC files are memory-mapped without copies only when uncompressed
+DEFAULT_COMPRESSION = {'parquet': 'zstd', 'arrow': 'none'}
+PARTITION_COLUMN = 'user_id'
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError('Columnar export needs pyarrow (pip install pyarrow)')
+
+
+def schema_tables():
+    """Tables created by SCHEMA_SQL, in schema order"""
+    return [_schema_object_name(statement) for statement in iter_schema_statements()
+            if statement_kind(statement) == 'table']
+
+
+def report_views(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='view' AND name LIKE 'vw_%' ORDER BY name"
+    )]
+
+
+def column_plan(conn, table, layouts):
+    """[(column, select expression, arrow type or None)] for table
+
+    Dates become UTC second timestamps, INTEGER and REAL columns keep their
+    numeric type; values that do not fit (text in a count, an unparseable
+    date) are exported as null. A None type is inferred from the data.
+    """
+    plan = []
+    for _, column, declared, _, _, _ in conn.execute(f"PRAGMA table_info({table})"):
+        declared = (declared or '').upper()
+        if declared == 'TIMESTAMP' or is_epoch_column(table, column, layouts):
+            # Epoch columns read through the view as datetime text, like plain ones
+            plan.append((column, f"CAST(strftime('%s', {column}) AS INTEGER)", pa.timestamp('s', tz='UTC')))
+        elif 'INT' in declared:
+            plan.append((column, f"CASE WHEN typeof({column}) = 'integer' THEN {column} END", pa.int64()))
+        elif any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+            plan.append((column, f"CASE WHEN typeof({column}) IN ('integer', 'real') "
+                                 f"THEN CAST({column} AS REAL) END", pa.float64()))
+        elif 'BLOB' in declared:
+            plan.append((column, f"CASE WHEN typeof({column}) IN ('blob', 'null') THEN {column} "
+                                 f"ELSE CAST({column} AS BLOB) END", pa.binary()))
+        elif any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+            plan.append((column, f"CAST({column} AS TEXT)", pa.string()))
+        else:
+            plan.append((column, column, None))
+    return plan
+
+
+def _infer_type(values):
+    for value in values:
+        if isinstance(value, int):
+            return pa.int64()
+        if isinstance(value, float):
+            return pa.float64()
+        if isinstance(value, bytes):
+            return pa.binary()
+        if value is not None:
+            return pa.string()
+    return pa.string()
+
+
+def _resolve_types(plan, rows):
+    """Fill in types left open by column_plan() from the first batch"""
+    columns = list(zip(*rows)) if rows else [()] * len(plan)
+    return [arrow_type if arrow_type is not None else _infer_type(values)
+            for (_, _, arrow_type), values in zip(plan, columns)]
+
+
+def _record_batch(rows, schema, offset):
+    """A record batch from row tuples, skipping the first offset values of each"""
+    columns = list(zip(*rows))[offset:]
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_string(field.type):
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_writer(path, schema, output_format, compression):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == 'parquet':
+        return pq.ParquetWriter(path, schema, compression=compression)
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == 'none' else compression)
+    return pa.ipc.new_file(path, schema, options=options)
+
+
+def export_table(conn, table, out_dir, output_format='parquet', batch_size=DEFAULT_BATCH_SIZE,
+                 compression=None, partition=True, layouts=None):
+    """Stream one table or view into columnar files; returns {'rows': n, 'files': n}
+
+    With a user_id column and partition=True rows go to
+    <out_dir>/<table>/user_id=<id>/part-0<ext> (hive layout, user_id only in
+    the path); otherwise to <out_dir>/<table>/part-0<ext>. Rows are read in
+    user_id order, batch_size at a time, so memory stays at one batch.
+    """
+    require_pyarrow()
+    if output_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    compression = compression or DEFAULT_COMPRESSION[output_format]
+    layouts = table_layouts(conn) if layouts is None else layouts
+    plan = column_plan(conn, table, layouts)
+    names = [column for column, _, _ in plan]
+    partitioned = partition and PARTITION_COLUMN in names
+    if partitioned:
+        # The partition value leads each row and is dropped from the files
+        index = names.index(PARTITION_COLUMN)
+        plan = [(PARTITION_COLUMN, PARTITION_COLUMN, None)] + plan[:index] + plan[index + 1:]
+    select_list = ', '.join(f"{expression} AS {column}" for column, expression, _ in plan)
+    order = f" ORDER BY {PARTITION_COLUMN}" if partitioned else ''
+    cursor = conn.execute(f"SELECT {select_list} FROM {table}{order}")
+
+    offset = 1 if partitioned else 0
+    table_dir = os.path.join(out_dir, table)
+    extension = FORMATS[output_format]
+    schema = None
+    writer = None
+    current = object()
+    rows_written = 0
+    files = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if schema is None:
+                types = _resolve_types(plan, rows)[offset:]
+                schema = pa.schema([pa.field(column, arrow_type)
+                                    for (column, _, _), arrow_type in zip(plan[offset:], types)])
+            groups = groupby(rows, key=lambda row: row[0]) if partitioned else [(None, rows)]
+            for key, group in groups:
+                group = list(group)
+                if key != current or writer is None:
+                    if writer is not None:
+                        writer.close()
+                    directory = table_dir
+                    if partitioned:
+                        value = '__HIVE_DEFAULT_PARTITION__' if key is None else key
+                        directory = os.path.join(table_dir, f"{PARTITION_COLUMN}={value}")
+                    writer = _open_writer(os.path.join(directory, f"part-0{extension}"),
+                                          schema, output_format, compression)
+                    current = key
+                    files += 1
+                writer.write_batch(_record_batch(group, schema, offset))
+                rows_written += len(group)
+    finally:
+        if writer is not None:
+            writer.close()
+    return {'rows': rows_written, 'files': files}
+
+
+def export_database(db_name, out_dir, tables=None, views=False, output_format='parquet',
+                    batch_size=DEFAULT_BATCH_SIZE, compression=None, partition=True, verbose=True):
+    """Export tables (the schema's by default) and optionally the vw_* views"""
+    require_pyarrow()
+    conn = connect(db_name, 'analytics')
+    try:
+        layouts = table_layouts(conn)
+        names = list(tables or schema_tables())
+        if views:
+            names += [view for view in report_views(conn) if view not in names]
+        results = {}
+        for name in names:
+            started = time.perf_counter()
+            results[name] = export_table(conn, name, out_dir, output_format, batch_size,
+                                         compression, partition, layouts)
+            results[name]['seconds'] = time.perf_counter() - started
+            if verbose and results[name]['rows']:
+                print(f"  {name}: {results[name]['rows']:,} rows in {results[name]['files']} file(s), "
+                      f"{results[name]['seconds']:.2f}s")
+        return results
+    finally:
+        conn.close()
+
+
+def main():
+    """Command line entry point: python exportColumnar.py tikData.db out_dir"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export tables to Parquet or Arrow IPC files')
+    parser.add_argument('db_name')
+    parser.add_argument('out_dir')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet', dest='output_format')
+    parser.add_argument('--table', action='append', dest='tables')
+    parser.add_argument('--views', action='store_true', help='Export the vw_* views as well')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--compression', default=None,
+                        help='Codec, e.g. zstd, snappy, lz4 or none (default: zstd for Parquet, none for Arrow)')
+    parser.add_argument('--no-partition', action='store_true', help='One file per table instead of per user_id')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+    if pa is None:
+        print("pyarrow is not installed (pip install pyarrow)")
+        return
+
+    started = time.perf_counter()
+    results = export_database(args.db_name, args.out_dir, args.tables, args.views, args.output_format,
+                              args.batch_size, args.compression, not args.no_partition)
+    print(f"\nExported {sum(item['rows'] for item in results.values()):,} rows from {len(results)} "
+          f"objects in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import sqlite3
+import os
+import re
+import time
+
+from createDb import connect
+from storageLayout import table_layouts, layout_statement
+
+# table: (primary key, date column, indexed text columns; the first one is snippeted)
+FTS_SOURCES = {
+    'comments': ('comment_id', 'comment_date', ['comment_text']),
+    'direct_messages': ('message_id', 'message_date', ['message_content', 'sender_username']),
+    'group_chats': ('message_id', 'message_date', ['message_content', 'sender_username']),
+    'searches': ('search_id', 'search_date', ['search_term']),
+}
+
+FTS_STATE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fts_state (
+    table_name TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(table):
+    return f"{table}_fts"
+
+
+def fts5_available(conn):
+    """True when this SQLite build has the FTS5 extension"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def enabled_fts_tables(conn):
+    """Source tables that currently have an FTS index"""
+    has_state = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='fts_state'"
+    ).fetchone()
+    if not has_state:
+        return []
+    return [row[0] for row in conn.execute("SELECT table_name FROM fts_state ORDER BY table_name")]
+
+
+def _fts_ddl(table):
+    primary_key, _, columns = FTS_SOURCES[table]
+    index = fts_table(table)
+    old_values = ', '.join(f"old.{column}" for column in columns)
+    column_list = ', '.join(columns)
+    # Inserts are indexed in bulk by sync_fts(); deletes and edits are rare,
+    # so triggers keep those in step with the external content table
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"{column_list}, content='{table}', content_rowid='{primary_key}', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {index} ({index}, rowid, {column_list}) "
+        f"SELECT 'delete', old.{primary_key}, {old_values} "
+        f"WHERE old.{primary_key} <= (SELECT last_rowid FROM fts_state WHERE table_name = '{table}'); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {index} ({index}, rowid, {column_list}) "
+        f"SELECT 'delete', old.{primary_key}, {old_values} "
+        f"WHERE old.{primary_key} <= (SELECT last_rowid FROM fts_state WHERE table_name = '{table}'); "
+        f"INSERT INTO {index} (rowid, {column_list}) "
+        f"SELECT new.{primary_key}, {', '.join(f'new.{column}' for column in columns)} "
+        f"WHERE new.{primary_key} <= (SELECT last_rowid FROM fts_state WHERE table_name = '{table}'); END",
+    ]
+
+
+def enable_fts(conn, tables=None):
+    """Create FTS indexes for tables (all of FTS_SOURCES by default) and fill them"""
+    if not fts5_available(conn):
+        raise RuntimeError('This SQLite build does not include FTS5')
+    tables = tables or list(FTS_SOURCES)
+    conn.executescript(FTS_STATE_SCHEMA)
+    # Triggers of encoded tables go on <table>_enc (the table itself is a view)
+    layouts = table_layouts(conn)
+    created = []
+    for table in tables:
+        if table not in FTS_SOURCES:
+            raise ValueError(f"No full-text index is defined for {table}")
+        if table in enabled_fts_tables(conn):
+            continue
+        for statement in _fts_ddl(table):
+            conn.execute(layout_statement(statement, layouts))
+        conn.execute("INSERT INTO fts_state (table_name, last_rowid) VALUES (?, 0)", (table,))
+        created.append(table)
+    conn.commit()
+    sync_fts(conn, created)
+    return created
+
+
+def disable_fts(conn, tables=None):
+    """Drop FTS indexes and their triggers"""
+    for table in tables or enabled_fts_tables(conn):
+        index = fts_table(table)
+        conn.execute(f"DROP TRIGGER IF EXISTS {index}_delete")
+        conn.execute(f"DROP TRIGGER IF EXISTS {index}_update")
+        conn.execute(f"DROP TABLE IF EXISTS {index}")
+        conn.execute("DELETE FROM fts_state WHERE table_name = ?", (table,))
+    conn.commit()
+
+
+def sync_fts(conn, tables=None, commit=True):
+    """Index rows added since the last sync (rowid above each table's watermark)
+
+    Called by the ingester before each commit, so new rows are indexed in
+    one INSERT ... SELECT over their rowid range rather than per row.
+    Returns {table: rows indexed}.
+    """
+    enabled = enabled_fts_tables(conn)
+    indexed = {}
+    for table in tables or enabled:
+        if table not in enabled:
+            continue
+        primary_key, _, columns = FTS_SOURCES[table]
+        column_list = ', '.join(columns)
+        last_rowid = conn.execute(
+            "SELECT last_rowid FROM fts_state WHERE table_name = ?", (table,)
+        ).fetchone()[0]
+        high = conn.execute(f"SELECT COALESCE(MAX({primary_key}), 0) FROM {table}").fetchone()[0]
+        if high <= last_rowid:
+            continue
+        cursor = conn.execute(
+            f"INSERT INTO {fts_table(table)} (rowid, {column_list}) "
+            f"SELECT {primary_key}, {column_list} FROM {table} "
+            f"WHERE {primary_key} > ? AND {primary_key} <= ?",
+            (last_rowid, high)
+        )
+        conn.execute(
+            "UPDATE fts_state SET last_rowid = ?, updated_at = CURRENT_TIMESTAMP WHERE table_name = ?",
+            (high, table)
+        )
+        indexed[table] = cursor.rowcount
+    if commit:
+        conn.commit()
+    return indexed
+
+
+def rebuild_fts(conn, tables=None):
+    """Rebuild indexes from their content tables (after out-of-band changes)"""
+    for table in tables or enabled_fts_tables(conn):
+        primary_key = FTS_SOURCES[table][0]
+        index = fts_table(table)
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+        conn.execute(
+            f"UPDATE fts_state SET last_rowid = (SELECT COALESCE(MAX({primary_key}), 0) FROM {table}), "
+            f"updated_at = CURRENT_TIMESTAMP WHERE table_name = ?", (table,)
+        )
+    conn.commit()
+
+
+def quote_query(text):
+    """Turn free text into an FTS5 query matching every word (no operators)"""
+    return ' '.join(f'"{token}"' for token in _TOKEN_RE.findall(text))
+
+
+def search(conn, text, tables=None, user_id=None, limit=20, raw=False):
+    """Full-text search returning bm25-ranked hits with highlighted snippets
+
+    text is plain words unless raw=True, in which case FTS5 query syntax
+    (phrases, prefix*, NEAR, OR) is passed through. Returns dicts with
+    table, id, user_id, date, snippet and rank (lower is better).
+    bm25 scores depend on each index's own statistics, so hits are ranked
+    within their table and the tables are interleaved best-first.
+    """
+    query = text if raw else quote_query(text)
+    if not query:
+        return []
+    per_table = []
+    for table in tables or enabled_fts_tables(conn):
+        primary_key, date_column, _ = FTS_SOURCES[table]
+        index = fts_table(table)
+        sql = (
+            f"SELECT t.{primary_key}, t.user_id, t.{date_column}, "
+            f"snippet({index}, 0, '[', ']', '...', 12), bm25({index}) "
+            f"FROM {index} JOIN {table} t ON t.{primary_key} = {index}.rowid "
+            f"WHERE {index} MATCH ?"
+        )
+        params = [query]
+        if user_id is not None:
+            sql += " AND t.user_id = ?"
+            params.append(user_id)
+        sql += f" ORDER BY bm25({index}) LIMIT ?"
+        params.append(limit)
+        per_table.append([{
+            'table': table,
+            'id': row_id,
+            'user_id': row_user,
+            'date': date,
+            'snippet': snippet,
+            'rank': rank
+        } for row_id, row_user, date, snippet, rank in conn.execute(sql, params)])
+    hits = []
+    for position in range(limit):
+        hits.extend(table_hits[position] for table_hits in per_table if position < len(table_hits))
+    return hits[:limit]
+
+
+def main():
+    """Command line entry point: python ftsIndex.py tikData.db [query]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Full-text search over messages, comments and searches')
+    parser.add_argument('db_name')
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--enable', action='store_true', help='Create and fill the FTS indexes')
+    parser.add_argument('--disable', action='store_true', help='Drop the FTS indexes')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the FTS indexes from their tables')
+    parser.add_argument('--table', action='append', dest='tables', choices=sorted(FTS_SOURCES))
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--raw', action='store_true', help='Pass the query as FTS5 syntax')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    conn = connect(args.db_name, 'analytics')
+    if args.disable:
+        disable_fts(conn, args.tables)
+        print("Full-text indexes dropped")
+    if args.enable:
+        started = time.perf_counter()
+        created = enable_fts(conn, args.tables)
+        print(f"Indexed {', '.join(created) or 'nothing new'} in {time.perf_counter() - started:.2f}s")
+    if args.rebuild:
+        started = time.perf_counter()
+        rebuild_fts(conn, args.tables)
+        print(f"Rebuilt full-text indexes in {time.perf_counter() - started:.2f}s")
+
+    if args.query:
+        started = time.perf_counter()
+        hits = search(conn, args.query, args.tables, args.user_id, args.limit, args.raw)
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            print(f"  [{hit['table']} #{hit['id']}] user {hit['user_id']} {hit['date'] or ''}: {hit['snippet']}")
+        print(f"{len(hits)} hit(s) in {elapsed * 1000:.1f}ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1222 @@
+import sqlite3
+import os
+import re
+import json
+import time
+import io
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from createDb import (
+    PRAGMA_PROFILES, ensure_schema, begin_bulk_load, finish_bulk_load, connect, begin_transaction,
+    profile_settings
+)
+from jsonStream import stream_paths, DEFAULT_CHUNK_SIZE
+from userRegistry import UserRegistry
+from normalizer import PRESETS, table_normalizers
+from ftsIndex import enable_fts, enabled_fts_tables, sync_fts
+from storageLayout import StorageEncoder, enable_link_encoding, enable_epoch_dates
+from rowHashes import RowHashIndex
+from schemaManager import provision_database, migrate
+from summaryTables import record_activity, record_monthly, record_row_counts
+
+DEFAULT_DB_NAME = "tikData.db"
+DEFAULT_BATCH_SIZE = 5000
+VALIDATION_MODES = ('triggers', 'set')
+
+PROFILE_PATH = 'Profile And Settings.Profile Info.ProfileMap'
+
+# Python port of JSON_PATH_MAPPING in tiktok-mapper.js. Keep the two in sync.
+JSON_PATH_MAPPING = {
+    # User Profile - includes userName field
+    'Profile And Settings.Profile Info.ProfileMap': {
+        'table': 'users',
+        'columns': {
+            'userName': 'username',
+            'displayName': 'display_name',
+            'emailAddress': 'email',
+            'bioDescription': 'bio_description',
+            'birthDate': 'birth_date',
+            'accountRegion': 'account_region',
+            'followerCount': 'follower_count',
+            'followingCount': 'following_count'
+        },
+        'date_fields': ['birth_date'],
+        'numeric_fields': ['follower_count', 'following_count']
+    },
+
+    # Comments
+    'Comment.Comments.CommentsList': {
+        'table': 'comments',
+        'is_array': True,
+        'columns': {
+            'date': 'comment_date',
+            'comment': 'comment_text',
+            'photo': 'photo_url',
+            'url': 'video_url'
+        },
+        'date_fields': ['comment_date']
+    },
+
+    # Direct Messages
+    'Direct Message.Direct Messages.ChatHistory': {
+        'table': 'direct_messages',
+        'is_dynamic': True,
+        'dynamic_key_column': 'chat_identifier',
+        'columns': {
+            'Date': 'message_date',
+            'From': 'sender_username',
+            'Content': 'message_content'
+        },
+        'date_fields': ['message_date']
+    },
+
+    # Group Chats
+    'Direct Message.Group Chat.GroupChat': {
+        'table': 'group_chats',
+        'is_dynamic': True,
+        'dynamic_key_column': 'group_chat_identifier',
+        'columns': {
+            'Date': 'message_date',
+            'From': 'sender_username',
+            'Content': 'message_content'
+        },
+        'date_fields': ['message_date']
+    },
+
+    # Coin Purchases
+    'Income+ Wallet.Coin Purchase History.CoinPurchaseHistoryList': {
+        'table': 'coin_purchases',
+        'is_array': True,
+        'columns': {
+            'Date': 'purchase_date',
+            'Type': 'purchase_type',
+            'CoinAmount': 'coin_amount'
+        },
+        'date_fields': ['purchase_date'],
+        'numeric_fields': ['coin_amount']
+    },
+
+    # Favorites
+    'Likes and Favorites.Favorite Collection.FavoriteCollectionList': {
+        'table': 'favorite_collections',
+        'is_array': True,
+        'columns': {
+            'Date': 'favorite_date',
+            'FavoriteCollection': 'collection_name'
+        },
+        'date_fields': ['favorite_date']
+    },
+
+    'Likes and Favorites.Favorite Comment.FavoriteCommentList': {
+        'table': 'favorite_comments',
+        'is_array': True,
+        'columns': {
+            'FavoriteComment': 'comment_text'
+        }
+    },
+
+    'Likes and Favorites.Favorite Effects.FavoriteEffectsList': {
+        'table': 'favorite_effects',
+        'is_array': True,
+        'columns': {
+            'Date': 'effect_date',
+            'EffectLink': 'effect_link'
+        },
+        'date_fields': ['effect_date']
+    },
+
+    'Likes and Favorites.Favorite Hashtags.FavoriteHashtagList': {
+        'table': 'favorite_hashtags',
+        'is_array': True,
+        'columns': {
+            'Date': 'favorite_date',
+            'Link': 'hashtag_link'
+        },
+        'date_fields': ['favorite_date']
+    },
+
+    'Likes and Favorites.Favorite Sounds.FavoriteSoundList': {
+        'table': 'favorite_sounds',
+        'is_array': True,
+        'columns': {
+            'Date': 'favorite_date',
+            'Link': 'sound_link'
+        },
+        'date_fields': ['favorite_date']
+    },
+
+    'Likes and Favorites.Favorite Videos.FavoriteVideoList': {
+        'table': 'favorite_videos',
+        'is_array': True,
+        'columns': {
+            'Date': 'favorite_date',
+            'Link': 'video_link'
+        },
+        'date_fields': ['favorite_date']
+    },
+
+    'Likes and Favorites.Like List.ItemFavoriteList': {
+        'table': 'liked_videos',
+        'is_array': True,
+        'columns': {
+            'date': 'like_date',
+            'link': 'video_link'
+        },
+        'date_fields': ['like_date']
+    },
+
+    # Posts
+    'Post.Posts.VideoList': {
+        'table': 'posts',
+        'is_array': True,
+        'columns': {
+            'Date': 'post_date',
+            'Link': 'video_link',
+            'Likes': 'likes_count',
+            'WhoCanView': 'who_can_view',
+            'AllowComments': 'allow_comments',
+            'AllowStitches': 'allow_stitches',
+            'AllowDuets': 'allow_duets',
+            'AllowStickers': 'allow_stickers',
+            'AllowSharingToStory': 'allow_sharing_to_story',
+            'ContentDisclosure': 'content_disclosure'
+        },
+        'date_fields': ['post_date'],
+        'numeric_fields': ['likes_count']
+    },
+
+    'Post.Recently Deleted Posts.PostList': {
+        'table': 'deleted_posts',
+        'is_array': True,
+        'columns': {
+            'Date': 'post_date',
+            'DateDeleted': 'delete_date',
+            'Link': 'video_link',
+            'Likes': 'likes_count',
+            'ContentDisclosure': 'content_disclosure',
+            'AIGeneratedContent': 'ai_generated',
+            'Sound': 'sound_used',
+            'Location': 'location',
+            'Title': 'title',
+            'AddYoursText': 'add_yours_text'
+        },
+        'date_fields': ['post_date', 'delete_date'],
+        'numeric_fields': ['likes_count']
+    },
+
+    # Social Connections
+    'Profile And Settings.Block List.BlockList': {
+        'table': 'blocked_users',
+        'is_array': True,
+        'columns': {
+            'Date': 'block_date',
+            'UserName': 'blocked_username'
+        },
+        'date_fields': ['block_date']
+    },
+
+    'Profile And Settings.Follower.FansList': {
+        'table': 'followers',
+        'is_array': True,
+        'columns': {
+            'Date': 'follow_date',
+            'UserName': 'follower_username'
+        },
+        'date_fields': ['follow_date']
+    },
+
+    'Profile And Settings.Following.Following': {
+        'table': 'following',
+        'is_array': True,
+        'columns': {
+            'Date': 'follow_date',
+            'UserName': 'following_username'
+        },
+        'date_fields': ['follow_date']
+    },
+
+    # TikTok Live
+    'TikTok Live.Go Live History.GoLiveList': {
+        'table': 'live_sessions',
+        'is_array': True,
+        'columns': {
+            'LiveStartTime': 'live_start_time',
+            'RoomId': 'room_id',
+            'CoverUri': 'cover_uri',
+            'ReplayUrl': 'replay_url',
+            'TotalEarning': 'total_earning',
+            'LiveEndTime': 'live_end_time',
+            'TotalLike': 'total_likes',
+            'TotalView': 'total_views',
+            'QualitySetting': 'quality_setting',
+            'RoomTitle': 'room_title'
+        },
+        'date_fields': ['live_start_time', 'live_end_time'],
+        'numeric_fields': ['total_likes', 'total_views']
+    },
+
+    # WatchLiveMap values are objects keyed by room id, not arrays
+    'TikTok Live.Watch Live History.WatchLiveMap': {
+        'table': 'watched_lives',
+        'is_dynamic': True,
+        'dynamic_key_column': 'room_id',
+        'columns': {
+            'WatchTime': 'watch_time',
+            'Link': 'live_link'
+        },
+        'date_fields': ['watch_time']
+    },
+
+    'TikTok Live.Watch Live History.WatchLiveMap.*.Comments': {
+        'table': 'live_comments',
+        'is_nested_array': True,
+        'parent_key': 'room_id',
+        'columns': {
+            'CommentTime': 'comment_time',
+            'CommentContent': 'comment_content',
+            'RawTime': 'raw_time'
+        },
+        'date_fields': ['comment_time'],
+        'integer_fields': ['raw_time']
+    },
+
+    # Activity
+    'Your Activity.Searches.SearchList': {
+        'table': 'searches',
+        'is_array': True,
+        'columns': {
+            'Date': 'search_date',
+            'SearchTerm': 'search_term'
+        },
+        'date_fields': ['search_date']
+    },
+
+    'Your Activity.Login History.LoginHistoryList': {
+        'table': 'login_history',
+        'is_array': True,
+        'columns': {
+            'Date': 'login_date',
+            'IP': 'ip_address',
+            'DeviceModel': 'device_model',
+            'DeviceSystem': 'device_system',
+            'NetworkType': 'network_type',
+            'Carrier': 'carrier'
+        },
+        'date_fields': ['login_date']
+    },
+
+    'Your Activity.Hashtag.HashtagList': {
+        'table': 'user_hashtags',
+        'is_array': True,
+        'columns': {
+            'HashtagName': 'hashtag_name',
+            'HashtagLink': 'hashtag_link'
+        }
+    },
+
+    'Your Activity.Reposts.RepostList': {
+        'table': 'reposts',
+        'is_array': True,
+        'columns': {
+            'Date': 'repost_date',
+            'Link': 'video_link'
+        },
+        'date_fields': ['repost_date']
+    },
+
+    'Your Activity.Share History.ShareHistoryList': {
+        'table': 'share_history',
+        'is_array': True,
+        'columns': {
+            'Date': 'share_date',
+            'SharedContent': 'shared_content',
+            'Link': 'shared_link',
+            'Method': 'share_method'
+        },
+        'date_fields': ['share_date']
+    },
+
+    'Your Activity.Purchases.SendGifts.SendGifts': {
+        'table': 'sent_gifts',
+        'is_array': True,
+        'columns': {
+            'Date': 'send_date',
+            'GiftAmount': 'gift_amount',
+            'UserName': 'recipient_username'
+        },
+        'date_fields': ['send_date'],
+        'numeric_fields': ['gift_amount']
+    },
+
+    'Your Activity.Purchases.BuyGifts.BuyGifts': {
+        'table': 'purchased_gifts',
+        'is_array': True,
+        'columns': {
+            'Date': 'purchase_date',
+            'Price': 'price'
+        },
+        'date_fields': ['purchase_date'],
+        'numeric_fields': ['price']
+    },
+
+    # TikTok Shop
+    'TikTok Shop.Product Browsing History.ProductBrowsingHistories': {
+        'table': 'product_browsing',
+        'is_array': True,
+        'columns': {
+            'browsing_date': 'browsing_date',
+            'shop_name': 'shop_name',
+            'product_name': 'product_name'
+        },
+        'date_fields': ['browsing_date']
+    }
+}
+
+# Same substrings as isNumericField() in tiktok-mapper.js
+NUMERIC_FIELD_NAMES = (
+    'count', 'amount', 'number', 'total', 'quantity', 'price', 'cost', 'value',
+    'size', 'age', 'percent', 'percentage', 'ratio', 'frequency', 'rate',
+    'duration', 'likes', 'views', 'followers', 'following', 'coins'
+)
+
+_NULL_STRINGS = ('N/A', 'null', 'NULL')
+_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+_DAY_MON_YEAR_RE = re.compile(r'^(\d{1,2})-([A-Za-z]{3})-(\d{4})$')
+_MON_DAY_YEAR_RE = re.compile(r'^([A-Za-z]{3})-(\d{1,2})-(\d{4})$')
+_SQL_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+_SQL_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_ISO_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}')
+_NUMBER_PREFIX_RE = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?')
+_NUMERIC_STRING_RE = re.compile(r'^-?\d+(\.\d+)?$')
+_FALLBACK_DATE_FORMATS = (
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y',
+    '%Y-%m-%d %H:%M', '%d %b %Y', '%b %d, %Y', '%B %d, %Y'
+)
+
+
+def generate_user_id_from_username(username):
+    """Port of generateUserIdFromUsername() so Python and browser ids agree"""
+    if not username:
+        # The browser falls back to a random id; derive it from the clock instead
+        return int(time.time() * 1000) % 900000 + 100000
+
+    # DJB2-like hash over UTF-16 code units with JavaScript int32 semantics
+    hash_value = 5381
+    encoded = username.encode('utf-16-le')
+    for i in range(0, len(encoded), 2):
+        code_unit = encoded[i] | (encoded[i + 1] << 8)
+        hash_value = ((hash_value * 33) & 0xFFFFFFFF)
+        if hash_value >= 0x80000000:
+            hash_value -= 0x100000000
+        hash_value ^= code_unit
+
+    return abs(hash_value) % 1000000 + 1
+
+
+def get_value_by_path(obj, path):
+    """Walk a dotted mapping path, matching keys like the JS getValueByPath()"""
+    if obj is None or not path:
+        return None
+
+    current = obj
+    for part in path.split('.'):
+        if current is None:
+            return None
+
+        # Wildcard: hand the container back to the caller
+        if part == '*':
+            return current
+
+        if not isinstance(current, dict):
+            return None
+
+        if part in current:
+            current = current[part]
+        elif '+' in part or ' ' in part:
+            wanted = _strip_key(part)
+            matched = next((key for key in current if _strip_key(key) == wanted), None)
+            if matched is None:
+                return None
+            current = current[matched]
+        else:
+            return None
+
+    return current
+
+
+def _strip_key(key):
+    return re.sub(r'[^a-zA-Z0-9]', '', key)
+
+
+def clean_key(key):
+    """Remove the 'Chat History with ' style prefixes from dynamic keys"""
+    return key.replace('Chat History with ', '').replace('Group Chat with ', '').replace(':', '').strip()
+
+
+def parse_date(value):
+    """Normalize a TikTok date value to SQLite 'YYYY-MM-DD HH:MM:SS' text"""
+    if value is None or value == '' or value in _NULL_STRINGS:
+        return None
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # JavaScript Date(number) semantics: milliseconds since the epoch
+        try:
+            return datetime.fromtimestamp(value / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        except (OverflowError, OSError, ValueError):
+            return value
+
+    if not isinstance(value, str):
+        return value
+
+    # Fast path: TikTok exports almost always use this format already
+    if _SQL_DATETIME_RE.match(value) or _SQL_DATE_RE.match(value):
+        return value
+
+    # birthDate formats "01-Feb-1982" and "Feb-01-1982"
+    match = _DAY_MON_YEAR_RE.match(value)
+    if match:
+        day, month, year = match.groups()
+    else:
+        match = _MON_DAY_YEAR_RE.match(value)
+        if match:
+            month, day, year = match.groups()
+    if match:
+        month_num = _MONTHS.get(month[:3].lower())
+        if month_num:
+            return f"{year}-{month_num:02d}-{int(day):02d}"
+
+    if _ISO_DATETIME_RE.match(value):
+        return value.replace('T', ' ', 1).split('.')[0][:19]
+
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        pass
+
+    for date_format in _FALLBACK_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+
+    # Return as-is for non-date values
+    return value
+
+
+def _parse_number(value):
+    """parseFloat()-style conversion that keeps the original value on failure"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    match = _NUMBER_PREFIX_RE.match(str(value))
+    if not match:
+        return value
+    text = match.group(0).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return value
+    if number.is_integer() and '.' not in text and 'e' not in text.lower():
+        integer = int(text)
+        # SQLite integers are 64-bit; keep ids such as room ids as text beyond that
+        return integer if -2**63 <= integer < 2**63 else value
+    return number
+
+
+def is_numeric_field(field_name):
+    """Substring check matching isNumericField() in tiktok-mapper.js"""
+    lower_field = field_name.lower()
+    return any(name in lower_field for name in NUMERIC_FIELD_NAMES)
+
+
+def compile_mapping(mapping):
+    """Precompute how each source key of a mapping is converted"""
+    date_fields = mapping.get('date_fields', [])
+    numeric_fields = mapping.get('numeric_fields', [])
+    converters = []
+    for source_key, target_column in mapping['columns'].items():
+        if source_key == 'RawTime':
+            kind = 'integer'
+        elif target_column in numeric_fields or is_numeric_field(source_key):
+            kind = 'numeric'
+        elif target_column in date_fields:
+            kind = 'date'
+        else:
+            kind = 'text'
+        converters.append((source_key, target_column, kind))
+    return converters
+
+
+def extract_row(source, converters):
+    """Convert one JSON object into a {column: value} row (see extractRow())"""
+    row = {}
+    if not isinstance(source, dict):
+        return row
+
+    for source_key, target_column, kind in converters:
+        value = source.get(source_key)
+        if value is None or value == '':
+            continue
+        if isinstance(value, str) and value in _NULL_STRINGS:
+            value = ''
+
+        if kind == 'integer':
+            number = _parse_number(value)
+            if isinstance(number, (int, float)):
+                value = int(number)
+        elif kind == 'numeric':
+            value = _parse_number(value)
+        elif kind == 'date':
+            value = parse_date(value)
+        elif isinstance(value, str):
+            if _NUMERIC_STRING_RE.match(value):
+                value = _parse_number(value)
+        elif isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False)
+
+        row[target_column] = value
+
+    return row
+
+
+def iter_mapping_rows(data, path, mapping, converters=None):
+    """Yield rows for one JSON_PATH_MAPPING entry from a parsed export"""
+    converters = converters or compile_mapping(mapping)
+
+    if mapping.get('is_nested_array'):
+        parent_path, _, child_key = path.partition('.*.')
+        container = get_value_by_path(data, parent_path)
+        if not isinstance(container, dict):
+            return
+        for key, value in container.items():
+            items = value.get(child_key) if isinstance(value, dict) else None
+            if isinstance(items, list):
+                for item in items:
+                    row = extract_row(item, converters)
+                    if row:
+                        row[mapping['parent_key']] = key
+                        yield row
+        return
+
+    value = get_value_by_path(data, path)
+    if mapping.get('is_array'):
+        if isinstance(value, list):
+            for item in value:
+                row = extract_row(item, converters)
+                if row:
+                    yield row
+    elif mapping.get('is_dynamic'):
+        if isinstance(value, dict):
+            for key, entry in value.items():
+                for row in iter_dynamic_entry_rows(key, entry, mapping, converters):
+                    yield row
+    elif isinstance(value, dict):
+        row = extract_row(value, converters)
+        if row:
+            yield row
+
+
+def iter_dynamic_entry_rows(key, entry, mapping, converters):
+    """Rows for one key of a dynamic map (a list of messages or a single object)"""
+    items = entry if isinstance(entry, list) else [entry]
+    identifier = clean_key(key)
+    for item in items:
+        row = extract_row(item, converters)
+        if row:
+            row[mapping['dynamic_key_column']] = identifier
+            yield row
+
+
+def build_user_row(profile, fallback_username=None):
+    """Build the users row the same way extractUserData() does"""
+    converters = compile_mapping(JSON_PATH_MAPPING[PROFILE_PATH])
+    row = extract_row(profile, converters) if isinstance(profile, dict) else {}
+
+    username = row.get('username') or fallback_username
+    if not username and isinstance(profile, dict):
+        username = profile.get('displayName') or None
+    user_id = generate_user_id_from_username(username)
+
+    if not row.get('username'):
+        if username:
+            row['username'] = str(username)
+        elif row.get('display_name'):
+            slug = re.sub(r'\s+', '_', str(row['display_name']).lower())
+            row['username'] = re.sub(r'[^a-z0-9_]', '', slug)[:50]
+        else:
+            row['username'] = f"tiktok_user_{user_id}"
+
+    row['user_id'] = user_id
+    return row
+
+
+def table_columns(mapping):
+    """Ordered column list used for a mapping's INSERT statement"""
+    columns = ['user_id'] + list(mapping['columns'].values())
+    for extra in (mapping.get('dynamic_key_column'), mapping.get('parent_key')):
+        if extra and extra not in columns:
+            columns.append(extra)
+    return columns
+
+
+def stream_path_for(path, mapping):
+    """Path and stream_paths() mode that feed a mapping"""
+    if mapping.get('is_nested_array'):
+        return path.partition('.*.')[0], 'dynamic'
+    if mapping.get('is_array'):
+        return path, 'array'
+    if mapping.get('is_dynamic'):
+        return path, 'dynamic'
+    return path, 'object'
+
+
+def stream_targets(mappings=None):
+    """stream_paths() targets for every data mapping (the profile is read separately)"""
+    mappings = mappings or JSON_PATH_MAPPING
+    targets = {}
+    for path, mapping in mappings.items():
+        if path == PROFILE_PATH:
+            continue
+        stream_path, mode = stream_path_for(path, mapping)
+        targets[stream_path] = mode
+    return targets
+
+
+def stream_mapping_groups(mappings=None):
+    """Stream path -> [(path, mapping, converters, columns)] for iter_event_rows()"""
+    mappings = mappings or JSON_PATH_MAPPING
+    groups = {}
+    for path, mapping in mappings.items():
+        if path == PROFILE_PATH:
+            continue
+        stream_path, _ = stream_path_for(path, mapping)
+        groups.setdefault(stream_path, []).append(
+            (path, mapping, compile_mapping(mapping), table_columns(mapping))
+        )
+    return groups
+
+
+def iter_event_rows(group, key, value):
+    """Yield (table, columns, row) for one stream_paths() event"""
+    for path, mapping, converters, columns in group:
+        if mapping.get('is_nested_array'):
+            child_key = path.partition('.*.')[2]
+            items = value.get(child_key) if isinstance(value, dict) else None
+            if isinstance(items, list):
+                for item in items:
+                    row = extract_row(item, converters)
+                    if row:
+                        row[mapping['parent_key']] = key
+                        yield mapping['table'], columns, row
+        elif mapping.get('is_dynamic'):
+            for row in iter_dynamic_entry_rows(key, value, mapping, converters):
+                yield mapping['table'], columns, row
+        else:
+            row = extract_row(value, converters)
+            if row:
+                yield mapping['table'], columns, row
+
+
+def _skip_lap(stage, rows=0):
+    pass
+
+
+def is_zip_export(json_path):
+    return json_path.lower().endswith('.zip')
+
+
+def find_export_member(archive):
+    """Name of the user_data JSON inside a TikTok ZIP export"""
+    members = [info for info in archive.infolist() if info.filename.lower().endswith('.json')]
+    if not members:
+        raise ValueError('No JSON file found in archive')
+    preferred = [info for info in members if 'user_data' in os.path.basename(info.filename).lower()]
+    return max(preferred or members, key=lambda info: info.file_size).filename
+
+
+@contextmanager
+def open_export(json_path):
+    """Text handle on a .json export, or on the JSON member of a .zip export
+
+    ZIP members are decompressed as they are read, so nothing is extracted
+    to disk and memory stays at the reader's chunk size.
+    """
+    if not is_zip_export(json_path):
+        with open(json_path, 'r', encoding='utf-8') as handle:
+            yield handle
+        return
+    with zipfile.ZipFile(json_path) as archive:
+        with archive.open(find_export_member(archive)) as member:
+            with io.TextIOWrapper(member, encoding='utf-8') as handle:
+                yield handle
+
+
+class TikTokIngester:
+    """Load TikTok exports into tikData.db with batched, parameterized inserts"""
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, batch_size=DEFAULT_BATCH_SIZE, verbose=True,
+                 streaming=False, chunk_size=DEFAULT_CHUNK_SIZE, bulk_load=False,
+                 validation='triggers', fts=False, normalize=None, links=False,
+                 epoch_dates=False, pragma_profile=None, differential=False):
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"validation must be one of {', '.join(VALIDATION_MODES)}")
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.bulk_load = bulk_load
+        # Bulk loads always validate set-based; 'set' does so without deferring indexes
+        self.validation = 'set' if bulk_load else validation
+        # createDb.PRAGMA_PROFILES entry. Bulk loads keep the crash-safe default:
+        # they often target a shared multi-user file, so the no-fsync 'bulk_load'
+        # profile is only used when asked for
+        self.pragma_profile = pragma_profile or 'default'
+        self.verbose = verbose
+        self.conn = None
+        self.registry = None
+        # Summary counters live in the main database only, not in worker shards
+        self.summaries = False
+        self.fts = fts
+        self.fts_tables = []
+        # Preset name from normalizer.PRESETS; rewrites links and messages like normalizer.js
+        self.normalize = normalize
+        self.normalizers = table_normalizers(normalize) if normalize else {}
+        # Store link columns as ids into the links dictionary (storageLayout.py)
+        self.links = links
+        # Store date columns as INTEGER Unix seconds behind text-rendering views
+        self.epoch_dates = epoch_dates
+        self.storage = None
+        # Skip rows an earlier differential ingest loaded (rowHashes.py)
+        self.differential = differential
+        self.row_hashes = None
+        # ingestMetrics.IngestMetrics: per-stage timers for each table when set
+        self.metrics = None
+        self.reset()
+
+    def reset(self):
+        """Clear per-export state"""
+        self.user = None
+        self.user_id = None
+        self.statistics = {}
+        self.timings = {}
+        self.warnings = []
+        if self.row_hashes is not None:
+            self.row_hashes.reset()
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def connect(self):
+        """Open the database and create the schema when it is missing"""
+        if self.conn is None:
+            # A new file starts as a copy of the schema template
+            if provision_database(self.db_name, profile_settings(self.pragma_profile).get('page_size', 4096)):
+                self.log(f"Created {self.db_name} from the schema template")
+            self.conn = connect(self.db_name, self.pragma_profile)
+            if ensure_schema(self.conn, bulk_load=self.bulk_load):
+                self.log(f"Created schema in {self.db_name}")
+            migrate(self.conn, verbose=self.verbose)
+            self.summaries = True
+            if self.fts:
+                enable_fts(self.conn)
+            self.fts_tables = enabled_fts_tables(self.conn)
+            if self.links:
+                enable_link_encoding(self.conn)
+            if self.epoch_dates:
+                enable_epoch_dates(self.conn)
+            if self.differential:
+                self.row_hashes = RowHashIndex(self.conn)
+        return self.conn
+
+    def begin_load(self):
+        """Prepare the database before rows are inserted"""
+        self.connect()
+        if self.validation == 'set':
+            begin_bulk_load(self.conn, defer_indexes=self.bulk_load)
+
+    def abort_batch(self):
+        """Undo the uncommitted batch of a failed load; committed batches stay"""
+        if self.conn is not None:
+            self.conn.rollback()
+        if self.storage is not None:
+            self.storage.reset()
+
+    def finish_load(self):
+        """Post-load work: deferred indexes, set-based validation, triggers and full-text catch-up"""
+        if self.validation == 'set':
+            self.log("Finishing bulk load..." if self.bulk_load else "Validating loaded rows...")
+            self.timings.update(finish_bulk_load(self.conn, verbose=self.verbose))
+        if self.fts_tables:
+            started = time.perf_counter()
+            indexed = sync_fts(self.conn)
+            if indexed:
+                self.timings['fts'] = time.perf_counter() - started
+                self.log(f"  Full-text indexed {sum(indexed.values()):,} rows in {self.timings['fts']:.2f}s")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.registry = None
+            self.summaries = False
+            self.fts_tables = []
+            self.storage = None
+            self.row_hashes = None
+
+    def ingest_file(self, json_path):
+        """Parse a user_data.json (or .zip) export and load every mapped table
+
+        ZIP exports are always streamed, so they never exist as one string.
+        """
+        self.log(f"Reading {json_path}...")
+        if self.streaming or is_zip_export(json_path):
+            return self.ingest_stream(lambda: open_export(json_path))
+        started = time.perf_counter()
+        with open_export(json_path) as handle:
+            data = json.load(handle)
+        if self.metrics is not None:
+            self.metrics.add('parse', None, time.perf_counter() - started)
+        return self.ingest_data(data)
+
+    def ingest_stream(self, opener):
+        """Load an export incrementally from a text handle factory
+
+        The profile is read first (an early-exit pass) because every other
+        row needs its user_id; the second pass streams all mapped sections.
+        """
+        self.reset()
+        self.begin_load()
+        started = time.perf_counter()
+
+        try:
+            with opener() as handle:
+                events = stream_paths(handle, {PROFILE_PATH: 'object'}, self.chunk_size)
+                profile = next(events, (None, None, None))[2]
+                events.close()
+            self.register_user(build_user_row(profile))
+
+            with opener() as handle:
+                self.load_stream(stream_paths(handle, stream_targets(), self.chunk_size))
+        except BaseException:
+            self.abort_batch()
+            raise
+        finally:
+            # Indexes and triggers begin_load() dropped come back even after a failure
+            self.finish_load()
+        self.timings['total'] = time.perf_counter() - started
+        return self.summary()
+
+    def ingest_data(self, data):
+        """Load an already parsed export dictionary"""
+        if not isinstance(data, dict):
+            raise ValueError('Invalid JSON data provided')
+
+        self.reset()
+        self.begin_load()
+        started = time.perf_counter()
+
+        try:
+            self.register_user(build_user_row(get_value_by_path(data, PROFILE_PATH)))
+
+            for path, mapping in JSON_PATH_MAPPING.items():
+                if path == PROFILE_PATH:
+                    continue
+                rows = iter_mapping_rows(data, path, mapping)
+                self.load_table(mapping['table'], table_columns(mapping), rows)
+        except BaseException:
+            self.abort_batch()
+            raise
+        finally:
+            self.finish_load()
+        self.timings['total'] = time.perf_counter() - started
+        return self.summary()
+
+    def register_user(self, user_row):
+        """Insert or refresh the users row for the current export
+
+        Returns the stored user_id, which differs from the hashed one when
+        the username was registered before or the hash collides.
+        """
+        conn = self.connect()
+        begin_transaction(conn, self.pragma_profile)
+        if self.registry is None:
+            self.registry = UserRegistry(conn)
+        self.user = user_row
+        try:
+            # The users delta commits together with the upsert
+            self.user_id = self.registry.register(user_row, commit=False)
+            user_row['user_id'] = self.user_id
+            if self.registry.inserted:
+                self.record_deltas({'users': self.registry.inserted})
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            self.registry.forget()
+            raise
+        self.statistics['users'] = 1
+        self.log(f"User: {user_row['username']} (user_id {self.user_id})")
+        return self.user_id
+
+    def insert_sql(self, table_name, columns):
+        return (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+
+    def insert_batch(self, table_name, columns, rows):
+        """executemany one batch of row dicts; the caller owns the transaction"""
+        lap = self.metrics.lap(table_name) if self.metrics is not None else _skip_lap
+        value_columns = columns[1:]
+        params = [
+            [self.user_id] + [row.get(column) for column in value_columns]
+            for row in rows
+        ]
+        # Link interning and row hashes may write first, so arm the transaction now
+        begin_transaction(self.conn, self.pragma_profile)
+        if self.row_hashes is not None:
+            # Hashed before normalizing, so they describe the export itself
+            params = self.row_hashes.new_rows(table_name, self.user_id, params)
+            lap('hash')
+            if not params:
+                return 0
+        if table_name in self.normalizers:
+            field, normalize = self.normalizers[table_name]
+            if field in value_columns:
+                index = value_columns.index(field) + 1
+                for values in params:
+                    values[index] = normalize(values[index])
+            lap('normalize')
+        if self.storage is None:
+            self.storage = StorageEncoder(self.conn)
+        target, insert_columns = table_name, columns
+        if table_name in self.storage.layouts:
+            target, insert_columns, params = self.storage.encode(table_name, columns, params)
+            lap('encode')
+        self.conn.executemany(self.insert_sql(target, insert_columns), params)
+        lap('insert', len(params))
+        self.statistics[table_name] = self.statistics.get(table_name, 0) + len(params)
+        return len(params)
+
+    def commit_deltas(self, table_counts, table_name=None):
+        """record_deltas() and commit, timed as the 'commit' stage of table_name"""
+        lap = self.metrics.lap(table_name) if self.metrics is not None else _skip_lap
+        self.record_deltas(table_counts)
+        self.conn.commit()
+        lap('commit')
+
+    def record_deltas(self, table_counts, user_counts=None):
+        """Bookkeeping written in the same transaction as the rows it counts
+
+        user_counts ({user_id: {table: rows}}) splits the per-user counters
+        when the rows belong to several users; table_counts holds the totals.
+        """
+        if self.summaries:
+            for user_id, counts in (user_counts or {self.user_id: table_counts}).items():
+                record_activity(self.conn, user_id, counts)
+            record_monthly(self.conn, table_counts)
+            record_row_counts(self.conn, table_counts)
+        # Bulk loads index everything once in finish_load()
+        fts_tables = [table for table in table_counts if table in self.fts_tables]
+        if fts_tables and not self.bulk_load:
+            sync_fts(self.conn, fts_tables, commit=False)
+
+    def _record_failure(self, table_name, error):
+        self.abort_batch()
+        self.warnings.append({
+            'type': 'ingest_warning',
+            'table': table_name,
+            'message': str(error)
+        })
+        self.log(f"  Error loading {table_name}: {error}")
+
+    def load_table(self, table_name, columns, rows):
+        """Insert rows for one table in executemany batches inside one transaction"""
+        self.connect()
+        rows = iter(rows)
+        before = self.statistics.get(table_name, 0)
+
+        started = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.open_section()
+        inserted = 0
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                inserted += self.insert_batch(table_name, columns, batch)
+            self.commit_deltas({table_name: inserted}, table_name)
+        except sqlite3.Error as e:
+            self.statistics[table_name] = before
+            self._record_failure(table_name, e)
+            return 0
+
+        elapsed = time.perf_counter() - started
+        if self.metrics is not None:
+            # Rows are mapped lazily while batches are read
+            self.metrics.close_section(table_name, elapsed)
+        if inserted:
+            self.timings[table_name] = self.timings.get(table_name, 0) + elapsed
+            self.log(f"  {table_name}: {inserted:,} rows in {elapsed:.2f}s")
+        return inserted
+
+    def load_stream(self, events):
+        """Insert rows from stream_paths() events, one transaction per export section
+
+        Only batch_size pending rows per table are kept in memory.
+        """
+        self.connect()
+        groups = stream_mapping_groups()
+        pending = {}
+        failed = set()
+        section = None
+        section_started = time.perf_counter()
+        section_counts = {}
+        metrics = self.metrics
+        if metrics is not None:
+            # Time spent inside the stream reader is the parse stage
+            events = metrics.timed_events(events, groups)
+
+        def flush(table_name):
+            mapping_columns, rows = pending.pop(table_name)
+            inserted = self.insert_batch(table_name, mapping_columns, rows)
+            section_counts[table_name] = section_counts.get(table_name, 0) + inserted
+
+        def close_section():
+            try:
+                for table_name in list(pending):
+                    flush(table_name)
+                self.commit_deltas(section_counts, groups[section][0][1]['table'])
+            except sqlite3.Error as e:
+                self._fail_section(section, section_counts, e)
+                failed.add(section)
+                pending.clear()
+                return
+            elapsed = time.perf_counter() - section_started
+            if metrics is not None:
+                metrics.close_section(groups[section][0][1]['table'], elapsed)
+            for table_name, count in section_counts.items():
+                self.timings[table_name] = self.timings.get(table_name, 0) + elapsed
+                self.log(f"  {table_name}: {count:,} rows in {elapsed:.2f}s")
+
+        for path, key, value in events:
+            if path != section:
+                if section is not None and section not in failed:
+                    close_section()
+                section = path
+                section_started = time.perf_counter()
+                section_counts = {}
+                if metrics is not None:
+                    metrics.open_section()
+            if section in failed:
+                continue
+
+            try:
+                for table_name, mapping_columns, row in iter_event_rows(groups[path], key, value):
+                    entry = pending.setdefault(table_name, (mapping_columns, []))
+                    entry[1].append(row)
+                    if len(entry[1]) >= self.batch_size:
+                        flush(table_name)
+            except sqlite3.Error as e:
+                self._fail_section(section, section_counts, e)
+                failed.add(section)
+                pending.clear()
+
+        if section is not None and section not in failed:
+            close_section()
+
+    def _fail_section(self, section, section_counts, error):
+        for table_name, count in section_counts.items():
+            self.statistics[table_name] = self.statistics.get(table_name, 0) - count
+        self._record_failure(section, error)
+
+    def summary(self):
+        """Statistics for the last ingested export"""
+        return {
+            'user_id': self.user_id,
+            'username': self.user['username'] if self.user else None,
+            'statistics': dict(self.statistics),
+            'total_records': sum(self.statistics.values()),
+            'timings': dict(self.timings),
+            'warnings': list(self.warnings),
+            'skipped': dict(self.row_hashes.skipped) if self.row_hashes is not None else {},
+            'backfilled': dict(self.row_hashes.backfilled) if self.row_hashes is not None else {}
+        }
+
+
+def ingest_file(json_path, db_name=DEFAULT_DB_NAME, batch_size=DEFAULT_BATCH_SIZE, streaming=False,
+                bulk_load=False, validation='triggers', fts=False, normalize=None, links=False,
+                epoch_dates=False, pragma_profile=None, differential=False):
+    """Convenience wrapper: ingest one export file and close the connection"""
+    ingester = TikTokIngester(db_name, batch_size=batch_size, streaming=streaming,
+                              bulk_load=bulk_load, validation=validation, fts=fts,
+                              normalize=normalize, links=links, epoch_dates=epoch_dates,
+                              pragma_profile=pragma_profile, differential=differential)
+    try:
+        return ingester.ingest_file(json_path)
+    finally:
+        ingester.close()
+
+
+def main():
+    """Command line entry point: python ingestDb.py user_data.json [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load a TikTok export into SQLite')
+    parser.add_argument('json_path', help='Path to user_data.json or the export .zip')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--stream', action='store_true',
+                        help='Parse incrementally so memory depends on batch size, not file size')
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Build indexes and run validation after loading instead of per row')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers',
+                        help="'set' validates loaded rows in one pass per rule instead of per-row triggers")
+    parser.add_argument('--fts', action='store_true',
+                        help='Create full-text indexes for messages, comments and searches')
+    parser.add_argument('--normalize', nargs='?', const='default', choices=sorted(PRESETS),
+                        help='Shorten messages and reduce links to ids like normalizer.js')
+    parser.add_argument('--links', action='store_true',
+                        help='Store video and live links once in a links table, referenced by id')
+    parser.add_argument('--epoch-dates', action='store_true',
+                        help='Store dates as INTEGER Unix seconds; views still show them as text')
+    parser.add_argument('--pragmas', choices=sorted(PRAGMA_PROFILES), default=None,
+                        help='Connection PRAGMA profile; bulk_load skips fsyncs and can corrupt the file on a crash')
+    parser.add_argument('--differential', action='store_true',
+                        help='Only insert rows not loaded before for this user (re-ingest of a newer export)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_path):
+        print(f"Export file {args.json_path} not found!")
+        return
+
+    print("=" * 60)
+    print("TikTok Data Ingester")
+    print("=" * 60)
+
+    result = ingest_file(args.json_path, args.db_name, batch_size=args.batch_size,
+                         streaming=args.stream, bulk_load=args.bulk_load,
+                         validation=args.validation, fts=args.fts, normalize=args.normalize,
+                         links=args.links, epoch_dates=args.epoch_dates,
+                         pragma_profile=args.pragmas, differential=args.differential)
+
+    print(f"\nLoaded {result['total_records']:,} records for {result['username']}")
+    if sum(result['skipped'].values()):
+        print(f"Skipped {sum(result['skipped'].values()):,} rows already loaded")
+    if sum(result['backfilled'].values()):
+        print(f"Hashed {sum(result['backfilled'].values()):,} rows loaded without --differential")
+    print(f"Total time: {result['timings']['total']:.2f}s")
+    if result['warnings']:
+        print(f"Warnings: {len(result['warnings'])}")
+
+
+if __name__ == "__main__":
+    main()
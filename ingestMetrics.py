@@ -0,0 +1,380 @@
+import sqlite3
+import os
+import json
+import time
+import cProfile
+import pstats
+import io
+
+from ingestDb import DEFAULT_DB_NAME, DEFAULT_BATCH_SIZE, VALIDATION_MODES, TikTokIngester
+from createDb import PRAGMA_PROFILES
+from storageLayout import table_layouts, storage_table
+
+# Stages reported by TikTokIngester; 'map' is section time not spent in the others
+INGEST_STAGES = ('parse', 'map', 'hash', 'normalize', 'encode', 'insert', 'commit')
+# finish_load() timings that are whole-export stages
+FINISH_STAGES = {'indexes': 'index_build', 'validation': 'validation', 'fts': 'fts'}
+
+DEFAULT_TRIGGER_SAMPLE = 1000
+
+
+class IngestMetrics:
+    """Per-stage timers for one or more ingests
+
+    Attach to TikTokIngester.metrics; the ingester reports each batch's
+    stages through lap() and each section's wall time through
+    close_section(). Timings are {(stage, table): [seconds, calls, rows]};
+    table None means the whole export.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.section_mark = 0.0
+        self.total = 0.0
+
+    def add(self, stage, table, seconds, rows=0):
+        entry = self.stages.get((stage, table))
+        if entry is None:
+            entry = self.stages[(stage, table)] = [0.0, 0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += rows
+        self.total += seconds
+
+    def lap(self, table):
+        """Callable that books the time since the previous lap to a stage"""
+        last = [time.perf_counter()]
+
+        def lap(stage, rows=0):
+            now = time.perf_counter()
+            self.add(stage, table, now - last[0], rows)
+            last[0] = now
+        return lap
+
+    def timed_events(self, events, groups):
+        """Wrap stream_paths() events, booking the reader's time as 'parse'"""
+        events = iter(events)
+        perf_counter = time.perf_counter
+        while True:
+            started = perf_counter()
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            self.add('parse', groups[event[0]][0][1]['table'], perf_counter() - started)
+            yield event
+
+    def open_section(self):
+        self.section_mark = self.total
+
+    def close_section(self, table, elapsed):
+        """Book the part of a section's wall time no other stage accounted for as 'map'"""
+        self.add('map', table, max(elapsed - (self.total - self.section_mark), 0.0))
+
+    def record_timings(self, timings):
+        """Pick up the whole-export stages of TikTokIngester.timings"""
+        for name, stage in FINISH_STAGES.items():
+            if isinstance(timings.get(name), float):
+                self.add(stage, None, timings[name])
+
+    def tables(self):
+        """{table: {'rows', 'seconds', 'rows_per_second', 'stages': {stage: seconds}}}"""
+        tables = {}
+        for (stage, table), (seconds, _, rows) in self.stages.items():
+            if table is None:
+                continue
+            item = tables.setdefault(table, {'rows': 0, 'seconds': 0.0, 'stages': {}})
+            item['rows'] += rows
+            item['seconds'] += seconds
+            item['stages'][stage] = item['stages'].get(stage, 0.0) + seconds
+        for item in tables.values():
+            item['rows_per_second'] = item['rows'] / item['seconds'] if item['seconds'] else 0.0
+        return tables
+
+    def stage_totals(self):
+        totals = {}
+        for (stage, _), (seconds, _, _) in self.stages.items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+
+def cache_status(conn):
+    """Page cache size of conn against the database it caches
+
+    The sqlite3 module exposes no hit/miss counters; whether the working
+    set fits is judged from the configured cache and the file size, with
+    process_io() showing the reads that missed it.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    # Negative cache_size is in KiB, positive in pages
+    cache_bytes = -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+    database_bytes = page_count * page_size
+    return {
+        'cache_bytes': cache_bytes,
+        'database_bytes': database_bytes,
+        'cache_coverage': min(cache_bytes / database_bytes, 1.0) if database_bytes else 1.0,
+    }
+
+
+def database_stats(conn):
+    return {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in ('page_size', 'page_count', 'freelist_count', 'cache_size', 'journal_mode')}
+
+
+def process_io():
+    """Bytes read and written by this process (Linux /proc/self/io), or {}"""
+    try:
+        with open('/proc/self/io', 'r') as handle:
+            return {name: int(value) for name, value in (line.split(': ') for line in handle)}
+    except (OSError, ValueError):
+        return {}
+
+
+class StatementTrace:
+    """Count the statements a connection runs, by their first words (sqlite3 trace callback)"""
+
+    def __init__(self, conn, width=60):
+        self.conn = conn
+        self.width = width
+        self.counts = {}
+        conn.set_trace_callback(self.record)
+
+    def record(self, statement):
+        key = ' '.join(statement.split())[:self.width]
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self.conn.set_trace_callback(None)
+
+    def top(self, limit=20):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def trigger_tables(conn):
+    """{table: [trigger names]} of tables with triggers, keyed by the logical table"""
+    layouts = table_layouts(conn)
+    storage = {storage_table(table, layouts): table for table in layouts}
+    tables = {}
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type='trigger' ORDER BY name"):
+        tables.setdefault(storage.get(table, table), []).append(name)
+    return tables
+
+
+def _timed(conn, sql):
+    started = time.perf_counter()
+    conn.execute(sql)
+    return time.perf_counter() - started
+
+
+def measure_trigger_overhead(conn, tables=None, sample=DEFAULT_TRIGGER_SAMPLE, rounds=2):
+    """Seconds per row the triggers of each table add to an insert
+
+    Copies up to sample existing rows of the table inside a savepoint, once
+    with its triggers and once after dropping them, and rolls both back.
+    Run with no transaction open. Returns {table: {...}}.
+    """
+    layouts = table_layouts(conn)
+    by_table = trigger_tables(conn)
+    results = {}
+    for table in tables or sorted(by_table):
+        if table not in by_table:
+            continue
+        target = storage_table(table, layouts)
+        info = conn.execute(f"PRAGMA table_info({target})").fetchall()
+        columns = ', '.join(row[1] for row in info if not row[5])
+        rows = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {target} LIMIT ?)", (sample,)).fetchone()[0]
+        if not rows:
+            continue
+        copy = f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {target} LIMIT {rows}"
+        triggered, bare = [], []
+        conn.execute("SAVEPOINT trigger_overhead")
+        try:
+            for _ in range(rounds):
+                triggered.append(_timed(conn, copy))
+                conn.execute("ROLLBACK TO trigger_overhead")
+                for name in by_table[table]:
+                    conn.execute(f"DROP TRIGGER {name}")
+                bare.append(_timed(conn, copy))
+                # Also brings the dropped triggers back
+                conn.execute("ROLLBACK TO trigger_overhead")
+        except sqlite3.IntegrityError as e:
+            results[table] = {'error': str(e)}
+            continue
+        finally:
+            conn.execute("ROLLBACK TO trigger_overhead")
+            conn.execute("RELEASE trigger_overhead")
+        with_triggers, without = min(triggered), min(bare)
+        results[table] = {
+            'triggers': by_table[table],
+            'rows': rows,
+            'seconds_with_triggers': with_triggers,
+            'seconds_without_triggers': without,
+            'seconds_per_row': max(with_triggers - without, 0.0) / rows,
+            'overhead_ratio': with_triggers / without if without else None,
+        }
+    return results
+
+
+def measure_query(conn, sql, params=()):
+    """Time fetching every row of sql, with the process I/O it caused"""
+    before = process_io()
+    started = time.perf_counter()
+    rows = sum(1 for _ in conn.execute(sql, params))
+    seconds = time.perf_counter() - started
+    after = process_io()
+    return {
+        'sql': sql,
+        'rows': rows,
+        'seconds': seconds,
+        'io': {name: after[name] - before.get(name, 0) for name in after if name in ('rchar', 'read_bytes')},
+    }
+
+
+def instrumented_ingest(json_path, db_name=DEFAULT_DB_NAME, profile=False, trace=False,
+                        trigger_sample=DEFAULT_TRIGGER_SAMPLE, queries=(), **options):
+    """Ingest one export with metrics attached; returns the metrics report
+
+    profile=True also runs it under cProfile (report['profile'] holds the
+    top functions and report['profiler'] the pstats.Stats); trace=True
+    counts the statements SQLite ran. A trigger_sample of 0 skips the
+    trigger overhead measurement.
+    """
+    metrics = IngestMetrics()
+    ingester = TikTokIngester(db_name, verbose=False, **options)
+    ingester.metrics = metrics
+    report = {'export': os.path.abspath(json_path), 'db_name': db_name, 'options': options}
+    io_before = process_io()
+    conn = ingester.connect()
+    tracer = StatementTrace(conn) if trace else None
+    profiler = cProfile.Profile() if profile else None
+
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = ingester.ingest_file(json_path)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        report['seconds'] = time.perf_counter() - started
+        metrics.record_timings(result['timings'])
+        if tracer is not None:
+            tracer.stop()
+            report['statements'] = tracer.top()
+
+        report['rows'] = result['total_records']
+        report['rows_per_second'] = result['total_records'] / report['seconds'] if report['seconds'] else 0.0
+        report['tables'] = metrics.tables()
+        report['stages'] = metrics.stage_totals()
+        report['warnings'] = result['warnings']
+        report['cache'] = cache_status(conn)
+        report['database'] = database_stats(conn)
+        io_after = process_io()
+        report['io'] = {name: io_after[name] - io_before.get(name, 0) for name in io_after}
+        report['triggers'] = measure_trigger_overhead(conn, sample=trigger_sample) if trigger_sample else {}
+        report['queries'] = [measure_query(conn, sql) for sql in queries]
+    finally:
+        ingester.close()
+
+    if profiler is not None:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(25)
+        report['profile'] = stream.getvalue()
+        report['profiler'] = stats
+    return report
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(report, prefix='tik'):
+    """Prometheus text exposition of an instrumented_ingest() report"""
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+    metric('ingest_seconds', 'Wall time of the ingest', [({}, report['seconds'])])
+    metric('ingest_rows', 'Rows loaded', [({}, report['rows'])])
+    metric('ingest_rows_per_second', 'Rows loaded per second of wall time', [({}, report['rows_per_second'])])
+    stage_samples = [({'stage': stage, 'table': ''}, seconds) for stage, seconds in sorted(report['stages'].items())]
+    for table, item in sorted(report['tables'].items()):
+        stage_samples += [({'stage': stage, 'table': table}, seconds)
+                          for stage, seconds in sorted(item['stages'].items())]
+    metric('ingest_stage_seconds', 'Seconds per ingest stage (table="" is the total)', stage_samples)
+    metric('ingest_table_rows', 'Rows loaded per table',
+           [({'table': table}, item['rows']) for table, item in sorted(report['tables'].items())])
+    metric('ingest_table_rows_per_second', 'Rows per second of time spent on the table',
+           [({'table': table}, item['rows_per_second']) for table, item in sorted(report['tables'].items())])
+    metric('trigger_seconds_per_row', 'Insert time the triggers of a table add per row',
+           [({'table': table}, item['seconds_per_row'])
+            for table, item in sorted(report['triggers'].items()) if 'seconds_per_row' in item])
+    metric('sqlite_cache', 'Page cache size of the ingest connection against the database',
+           [({'kind': name}, value) for name, value in sorted(report['cache'].items())])
+    metric('sqlite_database', 'Database PRAGMA values',
+           [({'pragma': name}, value) for name, value in sorted(report['database'].items())
+            if isinstance(value, int)])
+    metric('process_io', 'Process I/O counters moved by the ingest (/proc/self/io)',
+           [({'kind': name}, value) for name, value in sorted(report['io'].items())])
+    metric('query_seconds', 'Seconds to fetch every row of a query',
+           [({'sql': item['sql']}, item['seconds']) for item in report['queries']])
+    return '\n'.join(lines) + '\n'
+
+
+def to_json(report):
+    return json.dumps({key: value for key, value in report.items() if key != 'profiler'}, indent=2, default=str)
+
+
+def main():
+    """Command line entry point: python ingestMetrics.py user_data.json [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Ingest an export and report per-stage metrics')
+    parser.add_argument('json_path', help='Path to user_data.json or the export .zip')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--format', choices=('json', 'prometheus'), default='json', dest='output_format')
+    parser.add_argument('--output', help='Write the report to this file instead of stdout')
+    parser.add_argument('--profile', action='store_true', help='Run under cProfile and include the top functions')
+    parser.add_argument('--profile-out', help='Also save the raw cProfile stats to this file')
+    parser.add_argument('--trace', action='store_true', help='Count statements with the sqlite3 trace callback')
+    parser.add_argument('--trigger-sample', type=int, default=DEFAULT_TRIGGER_SAMPLE,
+                        help='Rows copied per table to measure trigger overhead (0 to skip)')
+    parser.add_argument('--query', action='append', dest='queries', default=[],
+                        help='Time this query after the ingest (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--bulk-load', action='store_true')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers')
+    parser.add_argument('--pragmas', choices=sorted(PRAGMA_PROFILES), default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_path):
+        print(f"Export file {args.json_path} not found!")
+        return
+
+    report = instrumented_ingest(args.json_path, args.db_name, profile=args.profile or bool(args.profile_out),
+                                 trace=args.trace, trigger_sample=args.trigger_sample, queries=args.queries,
+                                 batch_size=args.batch_size, streaming=args.stream, bulk_load=args.bulk_load,
+                                 validation=args.validation, pragma_profile=args.pragmas)
+    if args.profile_out:
+        report['profiler'].dump_stats(args.profile_out)
+    text = to_prometheus(report) if args.output_format == 'prometheus' else to_json(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        print(f"Metrics written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import re
+import json
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL_RE = re.compile(r'["\[\]{}]')
+_STRING_TAIL_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+
+def _strip_key(key):
+    return re.sub(r'[^a-zA-Z0-9]', '', key)
+
+
+class JsonStreamReader:
+    """Incremental JSON reader over a text file handle
+
+    Only the bytes of the current value (plus one read chunk) are held in
+    memory, so walking a multi-GB export costs O(chunk + largest item).
+    """
+
+    def __init__(self, handle, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.base = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, min_size=0):
+        """Drop consumed text and append the next chunk; False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.handle.read(max(self.chunk_size, min_size))
+        self.base += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+            return False
+        return True
+
+    @property
+    def offset(self):
+        """Characters consumed since the start of the document"""
+        return self.base + self.pos
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at EOF)"""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error(f"Expected {char!r}")
+        self.pos += 1
+
+    def read_value(self):
+        """Decode the complete value at the current position"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Probably cut by the chunk boundary; grow the buffer and retry
+                if not self._fill(len(self.buffer)):
+                    raise
+                continue
+            # A number ending exactly at the buffer end may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        """Move past the value at the current position without building it"""
+        char = self.peek()
+        if char not in ('[', '{'):
+            self.read_value()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURAL_RE.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise self._error('Unexpected end of file')
+                continue
+
+            char = match.group()
+            if char == '"':
+                tail = _STRING_TAIL_RE.match(self.buffer, match.end())
+                if tail is None:
+                    # String continues in the next chunk; rescan from its start
+                    self.pos = match.start()
+                    if not self._fill(len(self.buffer)):
+                        raise self._error('Unterminated string')
+                    continue
+                self.pos = tail.end()
+                continue
+
+            self.pos = match.end()
+            depth += 1 if char in ('[', '{') else -1
+            if depth == 0:
+                return
+
+    def iter_object_keys(self):
+        """Yield each key of the object at the current position
+
+        The caller must consume (read or skip) the value before resuming.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise self._error('Expected object key')
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise self._error("Expected ',' or '}'")
+
+    def iter_array_items(self):
+        """Yield once per array element; the caller consumes each element"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise self._error("Expected ',' or ']'")
+
+
+class _PathNode:
+    def __init__(self):
+        self.children = {}
+        self.target = None
+
+    def match(self, key):
+        """Exact key first, then the punctuation-insensitive match the JS mapper uses"""
+        if key in self.children:
+            return self.children[key]
+        return self.children.get(_strip_key(key))
+
+
+def _build_path_tree(targets):
+    root = _PathNode()
+    for path, mode in targets.items():
+        node = root
+        for part in path.split('.'):
+            child = node.children.get(part)
+            if child is None:
+                child = _PathNode()
+                node.children[part] = child
+                node.children.setdefault(_strip_key(part), child)
+            node = child
+        node.target = (path, mode)
+    return root
+
+
+def stream_paths(handle, targets, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (path, key, value) events for the requested dotted paths
+
+    targets maps a path to a mode:
+      'array'   - one event per element of the array at path (key is None)
+      'dynamic' - for each key of the object at path, one event per element
+                  when the value is an array, else one event with the value
+      'object'  - a single event with the whole value at path
+    Everything else in the document is skipped without being decoded.
+    """
+    reader = JsonStreamReader(handle, chunk_size)
+    if reader.peek() != '{':
+        raise reader._error('Export root must be a JSON object')
+    root = _build_path_tree(targets)
+    for event in _walk(reader, root, _emit):
+        yield event
+
+
+def section_sizes(handle, paths, chunk_size=DEFAULT_CHUNK_SIZE, capture=None):
+    """Size in characters of each requested section, found by skipping only
+
+    Sections named in the optional capture dict are decoded instead of
+    skipped and stored there, so a small section such as the profile can be
+    read in the same pass.
+    """
+    reader = JsonStreamReader(handle, chunk_size)
+    if reader.peek() != '{':
+        raise reader._error('Export root must be a JSON object')
+    targets = {path: None for path in paths}
+    if capture is not None:
+        targets.update({path: capture for path in capture})
+    root = _build_path_tree(targets)
+    return dict(_walk(reader, root, _measure))
+
+
+def _walk(reader, node, on_target):
+    if reader.peek() != '{':
+        reader.skip_value()
+        return
+    for key in reader.iter_object_keys():
+        child = node.match(key)
+        if child is None:
+            reader.skip_value()
+        elif child.target is not None:
+            for event in on_target(reader, *child.target):
+                yield event
+        else:
+            for event in _walk(reader, child, on_target):
+                yield event
+
+
+def _measure(reader, path, capture):
+    reader.peek()
+    start = reader.offset
+    if capture is None:
+        reader.skip_value()
+    else:
+        capture[path] = reader.read_value()
+    yield path, reader.offset - start
+
+
+def _emit(reader, path, mode):
+    char = reader.peek()
+    if mode == 'array':
+        if char != '[':
+            reader.skip_value()
+            return
+        for _ in reader.iter_array_items():
+            yield path, None, reader.read_value()
+    elif mode == 'dynamic':
+        if char != '{':
+            reader.skip_value()
+            return
+        for key in reader.iter_object_keys():
+            if reader.peek() == '[':
+                for _ in reader.iter_array_items():
+                    yield path, key, reader.read_value()
+            else:
+                yield path, key, reader.read_value()
+    else:
+        yield path, None, reader.read_value()
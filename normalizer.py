@@ -0,0 +1,381 @@
+import re
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 65536
+
+# Port of DataNormalizerCore.registerProcessors() (normalizer.js)
+PROCESSORS = {
+    'group_chats': {'input_field': 'message_content', 'kind': 'message',
+                    'process_tiktok': True, 'process_media': True, 'shorten': True},
+    'direct_messages': {'input_field': 'message_content', 'kind': 'message',
+                        'process_tiktok': True, 'process_media': True, 'shorten': True},
+    'comments': {'input_field': 'comment_text', 'kind': 'message',
+                 'process_tiktok': False, 'process_media': True, 'shorten': True},
+    'reposts': {'input_field': 'video_link', 'kind': 'link',
+                'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'share_history': {'input_field': 'shared_link', 'kind': 'link',
+                      'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'posts': {'input_field': 'video_link', 'kind': 'link',
+              'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'liked_videos': {'input_field': 'video_link', 'kind': 'link',
+                     'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'deleted_posts': {'input_field': 'video_link', 'kind': 'link',
+                      'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'favorite_videos': {'input_field': 'video_link', 'kind': 'link',
+                        'process_tiktok': True, 'process_media': False, 'shorten': False},
+    'favorite_sounds': {'input_field': 'sound_link', 'kind': 'sound_link',
+                        'process_tiktok': False, 'process_media': True, 'shorten': False},
+    'favorite_effects': {'input_field': 'effect_link', 'kind': 'effect_link',
+                         'process_tiktok': False, 'process_media': True, 'shorten': False},
+}
+
+NormalizeOptions = namedtuple('NormalizeOptions', [
+    'max_length', 'extract_video_id', 'extract_media_filename',
+    'preserve_urls', 'smart_truncate', 'ellipsis'
+])
+
+# processData(), quickProcess(), compressMax() and preserveAll() defaults
+PRESETS = {
+    'default': NormalizeOptions(100, True, True, True, False, '...'),
+    'quick': NormalizeOptions(100, True, True, False, True, '...'),
+    'compress': NormalizeOptions(50, True, True, False, True, '...'),
+    'preserve': NormalizeOptions(200, True, True, True, False, '...'),
+}
+
+# Every pattern is compiled once at import. JavaScript \d is ASCII-only, hence [0-9].
+_HAS_URL_RE = re.compile(r'https?://[^\s\]]+')
+_TIKTOK_TEXT_RE = re.compile(r'https://www\.tiktokv\.com/share/video/([0-9]+)', re.I)
+_BRACKETED_URL_RE = re.compile(r'\[https?://[^\]]+/([^/?\]]+)(?:\?[^\]]*)?\]')
+_MEDIA_URL_RE = re.compile(r'(https?://[^\s]+/([^/?\s]+)(?:\?[^\s]*)?)')
+_TIKTOK_LINK_RE = re.compile(r'https://www\.tiktokv\.com/share/video/([0-9]+)(?:/|\Z)')
+_STORAGE_LINK_RE = re.compile(r'https://video-(?:[^/]+)\.tiktokv\.com/storage/v1/[^/]+/([^/?&]+)', re.I)
+_FILENAME_RE = re.compile(r'/([^/?&]+)(?:\?|\Z)', re.I)
+_URL_FILENAME_RE = re.compile(r'https?://[^\s]+/([^/?\s]+)(?:\?[^\s]*)?')
+_TIKTOK_EFFECT_RE = re.compile(r'https?://(?:www\.)?tiktok\.com/[^\s]*/(?:effect|sticker)/([^/?\s]+)', re.I)
+_PLACEHOLDER_URL_RE = re.compile(r'https?://[^\s\]]+')
+
+MEDIA_MARKERS = ('.mp4', '.mp3', '.jpg', '.png', '.gif', '.webp', 'tiktok.com', 'tiktokv.com')
+
+
+def _rewrite_pattern(video_ids, media):
+    """One alternation finding every span any of the enabled rewrites touches"""
+    parts = []
+    if media:
+        parts.append(_BRACKETED_URL_RE.pattern)
+    if video_ids:
+        parts.append(f"(?i:{_TIKTOK_TEXT_RE.pattern})")
+    if media:
+        parts.append(_MEDIA_URL_RE.pattern)
+    return re.compile('|'.join(parts)) if parts else None
+
+
+_REWRITE_PATTERNS = {
+    (video_ids, media): _rewrite_pattern(video_ids, media)
+    for video_ids in (False, True) for media in (False, True)
+}
+
+
+def safe_to_string(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    try:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _to_base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if number == 0:
+        return '0'
+    result = ''
+    while number:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+    return result
+
+
+def generate_short_hash(text, length=8):
+    """Port of generateShortHash(): int32 hash over UTF-16 code units, base 36"""
+    if not text:
+        return ''
+    hash_value = 0
+    encoded = text.encode('utf-16-le')
+    for i in range(0, len(encoded), 2):
+        code_unit = encoded[i] | (encoded[i + 1] << 8)
+        hash_value = (((hash_value << 5) - hash_value) + code_unit) & 0xFFFFFFFF
+    if hash_value >= 0x80000000:
+        hash_value -= 0x100000000
+    return _to_base36(abs(hash_value))[:length].upper()
+
+
+def has_urls(text):
+    return bool(text) and isinstance(text, str) and _HAS_URL_RE.search(text) is not None
+
+
+def extract_video_hash(url):
+    """Video id, storage object hash or filename for a link field"""
+    if not url or not isinstance(url, str):
+        return url or ''
+
+    match = _TIKTOK_LINK_RE.search(url)
+    if match:
+        return match.group(1)
+
+    match = _STORAGE_LINK_RE.search(url)
+    if match:
+        return generate_short_hash(match.group(1), 10)
+
+    match = _FILENAME_RE.search(url)
+    if match:
+        filename = match.group(1)
+        if len(filename) > 20:
+            return generate_short_hash(url, 10)
+        return filename
+
+    return generate_short_hash(url, 12)
+
+
+def _media_filename(match):
+    url, filename = match.group(1), match.group(2)
+    if any(marker in url for marker in MEDIA_MARKERS):
+        return filename
+    return url
+
+
+def extract_video_id_from_text(text):
+    """Replace TikTok share URLs in free text with their video id"""
+    if not text or not isinstance(text, str):
+        return text or ''
+    return _TIKTOK_TEXT_RE.sub(r'\1', text)
+
+
+def extract_media_filenames_from_text(text):
+    """Replace bracketed and media URLs in free text with their filename"""
+    if not text or not isinstance(text, str):
+        return text or ''
+    return _MEDIA_URL_RE.sub(_media_filename, _BRACKETED_URL_RE.sub(r'\1', text))
+
+
+def _rewrite_span(span, video_ids, media):
+    # The same passes normalizer.js runs over the whole text, applied to one span
+    if video_ids:
+        span = extract_video_id_from_text(span)
+    if media:
+        span = extract_media_filenames_from_text(span)
+    return span
+
+
+def rewrite_urls(text, video_ids=True, media=True):
+    """Video-id and media-filename rewrites in a single scan of text
+
+    Spans touched by any rewrite are found with one combined pattern and
+    each span is passed through the original sequence of rewrites, so the
+    result equals running them one after another over the whole text.
+    """
+    pattern = _REWRITE_PATTERNS[(video_ids, media)]
+    if pattern is None:
+        return text
+    return pattern.sub(lambda match: _rewrite_span(match.group(0), video_ids, media), text)
+
+
+def extract_sound_filename(text):
+    if not text or not isinstance(text, str):
+        return text or ''
+    match = _BRACKETED_URL_RE.search(text)
+    if match:
+        return match.group(1)
+    match = _URL_FILENAME_RE.search(text)
+    if match:
+        return match.group(1)
+    return text
+
+
+def extract_effect_filename(text):
+    if not text or not isinstance(text, str):
+        return text or ''
+    match = _BRACKETED_URL_RE.search(text)
+    if match:
+        return match.group(1)
+    match = _URL_FILENAME_RE.search(text)
+    if match:
+        return match.group(1)
+    match = _TIKTOK_EFFECT_RE.search(text)
+    if match:
+        return match.group(1)
+    return text
+
+
+def shorten_message(text, max_length=100, preserve_urls=True, ellipsis='...'):
+    """Port of shortenMessage(): cut at a word boundary without splitting URLs"""
+    if not text or not isinstance(text, str):
+        return text or ''
+    if len(text) <= max_length:
+        return text
+
+    shortened = text
+    url_map = []
+    if preserve_urls:
+        matches = list(_PLACEHOLDER_URL_RE.finditer(text))
+        for i in range(len(matches) - 1, -1, -1):
+            match = matches[i]
+            placeholder = f"__URL_{i}__"
+            url_map.append((placeholder, match.group(0)))
+            shortened = shortened[:match.start()] + placeholder + shortened[match.end():]
+
+    if len(shortened) > max_length:
+        cut_index = max_length - len(ellipsis)
+        last_space = shortened.rfind(' ', 0, max(cut_index, 0) + 1)
+        if last_space > max_length * 0.5:
+            cut_index = last_space
+
+        for placeholder, _ in url_map:
+            index = shortened.find(placeholder)
+            if index != -1 and index < cut_index and index + len(placeholder) > cut_index:
+                cut_index = index + len(placeholder)
+                break
+
+        shortened = shortened[:max(cut_index, 0)].strip() + ellipsis
+
+    for placeholder, url in url_map:
+        shortened = shortened.replace(placeholder, url, 1)
+    return shortened
+
+
+def smart_truncate(text, max_length=100, ellipsis='...'):
+    """Port of smartTruncate(): cut at the last space or punctuation"""
+    if not text or not isinstance(text, str):
+        return text or ''
+    if len(text) <= max_length:
+        return text
+
+    cut_length = max_length - len(ellipsis)
+    truncated = text[:max(cut_length, 0)]
+    break_point = max(truncated.rfind(' '), *(truncated.rfind(char) for char in '.,!?;:'))
+    if break_point > cut_length * 0.5:
+        truncated = truncated[:break_point]
+    return truncated.strip() + ellipsis
+
+
+def _to_utf16_units(text):
+    # One str character per UTF-16 code unit, so lengths and cuts match JavaScript
+    data = text.encode('utf-16-le', 'surrogatepass')
+    return ''.join(chr(data[i] | (data[i + 1] << 8)) for i in range(0, len(data), 2))
+
+
+def _from_utf16_units(units):
+    return units.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+
+
+def process_message(text, options):
+    processed = safe_to_string(text)
+    max_length = options.max_length or 100
+
+    if (options.extract_video_id or options.extract_media_filename) and _HAS_URL_RE.search(processed):
+        processed = rewrite_urls(processed, options.extract_video_id, options.extract_media_filename)
+
+    if max_length > 0 and len(processed) > max_length // 2:
+        # Astral characters (emoji) count twice in JavaScript string lengths
+        astral = any(ord(char) > 0xFFFF for char in processed)
+        units = _to_utf16_units(processed) if astral else processed
+        if len(units) > max_length:
+            if options.smart_truncate:
+                units = smart_truncate(units, max_length, options.ellipsis)
+            else:
+                units = shorten_message(units, max_length, options.preserve_urls, options.ellipsis)
+            processed = _from_utf16_units(units) if astral else units
+    return processed
+
+
+def process_link(text, options):
+    processed = safe_to_string(text)
+    return extract_video_hash(processed) if options.extract_video_id else processed
+
+
+def process_sound_link(text, options):
+    processed = safe_to_string(text)
+    return extract_sound_filename(processed) if options.extract_media_filename else processed
+
+
+def process_effect_link(text, options):
+    processed = safe_to_string(text)
+    return extract_effect_filename(processed) if options.extract_media_filename else processed
+
+
+PROCESSOR_FUNCTIONS = {
+    'message': process_message,
+    'link': process_link,
+    'sound_link': process_sound_link,
+    'effect_link': process_effect_link,
+}
+
+
+def processor_options(config, options):
+    """Per-table options, as processArray() derives them from the processor config"""
+    return options._replace(
+        max_length=(options.max_length or 100) if config['shorten'] else 0,
+        extract_video_id=options.extract_video_id and config['process_tiktok'],
+        extract_media_filename=options.extract_media_filename and config['process_media']
+    )
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_value(kind, value, options):
+    """Memoized processor call; repeated links and messages cost one dict lookup"""
+    return PROCESSOR_FUNCTIONS[kind](value, options)
+
+
+def resolve_options(options):
+    """NormalizeOptions from a preset name, an options tuple or None"""
+    if options is None or options is True:
+        return PRESETS['default']
+    if isinstance(options, str):
+        if options not in PRESETS:
+            raise ValueError(f"Unknown normalize preset {options!r}; use one of {', '.join(PRESETS)}")
+        return PRESETS[options]
+    return options
+
+
+def table_normalizers(options='default'):
+    """{table: (input_field, function)} for the ingester to apply to each row value"""
+    options = resolve_options(options)
+    normalizers = {}
+    for table, config in PROCESSORS.items():
+        kind = config['kind']
+        table_options = processor_options(config, options)
+
+        def normalize(value, kind=kind, table_options=table_options):
+            if value is None:
+                return None
+            if not isinstance(value, (str, int, float)):
+                value = safe_to_string(value)
+            return normalize_value(kind, value, table_options)
+
+        normalizers[table] = (config['input_field'], normalize)
+    return normalizers
+
+
+def normalize_rows(table, rows, options='default'):
+    """Normalize the processor field of row dicts in place (normalizeAllData for one table)"""
+    config = PROCESSORS.get(table)
+    if config is None:
+        return rows
+    field, normalize = table_normalizers(options)[table]
+    for row in rows:
+        if field in row:
+            row[field] = normalize(row[field])
+    return rows
+
+
+def cache_info():
+    return normalize_value.cache_info()
@@ -0,0 +1,238 @@
+import sqlite3
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from ingestDb import (
+    DEFAULT_DB_NAME, DEFAULT_BATCH_SIZE, JSON_PATH_MAPPING, PROFILE_PATH, VALIDATION_MODES,
+    TikTokIngester, build_user_row, open_export, stream_path_for, stream_targets
+)
+from normalizer import PRESETS
+from jsonStream import stream_paths, section_sizes, DEFAULT_CHUNK_SIZE
+from storageLayout import table_layouts, storage_table, insert_select, plain_table_sql
+from summaryTables import refresh_summaries, rebuild_monthly_activity, verify_row_counts
+
+
+def plan_worker_groups(sizes, workers):
+    """Split export sections into balanced groups (largest first, greedy)"""
+    groups = [[] for _ in range(max(1, workers))]
+    loads = [0] * len(groups)
+    for path, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        slot = loads.index(min(loads))
+        groups[slot].append(path)
+        loads[slot] += size
+    return [group for group in groups if group]
+
+
+def section_tables(stream_path):
+    """Tables filled from one streamed section"""
+    return [
+        mapping['table'] for path, mapping in JSON_PATH_MAPPING.items()
+        if path != PROFILE_PATH and stream_path_for(path, mapping)[0] == stream_path
+    ]
+
+
+def _load_shard(task):
+    """Worker: stream a group of sections into a private shard database"""
+    json_path, shard_path, group, table_ddl, user_id, batch_size, chunk_size, normalize = task
+
+    conn = sqlite3.connect(shard_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for sql in table_ddl.values():
+        conn.execute(sql)
+    conn.commit()
+
+    ingester = TikTokIngester(shard_path, batch_size=batch_size, verbose=False, normalize=normalize)
+    ingester.conn = conn
+    ingester.user_id = user_id
+
+    targets = {path: mode for path, mode in stream_targets().items() if path in group}
+    with open_export(json_path) as handle:
+        ingester.load_stream(stream_paths(handle, targets, chunk_size))
+
+    ingester.close()
+    return shard_path, ingester.statistics, ingester.timings, ingester.warnings
+
+
+def merge_shard(conn, shard_path, tables, on_merged=None, user_id=None):
+    """Copy shard rows into the main database with ATTACH + INSERT ... SELECT
+
+    on_merged(conn, table_name, count) runs inside each table's transaction,
+    so bookkeeping written there commits atomically with the rows. A given
+    user_id replaces the one the shard was written with.
+    """
+    merged = {}
+    layouts = table_layouts(conn)
+    conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+    try:
+        for table_name in tables:
+            # Shards are plain; encoded tables take link ids, interned up front
+            info = conn.execute(f"PRAGMA main.table_info({storage_table(table_name, layouts)})").fetchall()
+            primary_key = next((row[1] for row in info if row[5]), 'rowid')
+            # Let the main database assign surrogate keys; keep shard order
+            columns = [row[1] for row in conn.execute(f"PRAGMA shard.table_info({table_name})")
+                       if row[1] != primary_key]
+            target, target_columns, selects = insert_select(
+                conn, table_name, columns, f"shard.{table_name}", layouts)
+            select_list = ', '.join('? AS user_id' if column == 'user_id' and user_id is not None
+                                    else select for column, select in zip(columns, selects))
+            cursor = conn.execute(
+                f"INSERT INTO main.{target} ({', '.join(target_columns)}) "
+                f"SELECT {select_list} FROM shard.{table_name} ORDER BY {primary_key}",
+                (user_id,) if user_id is not None and 'user_id' in columns else ()
+            )
+            merged[table_name] = cursor.rowcount
+            if on_merged is not None:
+                on_merged(conn, table_name, cursor.rowcount)
+            conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    return merged
+
+
+def _remove_merged_rows(conn, watermarks, user_id):
+    """Delete rows merged above each table's rowid watermark and recount the summaries
+
+    Undoes the tables a failed merge already committed, so running the
+    export again does not duplicate them.
+    """
+    layouts = table_layouts(conn)
+    conn.rollback()
+    for table_name, watermark in watermarks.items():
+        conn.execute(f"DELETE FROM {storage_table(table_name, layouts)} WHERE rowid > ?", (watermark,))
+    conn.commit()
+    refresh_summaries(conn, [user_id])
+    rebuild_monthly_activity(conn, [user_id])
+    verify_row_counts(conn, list(watermarks))
+
+
+def ingest_parallel(json_path, db_name=DEFAULT_DB_NAME, workers=None,
+                    batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, verbose=True,
+                    bulk_load=False, validation='triggers', normalize=None):
+    """Extract and convert sections in a process pool, then merge into db_name
+
+    Only the users row has to exist before the other tables, so it is
+    registered first; every other table is independent and goes to a
+    per-worker shard that a single writer merges at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    ingester = TikTokIngester(db_name, batch_size=batch_size, verbose=verbose, bulk_load=bulk_load,
+                              validation=validation)
+    conn = ingester.connect()
+    ingester.begin_load()
+
+    # One skip-only pass: measure every section and read the profile
+    profile = {PROFILE_PATH: None}
+    with open_export(json_path) as handle:
+        sizes = section_sizes(handle, stream_targets(), chunk_size, capture=profile)
+    sizes.pop(PROFILE_PATH, None)
+    user_id = ingester.register_user(build_user_row(profile[PROFILE_PATH]))
+
+    groups = plan_worker_groups(sizes, workers)
+    if verbose:
+        print(f"Loading {len(sizes)} sections with {len(groups)} worker(s)...")
+
+    shard_dir = tempfile.mkdtemp(prefix='tik_shards_', dir=os.path.dirname(os.path.abspath(db_name)))
+    tasks = []
+    for index, group in enumerate(groups):
+        tables = [table for path in group for table in section_tables(path)]
+        # Shards always use plain tables, even when the main database is encoded
+        layouts = table_layouts(conn)
+        table_ddl = {table: plain_table_sql(conn, table, layouts) for table in tables}
+        shard_path = os.path.join(shard_dir, f"shard_{index}.db")
+        tasks.append((json_path, shard_path, group, table_ddl, user_id, batch_size, chunk_size, normalize))
+
+    statistics = {'users': 1}
+    warnings = []
+    watermarks = {}
+    merged_all = False
+    try:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = [pool.submit(_load_shard, task) for task in tasks]
+            # Every worker has to succeed before anything is merged, so a
+            # failed worker leaves none of the export in db_name
+            results = [future.result() for future in futures]
+
+        layouts = table_layouts(conn)
+        for shard_path, shard_stats, _, shard_warnings in results:
+            warnings.extend(shard_warnings)
+            tables = [t for t, n in shard_stats.items() if n]
+            for table_name in tables:
+                watermarks.setdefault(table_name, conn.execute(
+                    f"SELECT COALESCE(MAX(rowid), 0) FROM {storage_table(table_name, layouts)}"
+                ).fetchone()[0])
+            merge_started = time.perf_counter()
+            merged = merge_shard(conn, shard_path, tables,
+                                 on_merged=lambda conn, table_name, count:
+                                 ingester.record_deltas({table_name: count}))
+            for table_name, count in merged.items():
+                statistics[table_name] = statistics.get(table_name, 0) + count
+                if verbose:
+                    print(f"  {table_name}: {count:,} rows merged")
+            if verbose and merged:
+                print(f"  shard merged in {time.perf_counter() - merge_started:.2f}s")
+            os.remove(shard_path)
+        merged_all = True
+    finally:
+        try:
+            if not merged_all and watermarks:
+                _remove_merged_rows(conn, watermarks, user_id)
+            # Indexes and triggers a set-based load dropped come back even after a failure
+            ingester.finish_load()
+        finally:
+            ingester.close()
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    return {
+        'user_id': user_id,
+        'username': ingester.user['username'],
+        'statistics': statistics,
+        'total_records': sum(statistics.values()),
+        'timings': dict(ingester.timings, total=time.perf_counter() - started),
+        'warnings': warnings
+    }
+
+
+def main():
+    """Command line entry point: python parallelIngest.py user_data.json [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load a TikTok export using all CPU cores')
+    parser.add_argument('json_path', help='Path to user_data.json or the export .zip')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Build indexes and run validation after merging instead of per row')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers')
+    parser.add_argument('--normalize', nargs='?', const='default', choices=sorted(PRESETS))
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_path):
+        print(f"Export file {args.json_path} not found!")
+        return
+
+    print("=" * 60)
+    print("TikTok Parallel Ingester")
+    print("=" * 60)
+
+    result = ingest_parallel(args.json_path, args.db_name, workers=args.workers,
+                             batch_size=args.batch_size, bulk_load=args.bulk_load,
+                             validation=args.validation, normalize=args.normalize)
+
+    print(f"\nLoaded {result['total_records']:,} records for {result['username']}")
+    print(f"Total time: {result['timings']['total']:.2f}s")
+    if result['warnings']:
+        print(f"Warnings: {len(result['warnings'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+import sqlite3
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+
+from ingestDb import DEFAULT_DB_NAME, TikTokIngester
+from ingestMetrics import _timed
+from queryPool import (
+    USER_STATISTICS_SQL, TOP_SEARCH_TERMS_SQL, USER_TOP_SEARCH_TERMS_SQL, MOST_LIKED_CONTENT_SQL,
+    USER_MOST_LIKED_CONTENT_SQL
+)
+from storageLayout import table_layouts, storage_table
+
+# Canonical dashboard queries: name -> (sql, sample parameters for EXPLAIN QUERY PLAN)
+DASHBOARD_QUERIES = {
+    'user_statistics': (USER_STATISTICS_SQL, ()),
+    'top_search_terms': (TOP_SEARCH_TERMS_SQL, (20,)),
+    'user_top_search_terms': (USER_TOP_SEARCH_TERMS_SQL, (1, 20)),
+    'most_liked_content': (MOST_LIKED_CONTENT_SQL, (20,)),
+    'user_most_liked_content': (USER_MOST_LIKED_CONTENT_SQL, (1, 20)),
+    'user_comments_in_range': (
+        "SELECT * FROM comments WHERE user_id = ? AND comment_date BETWEEN ? AND ? ORDER BY comment_date",
+        (1, '2020-01-01', '2021-01-01')),
+    'user_recent_messages': (
+        "SELECT * FROM direct_messages WHERE user_id = ? ORDER BY message_date DESC LIMIT ?", (1, 50)),
+    'user_logins': ("SELECT * FROM login_history WHERE user_id = ? ORDER BY login_date DESC", (1,)),
+    'search_term_users': ("SELECT DISTINCT user_id FROM searches WHERE search_term = ?", ('term',)),
+    'follower_lookup': ("SELECT user_id, follow_date FROM followers WHERE follower_username = ?", ('name',)),
+    'user_date_issues': ("SELECT * FROM date_validation_log WHERE user_id = ? AND table_name = ?",
+                         (1, 'comments')),
+}
+
+# Tables with fewer rows are not worth an index recommendation
+DEFAULT_MIN_ROWS = 1000
+DEFAULT_SAMPLE_ROWS = 2000
+
+_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_SUBQUERY_RE = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\w+)')
+_SCAN_RE = re.compile(r'^SCAN (\w+)')
+_TABLE_REF_RE = re.compile(
+    r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|INNER|CROSS|NATURAL|GROUP|ORDER|'
+    r'LIMIT|HAVING|UNION|USING)\b)(\w+))?', re.IGNORECASE)
+_SORT_CLAUSE_RE = re.compile(r'\b(?:GROUP|ORDER)\s+BY\s+(.*?)(?=\bHAVING\b|\bORDER\b|\bLIMIT\b|\)|;|$)',
+                             re.IGNORECASE | re.DOTALL)
+_READ_STATEMENT_RE = re.compile(r'^\s*(?:SELECT|WITH|UPDATE|DELETE)\b', re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def explain(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN rows of sql as [detail, ...] in plan order"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def analyze_plan(plan, tables):
+    """Flags of a query plan
+
+    tables is the set of real table names, so scans of co-routines and
+    materialized subqueries are not counted as table scans.
+    """
+    subqueries = {match.group(1) for match in map(_SUBQUERY_RE.match, plan) if match}
+    flags = {'full_scans': [], 'index_scans': [], 'temp_btrees': [], 'automatic_indexes': []}
+    used = set()
+    for detail in plan:
+        used.update(_INDEX_RE.findall(detail))
+        scan = _SCAN_RE.match(detail)
+        if scan and scan.group(1) not in subqueries:
+            if 'INDEX' in detail:
+                flags['index_scans'].append(detail)
+            elif scan.group(1) in tables:
+                flags['full_scans'].append(detail)
+        if 'TEMP B-TREE' in detail:
+            flags['temp_btrees'].append(detail)
+        if 'AUTOMATIC' in detail:
+            flags['automatic_indexes'].append(detail)
+    return flags, used
+
+
+def plan_score(flags):
+    """Lower is better: table scans, then automatic indexes, temp B-trees and index scans"""
+    return (len(flags['full_scans']), len(flags['automatic_indexes']), len(flags['temp_btrees']),
+            len(flags['index_scans']))
+
+
+def view_queries(conn):
+    """{'view:<name>': (sql, ()) } for every vw_* view"""
+    return {f"view:{name}": (f"SELECT * FROM {name}", ()) for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='view' AND name LIKE 'vw_%' ORDER BY name"
+    )}
+
+
+class IngestStatements:
+    """One example of each SELECT/UPDATE/DELETE shape a connection runs (sqlite3 trace callback)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.examples = {}
+        conn.set_trace_callback(self.record)
+
+    def record(self, statement):
+        if _READ_STATEMENT_RE.match(statement):
+            self.examples.setdefault(' '.join(_LITERAL_RE.sub('?', statement).split()), statement)
+
+    def stop(self):
+        self.conn.set_trace_callback(None)
+
+    def queries(self):
+        return {f"ingest:{shape[:60]}": (sql, ()) for shape, sql in self.examples.items()}
+
+
+def _base_tables(conn):
+    """Names of real tables, plus the logical names of encoded tables"""
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    )}
+    return tables | set(table_layouts(conn))
+
+
+def _query_text(conn, sql):
+    """sql followed by the definitions of the views it reads, recursively"""
+    views = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='view'").fetchall())
+    texts, pending, seen = [sql], [sql], set()
+    while pending:
+        for table, _ in _TABLE_REF_RE.findall(pending.pop()):
+            if table in views and table not in seen:
+                seen.add(table)
+                texts.append(views[table])
+                pending.append(views[table])
+    return '\n'.join(texts)
+
+
+def _table_aliases(text, tables):
+    """{table: {names it is referred to by}} for the real tables in text"""
+    aliases = {}
+    for table, alias in _TABLE_REF_RE.findall(text):
+        if table in tables:
+            aliases.setdefault(table, {table}).add(alias or table)
+    return aliases
+
+
+def candidate_indexes(conn, text, table, names, layouts):
+    """Column lists worth trying as an index on table for the query text
+
+    Equality columns come first, then GROUP BY/ORDER BY columns, then range
+    columns; the covering variant appends every other referenced column.
+    """
+    target = storage_table(table, layouts)
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({target})")]
+    sort_text = ' '.join(_SORT_CLAUSE_RE.findall(text))
+    referenced, equal, ranged, sort = [], [], [], []
+    for column in columns:
+        refs = [rf'\b{re.escape(name)}\.{column}\b' for name in names]
+        if len(names) == 1:
+            refs.append(rf'(?<!\.)\b{column}\b')
+        pattern = '(?:' + '|'.join(refs) + ')'
+        if not re.search(pattern, text, re.IGNORECASE):
+            continue
+        referenced.append(column)
+        if re.search(rf'{pattern}\s*(?:=|\bIN\b|\bIS\b)|=\s*{pattern}', text, re.IGNORECASE):
+            equal.append(column)
+        elif re.search(rf'{pattern}\s*(?:<|>|\bBETWEEN\b)', text, re.IGNORECASE):
+            ranged.append(column)
+        if re.search(pattern, sort_text, re.IGNORECASE):
+            sort.append(column)
+
+    def ordered(*groups):
+        seen = []
+        for group in groups:
+            seen += [column for column in group if column not in seen]
+        return tuple(seen)
+
+    candidates = []
+    for option in (ordered(equal, sort), ordered(equal, ranged), ordered(sort),
+                   ordered(equal, sort, ranged, referenced)):
+        if option and len(option) <= 6 and option not in candidates:
+            candidates.append(option)
+    existing = [tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+                for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?",
+                                            (target,))]
+    return [option for option in candidates
+            if not any(index[:len(option)] == option for index in existing)]
+
+
+def try_index(conn, table, columns, sql, params, tables):
+    """Plan flags of sql with a temporary index on table(columns), rolled back afterwards"""
+    conn.execute("SAVEPOINT index_candidate")
+    try:
+        conn.execute(f"CREATE INDEX audit_candidate ON {table} ({', '.join(columns)})")
+        return analyze_plan(explain(conn, sql, params), tables)
+    finally:
+        conn.execute("ROLLBACK TO index_candidate")
+        conn.execute("RELEASE index_candidate")
+
+
+def recommend_index(conn, sql, params, flags, tables, layouts, min_rows=DEFAULT_MIN_ROWS):
+    """Best candidate index for a flagged query, or None when no candidate improves its plan"""
+    text = _query_text(conn, sql)
+    best = None
+    for table, names in sorted(_table_aliases(text, tables).items()):
+        target = storage_table(table, layouts)
+        if conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {target} LIMIT ?)", (min_rows,)).fetchone()[0] < min_rows:
+            continue
+        for columns in candidate_indexes(conn, text, table, names, layouts):
+            new_flags, used = try_index(conn, target, columns, sql, params, tables)
+            if 'audit_candidate' not in used:
+                continue
+            score = plan_score(new_flags)
+            if score < plan_score(flags) and (best is None or score < best['after']):
+                best = {'table': target, 'columns': list(columns), 'before': plan_score(flags), 'after': score,
+                        'sql': f"CREATE INDEX idx_{target}_{'_'.join(columns)} ON {target}({', '.join(columns)})"}
+    return best
+
+
+def index_inventory(conn):
+    """{index: {'table', 'columns', 'unique', 'rows', 'distinct', 'bytes'}} of the schema's named indexes"""
+    try:
+        sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        sizes = {}
+    inventory = {}
+    for name, table in conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type='index' AND sql IS NOT NULL ORDER BY name"
+    ).fetchall():
+        columns = [row[2] for row in conn.execute(f"PRAGMA index_info({name})")]
+        unique = any(row[1] == name and row[2] for row in conn.execute(f"PRAGMA index_list({table})"))
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        # Distinct keys over all indexed columns; a handful means the index barely narrows a lookup
+        distinct = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT DISTINCT {', '.join(columns)} FROM {table})").fetchone()[0] if columns else 0
+        inventory[name] = {'table': table, 'columns': columns, 'unique': unique, 'rows': rows,
+                           'distinct': distinct, 'bytes': sizes.get(name)}
+    return inventory
+
+
+def measure_index_overhead(conn, inventory, sample=DEFAULT_SAMPLE_ROWS, rounds=3):
+    """Insert seconds per row each index adds to its table
+
+    Copies up to sample existing rows of each table inside a savepoint, once
+    with every index and once per index with that index dropped, and rolls
+    every copy back. Run with no transaction open. Returns {index: {...}}.
+    """
+    by_table = {}
+    for name, item in inventory.items():
+        by_table.setdefault(item['table'], []).append(name)
+    results = {}
+    for table, indexes in sorted(by_table.items()):
+        columns = ', '.join(row[1] for row in conn.execute(f"PRAGMA table_info({table})") if not row[5])
+        rows = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT ?)", (sample,)).fetchone()[0]
+        if not rows:
+            continue
+        copy = f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table} LIMIT {rows}"
+        conn.execute("SAVEPOINT index_overhead")
+        try:
+            baseline = []
+            for _ in range(rounds):
+                baseline.append(_timed(conn, copy))
+                conn.execute("ROLLBACK TO index_overhead")
+            without = {}
+            for index in indexes:
+                timings = []
+                for _ in range(rounds):
+                    conn.execute(f"DROP INDEX {index}")
+                    timings.append(_timed(conn, copy))
+                    # Also brings the dropped index back
+                    conn.execute("ROLLBACK TO index_overhead")
+                without[index] = min(timings)
+        except sqlite3.IntegrityError as e:
+            for index in indexes:
+                results[index] = {'error': str(e)}
+            continue
+        finally:
+            conn.execute("ROLLBACK TO index_overhead")
+            conn.execute("RELEASE index_overhead")
+        with_indexes = min(baseline)
+        for index in indexes:
+            item = inventory[index]
+            results[index] = {
+                'rows': rows,
+                'seconds_per_row': max(with_indexes - without[index], 0.0) / rows,
+                'share_of_insert': max(with_indexes - without[index], 0.0) / with_indexes if with_indexes else 0.0,
+                'bytes_per_row': item['bytes'] / item['rows'] if item['bytes'] and item['rows'] else None,
+            }
+    return results
+
+
+def audit(conn, queries=None, min_rows=DEFAULT_MIN_ROWS, sample=DEFAULT_SAMPLE_ROWS):
+    """Plan every query, recommend indexes for flagged ones and report unused indexes
+
+    queries defaults to every view plus DASHBOARD_QUERIES. A sample of 0
+    skips the index write-cost measurement.
+    """
+    if queries is None:
+        queries = dict(view_queries(conn), **DASHBOARD_QUERIES)
+    tables = _base_tables(conn)
+    layouts = table_layouts(conn)
+    report = {'queries': {}, 'recommendations': [], 'indexes': {}}
+    used_by = {}
+    for name, (sql, params) in queries.items():
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            report['queries'][name] = {'sql': sql, 'error': str(e)}
+            continue
+        flags, used = analyze_plan(plan, tables)
+        for index in used:
+            used_by.setdefault(index, []).append(name)
+        entry = {'sql': sql, 'plan': plan, 'flags': flags, 'indexes': sorted(used)}
+        if any(flags.values()) and not name.startswith('ingest:'):
+            started = time.perf_counter()
+            entry['recommendation'] = recommend_index(conn, sql, params, flags, tables, layouts, min_rows)
+            entry['seconds'] = time.perf_counter() - started
+            if entry['recommendation']:
+                report['recommendations'].append(dict(entry['recommendation'], query=name))
+        report['queries'][name] = entry
+
+    inventory = index_inventory(conn)
+    overhead = measure_index_overhead(conn, inventory, sample) if sample else {}
+    for name, item in inventory.items():
+        item['used_by'] = sorted(used_by.get(name, []))
+        item['write_cost'] = overhead.get(name)
+        if item['unique']:
+            item['verdict'] = 'keep (enforces uniqueness)'
+        elif not item['used_by']:
+            item['verdict'] = 'unused: candidate to drop'
+        elif item['distinct'] <= 2 < item['rows']:
+            item['verdict'] = 'low selectivity: check it beats a scan'
+        else:
+            item['verdict'] = 'used'
+        report['indexes'][name] = item
+    return report
+
+
+def sample_ingest(db_name, export_path, work_dir, **options):
+    """Ingest export_path into a copy of db_name, recording the statements the ingester reads with
+
+    The copy is made in work_dir with the backup API and db_name is never
+    written; without db_name the copy starts from the schema template.
+    Returns (ingester, IngestStatements); close the ingester when done.
+    """
+    copy_path = os.path.join(work_dir, 'audit_sample.db')
+    if os.path.exists(db_name):
+        source = sqlite3.connect(db_name)
+        target = sqlite3.connect(copy_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    ingester = TikTokIngester(copy_path, **options)
+    captured = IngestStatements(ingester.connect())
+    try:
+        ingester.ingest_file(export_path)
+    finally:
+        captured.stop()
+    return ingester, captured
+
+
+def print_report(report):
+    print("Query plans:")
+    for name, entry in report['queries'].items():
+        if 'error' in entry:
+            print(f"  {name}: ERROR {entry['error']}")
+            continue
+        flags = entry['flags']
+        notes = [f"{len(items)} {kind.replace('_', ' ')}" for kind, items in flags.items() if items]
+        print(f"  {name}: {', '.join(notes) if notes else 'ok'}")
+        for detail in flags['full_scans'] + flags['automatic_indexes'] + flags['temp_btrees']:
+            print(f"      {detail}")
+
+    print("\nRecommended indexes:")
+    if not report['recommendations']:
+        print("  none")
+    for item in report['recommendations']:
+        print(f"  {item['sql']};  -- {item['query']}: {item['before']} -> {item['after']}")
+
+    print("\nIndexes:")
+    for name, item in sorted(report['indexes'].items(), key=lambda pair: pair[1]['verdict']):
+        cost = item['write_cost'] or {}
+        details = []
+        if 'seconds_per_row' in cost:
+            details.append(f"{cost['seconds_per_row'] * 1e6:.2f}us/row, {cost['share_of_insert']:.0%} of insert")
+        if cost.get('bytes_per_row'):
+            details.append(f"{cost['bytes_per_row']:.0f} B/row")
+        print(f"  {name} ({item['table']}: {', '.join(item['columns'])}): {item['verdict']}"
+              + (f" [{'; '.join(details)}]" if details else ''))
+
+
+def main():
+    """Command line entry point: python queryPlanAudit.py [tikData.db] [--sample user_data.json]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check every view and dashboard query against the index set')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--sample', help='Ingest this export first and include the statements the ingest ran')
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                        help='Skip index recommendations for tables smaller than this')
+    parser.add_argument('--write-sample', type=int, default=DEFAULT_SAMPLE_ROWS,
+                        help='Rows copied per table to measure index write cost (0 to skip)')
+    parser.add_argument('--json', dest='json_path', help='Also write the full report to this file')
+    args = parser.parse_args()
+
+    work_dir = None
+    if args.sample:
+        if not os.path.exists(args.sample):
+            print(f"Export file {args.sample} not found!")
+            return
+        work_dir = tempfile.mkdtemp(prefix='tik_audit_', dir=os.path.dirname(os.path.abspath(args.db_name)))
+        source = f"a copy of {args.db_name}" if os.path.exists(args.db_name) else "a new database"
+        print(f"Ingesting {args.sample} into {source}...")
+        ingester, captured = sample_ingest(args.db_name, args.sample, work_dir, verbose=False)
+        conn = ingester.conn
+        queries = dict(view_queries(conn), **DASHBOARD_QUERIES, **captured.queries())
+    elif not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+    else:
+        ingester = None
+        conn = sqlite3.connect(args.db_name)
+        queries = None
+
+    try:
+        report = audit(conn, queries, min_rows=args.min_rows, sample=args.write_sample)
+    finally:
+        if ingester is not None:
+            ingester.close()
+        else:
+            conn.close()
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import sqlite3
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from createDb import PRAGMA_PROFILES, apply_profile
+
+DEFAULT_DB_NAME = "tikData.db"
+DEFAULT_POOL_SIZE = 4
+
+# Read-only connections cannot change the journal mode or page size; the
+# pool switches the file to WAL once with a writable connection instead
+READER_PRAGMAS = {
+    name: value for name, value in PRAGMA_PROFILES['analytics'].items()
+    if name in ('cache_size', 'mmap_size', 'temp_store')
+}
+
+# Fixed SQL text, so each pooled connection's statement cache reuses the
+# prepared statement instead of compiling it per request
+USER_STATISTICS_SQL = "SELECT * FROM vw_user_statistics"
+TOP_SEARCH_TERMS_SQL = "SELECT * FROM vw_top_search_terms LIMIT ?"
+USER_TOP_SEARCH_TERMS_SQL = "SELECT * FROM vw_top_search_terms WHERE user_id = ? LIMIT ?"
+MOST_LIKED_CONTENT_SQL = "SELECT * FROM vw_most_liked_content LIMIT ?"
+# vw_most_liked_content stops at 100 rows overall, so per-user lists
+# query posts directly with the same columns and order
+USER_MOST_LIKED_CONTENT_SQL = '''
+SELECT p.user_id, u.username, p.post_id, p.video_link, p.likes_count, p.post_date, p.content_disclosure
+FROM posts p
+JOIN users u ON p.user_id = u.user_id
+WHERE u.is_deleted = 0 AND p.likes_count > 0 AND p.user_id = ?
+ORDER BY p.likes_count DESC
+LIMIT ?'''
+
+
+def ensure_wal(db_name):
+    """Switch db_name to WAL (persistent) so readers never wait for the writer"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return apply_profile(conn, {'journal_mode': 'WAL'})['journal_mode']
+    finally:
+        conn.close()
+
+
+def read_only_uri(db_name):
+    return f"file:{quote(os.path.abspath(db_name))}?mode=ro"
+
+
+class QueryPool:
+    """Thread-safe pool of read-only, memory-mapped connections
+
+    Connections are opened once and handed to one thread at a time, so
+    concurrent dashboard requests share them without reopening the file.
+    In WAL mode every query sees the latest committed data while a single
+    writer keeps ingesting; a bulk_load writer holds an exclusive lock and
+    blocks readers until it closes.
+    """
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, size=DEFAULT_POOL_SIZE, timeout=30.0):
+        if not os.path.exists(db_name):
+            raise FileNotFoundError(f"Database {db_name} not found!")
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.journal_mode = ensure_wal(db_name)
+        self.idle = queue.LifoQueue()
+        self.connections = []
+        self.lock = threading.Lock()
+        for _ in range(size):
+            self.idle.put(self._open())
+
+    def _open(self):
+        conn = sqlite3.connect(read_only_uri(self.db_name), uri=True, timeout=self.timeout,
+                               check_same_thread=False)
+        apply_profile(conn, READER_PRAGMAS)
+        with self.lock:
+            self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        try:
+            conn = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No pooled connection became free within {self.timeout}s") from None
+        try:
+            yield conn
+        finally:
+            # A borrower that left a read transaction open would pin the WAL
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+
+    def query(self, sql, params=()):
+        """Run one read query on a pooled connection and return rows as dicts"""
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def user_statistics(self):
+        """Single-row totals from vw_user_statistics"""
+        rows = self.query(USER_STATISTICS_SQL)
+        return rows[0] if rows else {}
+
+    def top_search_terms(self, user_id=None, limit=20):
+        """Most frequent searches from vw_top_search_terms, optionally for one user"""
+        if user_id is None:
+            return self.query(TOP_SEARCH_TERMS_SQL, (limit,))
+        return self.query(USER_TOP_SEARCH_TERMS_SQL, (user_id, limit))
+
+    def most_liked_content(self, user_id=None, limit=20):
+        """Posts with the most likes (vw_most_liked_content), optionally for one user"""
+        if user_id is None:
+            return self.query(MOST_LIKED_CONTENT_SQL, (limit,))
+        return self.query(USER_MOST_LIKED_CONTENT_SQL, (user_id, limit))
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.idle = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    """Command line entry point: python queryPool.py tikData.db [report]"""
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+
+    reports = {
+        'statistics': lambda pool, args: [pool.user_statistics()],
+        'search-terms': lambda pool, args: pool.top_search_terms(args.user_id, args.limit),
+        'most-liked': lambda pool, args: pool.most_liked_content(args.user_id, args.limit),
+    }
+    parser = argparse.ArgumentParser(description='Query the reporting views through a read-only pool')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('report', nargs='?', choices=sorted(reports), default='statistics')
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run the report this many times across the pool and time it')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    with QueryPool(args.db_name, size=args.pool_size) as pool:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.pool_size) as executor:
+            results = list(executor.map(lambda _: reports[args.report](pool, args), range(args.repeat)))
+        elapsed = time.perf_counter() - started
+        for row in results[0]:
+            print('  ' + ', '.join(f"{key}={value}" for key, value in row.items()))
+        print(f"{len(results)} run(s) on {pool.size} connection(s) in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
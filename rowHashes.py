@@ -0,0 +1,214 @@
+import sqlite3
+import os
+import time
+from hashlib import blake2b
+
+from storageLayout import table_layouts, storage_table
+
+LOOKUP_CHUNK = 500
+
+ROW_HASH_SCHEMA = '''
+-- 64-bit content hash of every row loaded by a differential ingest
+CREATE TABLE IF NOT EXISTS ingest_row_hashes (
+    table_name TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    row_hash INTEGER NOT NULL,
+    PRIMARY KEY (table_name, user_id, row_hash),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+'''
+
+
+def ensure_row_hashes(conn):
+    conn.executescript(ROW_HASH_SCHEMA)
+
+
+def content_key(values):
+    """Canonical bytes of a row's values; text and numbers compare by their text,
+    as SQLite's column affinity may have converted one into the other"""
+    return '\x1f'.join(['\x00' if value is None else str(value) for value in values]).encode('utf-8')
+
+
+def row_hash(key, occurrence=0):
+    """Signed 64-bit blake2b of a content key; the nth identical row hashes differently"""
+    digest = blake2b(key, digest_size=8)
+    if occurrence:
+        digest.update(f'\x1e{occurrence}'.encode('ascii'))
+    return int.from_bytes(digest.digest(), 'big', signed=True)
+
+
+def hashed_tables():
+    """{table: columns} of every export table except users (upserted by the registry)"""
+    from ingestDb import JSON_PATH_MAPPING, table_columns
+
+    return {mapping['table']: table_columns(mapping)
+            for mapping in JSON_PATH_MAPPING.values() if mapping['table'] != 'users'}
+
+
+class RowHashIndex:
+    """Skip rows an earlier differential ingest already loaded
+
+    A row's identity is the hash of its mapped values (everything but the
+    surrogate key and user_id). Identical rows within one export are
+    numbered, so an export that repeats a row twice still loads it twice,
+    and once more if a later export has it three times. Rows that changed
+    arrive as new rows; rows missing from a newer export are kept. A user
+    with rows in a table but no hashes for it (loaded without --differential)
+    is backfilled on first sight, so those rows are not loaded twice.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        # table -> {first-occurrence hash: times seen in this export}
+        self.occurrences = {}
+        self.skipped = {}
+        # table -> whether the user had hashes before this export; a first
+        # load has nothing to look up
+        self.seeded = {}
+        self.backfilled = {}
+        ensure_row_hashes(conn)
+
+    def reset(self):
+        """Forget occurrence counts (call before each export)"""
+        self.occurrences = {}
+        self.skipped = {}
+        self.seeded = {}
+        self.backfilled = {}
+
+    def _seed(self, table_name, user_id):
+        """Whether the user has hashes for table_name, backfilling them from
+        rows loaded without --differential in the caller's transaction"""
+        if self.conn.execute(
+            "SELECT 1 FROM ingest_row_hashes WHERE table_name = ? AND user_id = ? LIMIT 1",
+            (table_name, user_id)
+        ).fetchone():
+            return True
+        source = storage_table(table_name, table_layouts(self.conn))
+        if self.conn.execute(f"SELECT 1 FROM {source} WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is None:
+            return False
+        hashed = backfill_row_hashes(self.conn, [table_name], [user_id], commit=False)
+        self.backfilled[table_name] = self.backfilled.get(table_name, 0) + hashed.get(table_name, 0)
+        return True
+
+    def _known(self, table_name, user_id, hashes):
+        known = set()
+        for start in range(0, len(hashes), LOOKUP_CHUNK):
+            chunk = hashes[start:start + LOOKUP_CHUNK]
+            known.update(row[0] for row in self.conn.execute(
+                f"SELECT row_hash FROM ingest_row_hashes WHERE table_name = ? AND user_id = ? "
+                f"AND row_hash IN ({', '.join('?' for _ in chunk)})",
+                [table_name, user_id] + chunk
+            ))
+        return known
+
+    def new_rows(self, table_name, user_id, params):
+        """params whose hash is not stored yet; their hashes are recorded in the
+        caller's transaction. params rows are [user_id, value, ...]"""
+        if table_name not in self.seeded:
+            self.seeded[table_name] = self._seed(table_name, user_id)
+        counts = self.occurrences.setdefault(table_name, {})
+        hashes = []
+        for values in params:
+            key = content_key(values[1:])
+            first = row_hash(key)
+            occurrence = counts.get(first, 0)
+            counts[first] = occurrence + 1
+            hashes.append(row_hash(key, occurrence) if occurrence else first)
+        known = self._known(table_name, user_id, hashes) if self.seeded[table_name] else ()
+        fresh = [(values, value_hash) for values, value_hash in zip(params, hashes) if value_hash not in known]
+        self.skipped[table_name] = self.skipped.get(table_name, 0) + len(params) - len(fresh)
+        # Sorted, so the inserts walk the index in order
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO ingest_row_hashes (table_name, user_id, row_hash) VALUES (?, ?, ?)",
+            [(table_name, user_id, value_hash) for value_hash in sorted(value_hash for _, value_hash in fresh)]
+        )
+        return [values for values, _ in fresh]
+
+
+def backfill_row_hashes(conn, tables=None, user_ids=None, verbose=False, commit=True):
+    """Replace the stored hashes of tables (all export tables) from their rows
+
+    Lets a database loaded without --differential switch to differential
+    re-ingest. Hashes match the export only for rows loaded without
+    --normalize, which rewrites values. With commit=False each table is
+    left in the caller's transaction. Returns {table: rows hashed}.
+    """
+    ensure_row_hashes(conn)
+    columns_by_table = hashed_tables()
+    layouts = table_layouts(conn)
+    hashed = {}
+    for table_name in tables or list(columns_by_table):
+        columns = columns_by_table[table_name]
+        # Encoded tables are views; the key is declared on <table>_enc
+        info = conn.execute(f"PRAGMA table_info({storage_table(table_name, layouts)})").fetchall()
+        if not info:
+            continue
+        primary_key = next((row[1] for row in info if row[5]), 'rowid')
+        scope = ''
+        params = [table_name]
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            scope = f" AND user_id IN ({', '.join('?' for _ in user_ids)})"
+            params += user_ids
+        started = time.perf_counter()
+        try:
+            conn.execute(f"DELETE FROM ingest_row_hashes WHERE table_name = ?{scope}", params)
+            counts = {}
+            total = 0
+            cursor = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table_name} WHERE 1{scope} ORDER BY user_id, {primary_key}",
+                params[1:]
+            )
+            while True:
+                rows = cursor.fetchmany(LOOKUP_CHUNK * 10)
+                if not rows:
+                    break
+                batch = []
+                for values in rows:
+                    key = content_key(values[1:])
+                    first = row_hash(key)
+                    user_counts = counts.setdefault(values[0], {})
+                    occurrence = user_counts.get(first, 0)
+                    user_counts[first] = occurrence + 1
+                    batch.append((table_name, values[0], row_hash(key, occurrence) if occurrence else first))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ingest_row_hashes (table_name, user_id, row_hash) VALUES (?, ?, ?)",
+                    batch
+                )
+                total += len(batch)
+            if commit:
+                conn.commit()
+        except sqlite3.Error:
+            if commit:
+                conn.rollback()
+            raise
+        hashed[table_name] = total
+        if verbose and total:
+            print(f"  {table_name}: {total:,} rows hashed in {time.perf_counter() - started:.2f}s")
+    return hashed
+
+
+def main():
+    """Command line entry point: python rowHashes.py tikData.db"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Backfill row hashes for differential re-ingest')
+    parser.add_argument('db_name', nargs='?', default='tikData.db')
+    parser.add_argument('--table', action='append', dest='tables')
+    parser.add_argument('--user-id', type=int, action='append', dest='user_ids')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    from createDb import connect
+    conn = connect(args.db_name)
+    started = time.perf_counter()
+    hashed = backfill_row_hashes(conn, args.tables, args.user_ids, verbose=True)
+    print(f"Hashed {sum(hashed.values()):,} rows in {time.perf_counter() - started:.2f}s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -305,7 +305,8 @@ CREATE TABLE IF NOT EXISTS data_validation_log (
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
-CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+-- Usernames are unique: userRegistry.py upserts on this index
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
 CREATE INDEX IF NOT EXISTS idx_users_is_deleted ON users(is_deleted);
 
@@ -460,15 +461,6 @@ BEGIN
 END;
 
 
-CREATE TRIGGER IF NOT EXISTS prevent_duplicate_username
-BEFORE INSERT ON users
-FOR EACH ROW
-WHEN EXISTS (SELECT 1 FROM users WHERE username = NEW.username)
-BEGIN
-    INSERT INTO data_validation_log (table_name, user_id, column_name, issue_type, invalid_value, validation_type)
-    VALUES ('users', NEW.user_id, 'username', 'duplicate_username', NEW.username, 'data_validation');
-END;
-
 CREATE TRIGGER IF NOT EXISTS update_user_timestamp
 AFTER UPDATE ON users
 BEGIN
@@ -0,0 +1,199 @@
+import sqlite3
+import os
+import time
+import shutil
+from hashlib import blake2b
+
+from createDb import (
+    SCHEMA_SQL, PRAGMA_PROFILES, connect, profile_settings, iter_schema_statements, statement_kind,
+    is_deferred_index, is_deferred_trigger, _schema_object_name
+)
+from storageLayout import table_layouts, layout_statement
+from summaryTables import SUMMARY_SCHEMA, ensure_summary_tables
+from userRegistry import ensure_user_registry
+
+# Bump when a migration is added; PRAGMA user_version records the applied one
+SCHEMA_VERSION = 3
+
+TEMPLATE_DIR = os.environ.get(
+    'TIK_TEMPLATE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'tik-to-sql')
+)
+
+
+def _create_missing_objects(conn):
+    """Create every SCHEMA_SQL object a database lacks
+
+    Databases made by the old create_database() lost trigger bodies to its
+    split on ';'. Objects a bulk load deferred are left for finish_bulk_load().
+    """
+    mid_bulk_load = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='bulk_load_state'"
+    ).fetchone()
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    # Encoded tables are views over <table>_enc, which carries their indexes and triggers
+    layouts = table_layouts(conn)
+    for statement in iter_schema_statements():
+        if statement_kind(statement) == 'pragma' or _schema_object_name(statement) in existing:
+            continue
+        if mid_bulk_load and (is_deferred_index(statement) or is_deferred_trigger(statement)):
+            continue
+        conn.execute(layout_statement(statement, layouts))
+
+
+# (version, description, upgrade); each runs once, in order, on older databases
+MIGRATIONS = [
+    (1, 'base schema objects', _create_missing_objects),
+    (2, 'unique usernames', ensure_user_registry),
+    (3, 'summary tables', ensure_summary_tables),
+]
+
+
+def schema_fingerprint():
+    """Short hash of the schema text, so templates rebuild when it changes"""
+    digest = blake2b(digest_size=6)
+    for text in (str(SCHEMA_VERSION), SCHEMA_SQL, SUMMARY_SCHEMA):
+        digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def template_path(page_size=4096, directory=None):
+    return os.path.join(directory or TEMPLATE_DIR,
+                        f"tikData_v{SCHEMA_VERSION}_{schema_fingerprint()}_{page_size}.db")
+
+
+def schema_version(conn):
+    """Applied schema version (PRAGMA user_version); 0 for files made before versioning"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, verbose=False):
+    """Apply pending migrations in place; returns the versions applied"""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+    applied = []
+    for target, description, upgrade in MIGRATIONS:
+        if target <= version:
+            continue
+        started = time.perf_counter()
+        try:
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(target)
+        if verbose:
+            print(f"  Migrated to version {target} ({description}) in {time.perf_counter() - started:.2f}s")
+    return applied
+
+
+def build_template(path, page_size=4096):
+    """Write a fresh, fully migrated schema database to path (atomically)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    building = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(building):
+        os.remove(building)
+    # Rollback journal, so the template is one self-contained file
+    conn = connect(building, 'default', page_size=page_size, journal_mode='DELETE')
+    try:
+        conn.executescript(SCHEMA_SQL)
+        migrate(conn)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(building, path)
+    return path
+
+
+def ensure_template(page_size=4096, directory=None, rebuild=False):
+    """Path of the template for the current schema, built on first use"""
+    path = template_path(page_size, directory)
+    if rebuild or not os.path.exists(path):
+        build_template(path, page_size)
+    return path
+
+
+def _is_new_file(db_name):
+    if db_name == ':memory:' or db_name.startswith('file:'):
+        return False
+    return not os.path.exists(db_name) or os.path.getsize(db_name) == 0
+
+
+def provision_database(db_name, page_size=4096, template_dir=None):
+    """Copy the schema template to db_name if it does not exist yet
+
+    Returns True when the file was created. The copy replaces executing
+    the schema statement by statement.
+    """
+    if not _is_new_file(db_name):
+        return False
+    template = ensure_template(page_size, template_dir)
+    copying = f"{db_name}.{os.getpid()}.tmp"
+    shutil.copyfile(template, copying)
+    os.replace(copying, db_name)
+    return True
+
+
+def clone_template(conn, page_size=4096, template_dir=None):
+    """Copy the template into an open, empty connection with the backup API
+
+    For databases without a file to copy over, such as ':memory:'.
+    """
+    source = sqlite3.connect(ensure_template(page_size, template_dir))
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+
+
+def create_database(db_name, profile='default', template_dir=None, verbose=True):
+    """Create db_name from the template, or migrate an existing one in place
+
+    Returns {'created': bool, 'version': int, 'migrated': [versions]}.
+    """
+    page_size = profile_settings(profile).get('page_size', 4096)
+    started = time.perf_counter()
+    created = provision_database(db_name, page_size, template_dir)
+    conn = connect(db_name, profile)
+    try:
+        migrated = migrate(conn, verbose=verbose)
+        version = schema_version(conn)
+    finally:
+        conn.close()
+    if verbose:
+        action = 'Created' if created else ('Migrated' if migrated else 'Checked')
+        print(f"{action} {db_name} (schema version {version}) in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return {'created': created, 'version': version, 'migrated': migrated}
+
+
+def main():
+    """Command line entry point: python schemaManager.py [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Create or migrate a database from the schema template')
+    parser.add_argument('db_name', nargs='?', default='tikData.db')
+    parser.add_argument('--profile', choices=sorted(PRAGMA_PROFILES), default='default')
+    parser.add_argument('--template-dir', default=None)
+    parser.add_argument('--rebuild-template', action='store_true')
+    parser.add_argument('--status', action='store_true', help='Only report the schema version')
+    args = parser.parse_args()
+
+    if args.status:
+        if not os.path.exists(args.db_name):
+            print(f"Database {args.db_name} not found!")
+            return
+        conn = sqlite3.connect(args.db_name)
+        print(f"{args.db_name}: schema version {schema_version(conn)} (current {SCHEMA_VERSION})")
+        conn.close()
+        return
+
+    if args.rebuild_template:
+        page_size = profile_settings(args.profile).get('page_size', 4096)
+        print(f"Template: {ensure_template(page_size, args.template_dir, rebuild=True)}")
+    create_database(args.db_name, args.profile, args.template_dir)
+
+
+if __name__ == "__main__":
+    main()
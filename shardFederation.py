@@ -0,0 +1,335 @@
+import sqlite3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from createDb import connect
+from ingestDb import (
+    DEFAULT_BATCH_SIZE, PROFILE_PATH, TikTokIngester, build_user_row, open_export, stream_targets
+)
+from jsonStream import stream_paths, DEFAULT_CHUNK_SIZE
+from queryPool import READER_PRAGMAS, read_only_uri
+from summaryTables import rebuild_monthly_activity, verify_row_counts
+from userRegistry import MAX_USER_ID
+
+CATALOG_NAME = "federation.db"
+
+# SQLite's default SQLITE_MAX_ATTACHED; one fan-out query covers this many shards
+ATTACH_LIMIT = 10
+
+CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS federation_settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Which shard file holds each user; user_ids are unique across the federation
+CREATE TABLE IF NOT EXISTS shard_users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    shard_file TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_shard_users_file ON shard_users(shard_file);
+'''
+
+# How the shards' rows of a view are combined: per-user views are
+# concatenated and sorted again by the view's ORDER BY ((column, descending)
+# pairs); vw_most_liked_content keeps its overall LIMIT
+VIEW_ORDER = {
+    'vw_user_activity_summary': [],
+    'vw_monthly_activity': [('month', True), ('user_id', False), ('activity_type', False)],
+    'vw_engagement_metrics': [('total_engagement', True)],
+    'vw_date_validation_report': [('invalid_count', True), ('user_id', False)],
+    'vw_data_validation_report': [('issue_count', True), ('user_id', False)],
+    'vw_user_data_quality': [('total_issues', True)],
+    'vw_top_search_terms': [('search_count', True)],
+    'vw_most_liked_content': [('likes_count', True)],
+    'vw_user_relationships': [('user_id', False)],
+    'vw_active_users': [('created_at', True)],
+}
+VIEW_LIMITS = {'vw_most_liked_content': 100}
+
+# Views that aggregate over all users are aggregated again across shards
+VIEW_AGGREGATES = {
+    'vw_user_statistics': {
+        'total_users': sum, 'active_users': sum, 'deleted_users': sum,
+        'first_user_joined': min, 'last_user_joined': max,
+    },
+}
+GROUPED_VIEWS = {'vw_table_statistics': ('table_name', 'row_count')}
+
+
+def base_view(view):
+    """vw_x for a materialized vw_x_mat; the two have the same rows"""
+    return view[:-4] if view.endswith('_mat') else view
+
+
+def shard_file_name(user_id, range_size=None):
+    """One file per user, or per block of range_size consecutive user_ids"""
+    if not range_size:
+        return f"user_{user_id:07d}.db"
+    low = (user_id - 1) // range_size * range_size + 1
+    return f"users_{low:07d}_{low + range_size - 1:07d}.db"
+
+
+def read_profile(json_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """The export's profile object, read with an early-exit streaming pass"""
+    with open_export(json_path) as handle:
+        events = stream_paths(handle, {PROFILE_PATH: 'object'}, chunk_size)
+        profile = next(events, (None, None, None))[2]
+        events.close()
+    return profile
+
+
+def _sort_rows(rows, order):
+    # Stable sorts from the last key to the first; NULLs sort first
+    # ascending and last descending, as in SQLite
+    for column, descending in reversed(order):
+        rows.sort(key=lambda row: (row[column] is not None, row[column]), reverse=descending)
+    return rows
+
+
+def merge_view_rows(view, rows):
+    """Combine rows of view collected from several shards"""
+    view = base_view(view)
+    if view in VIEW_AGGREGATES:
+        if not rows:
+            return []
+        merged = {}
+        for column, combine in VIEW_AGGREGATES[view].items():
+            values = [row[column] for row in rows if row[column] is not None]
+            merged[column] = combine(values) if values or combine is sum else None
+        return [merged]
+    if view in GROUPED_VIEWS:
+        key, value = GROUPED_VIEWS[view]
+        totals = {}
+        for row in rows:
+            totals[row[key]] = totals.get(row[key], 0) + (row[value] or 0)
+        return [{key: name, value: total}
+                for name, total in sorted(totals.items(), key=lambda item: item[1], reverse=True)]
+    rows = _sort_rows(rows, VIEW_ORDER.get(view, []))
+    limit = VIEW_LIMITS.get(view)
+    return rows[:limit] if limit else rows
+
+
+def _query_shards(paths, view, user_ids=None):
+    """Run view on up to ATTACH_LIMIT shards through one connection (UNION ALL)"""
+    # URI filenames let every shard be attached read-only
+    conn = sqlite3.connect('file::memory:', uri=True)
+    try:
+        selects = []
+        params = []
+        for index, path in enumerate(paths):
+            alias = f"shard_{index}"
+            conn.execute("ATTACH DATABASE ? AS " + alias, (read_only_uri(path),))
+            for name, value in READER_PRAGMAS.items():
+                if name != 'temp_store':
+                    conn.execute(f"PRAGMA {alias}.{name} = {value}")
+            select = f"SELECT * FROM {alias}.{view}"
+            if user_ids is not None:
+                select += f" WHERE user_id IN ({', '.join('?' for _ in user_ids)})"
+                params.extend(user_ids)
+            selects.append(select)
+        cursor = conn.execute(' UNION ALL '.join(selects), params)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+class Federation:
+    """Per-user (or per user-id range) shard databases behind one catalog
+
+    Each shard is a complete tikData.db holding only its users, so
+    ingesting or deleting a user touches one small file. Queries fan a
+    standard view out over the shards in parallel, ATTACHing up to
+    ATTACH_LIMIT shards per connection, and merge the rows.
+    """
+
+    def __init__(self, directory, range_size=None, workers=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.catalog = connect(os.path.join(directory, CATALOG_NAME))
+        self.catalog.executescript(CATALOG_SCHEMA)
+        stored = self.catalog.execute(
+            "SELECT value FROM federation_settings WHERE name = 'range_size'"
+        ).fetchone()
+        if stored is None:
+            self.catalog.execute(
+                "INSERT INTO federation_settings (name, value) VALUES ('range_size', ?)",
+                (str(range_size or 0),)
+            )
+            self.catalog.commit()
+            self.range_size = range_size or None
+        else:
+            self.range_size = int(stored[0]) or None
+            if range_size is not None and range_size != (self.range_size or 0):
+                raise ValueError(f"{directory} is sharded by range size {self.range_size or 'per user'}, "
+                                 f"not {range_size}")
+
+    def shard_path(self, shard_file):
+        return os.path.join(self.directory, shard_file)
+
+    def shard_files(self, user_ids=None):
+        """Shard files holding user_ids (all shards when None)"""
+        sql = "SELECT DISTINCT shard_file FROM shard_users"
+        params = []
+        if user_ids is not None:
+            params = list(user_ids)
+            sql += f" WHERE user_id IN ({', '.join('?' for _ in params)})"
+        return [row[0] for row in self.catalog.execute(sql + " ORDER BY shard_file", params)]
+
+    def assign_user_id(self, username, preferred):
+        """user_id already cataloged for username, else the preferred id or the next free one"""
+        row = self.catalog.execute(
+            "SELECT user_id FROM shard_users WHERE username = ?", (username,)
+        ).fetchone()
+        if row:
+            return row[0]
+        user_id = preferred
+        while self.catalog.execute("SELECT 1 FROM shard_users WHERE user_id = ?", (user_id,)).fetchone():
+            user_id = user_id % MAX_USER_ID + 1
+        return user_id
+
+    def ingest(self, json_path, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+               verbose=True, **options):
+        """Stream one export into its user's shard and catalog it
+
+        options are passed to TikTokIngester (bulk_load, validation, fts,
+        normalize, links, epoch_dates, pragma_profile).
+        """
+        started = time.perf_counter()
+        user_row = build_user_row(read_profile(json_path, chunk_size))
+        user_id = self.assign_user_id(user_row['username'], user_row['user_id'])
+        # The catalog id is free in the shard too, so the registry keeps it
+        user_row['user_id'] = user_id
+        shard_file = shard_file_name(user_id, self.range_size)
+
+        ingester = TikTokIngester(self.shard_path(shard_file), batch_size=batch_size,
+                                  verbose=verbose, chunk_size=chunk_size, **options)
+        try:
+            ingester.reset()
+            ingester.begin_load()
+            ingester.register_user(user_row)
+            with open_export(json_path) as handle:
+                ingester.load_stream(stream_paths(handle, stream_targets(), chunk_size))
+            ingester.finish_load()
+        finally:
+            ingester.close()
+
+        self.catalog.execute(
+            "INSERT INTO shard_users (user_id, username, shard_file) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET shard_file = excluded.shard_file, "
+            "updated_at = CURRENT_TIMESTAMP",
+            (user_id, user_row['username'], shard_file)
+        )
+        self.catalog.commit()
+        result = ingester.summary()
+        result['shard_file'] = shard_file
+        result['timings']['total'] = time.perf_counter() - started
+        return result
+
+    def delete_user(self, user_id):
+        """Remove a user: drop its file, or cascade-delete it from its range shard
+
+        Returns the shard file touched, or None for an unknown user_id.
+        """
+        row = self.catalog.execute(
+            "SELECT shard_file FROM shard_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        shard_file = row[0]
+        path = self.shard_path(shard_file)
+        others = self.catalog.execute(
+            "SELECT COUNT(*) FROM shard_users WHERE shard_file = ? AND user_id != ?",
+            (shard_file, user_id)
+        ).fetchone()[0]
+        if others:
+            conn = connect(path)
+            try:
+                conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+                conn.commit()
+                rebuild_monthly_activity(conn, [user_id])
+                verify_row_counts(conn)
+            finally:
+                conn.close()
+        else:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        self.catalog.execute("DELETE FROM shard_users WHERE user_id = ?", (user_id,))
+        self.catalog.commit()
+        return shard_file
+
+    def query_view(self, view, user_ids=None):
+        """Rows of a standard view across the shards holding user_ids (all by default)"""
+        if base_view(view) not in VIEW_ORDER and base_view(view) not in VIEW_AGGREGATES \
+                and base_view(view) not in GROUPED_VIEWS:
+            raise ValueError(f"No federated merge is defined for {view}")
+        paths = [self.shard_path(name) for name in self.shard_files(user_ids)]
+        groups = [paths[start:start + ATTACH_LIMIT] for start in range(0, len(paths), ATTACH_LIMIT)]
+        if base_view(view) in VIEW_AGGREGATES or base_view(view) in GROUPED_VIEWS:
+            # These views have no user_id column; their shards were chosen above
+            user_ids = None
+        elif user_ids is not None:
+            user_ids = list(user_ids)
+        rows = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(groups)))) as pool:
+            for group_rows in pool.map(lambda group: _query_shards(group, view, user_ids), groups):
+                rows.extend(group_rows)
+        return merge_view_rows(view, rows)
+
+    def close(self):
+        self.catalog.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    """Command line entry point: python shardFederation.py shard_dir [exports...]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Per-user shard databases with federated views')
+    parser.add_argument('directory', help='Directory holding federation.db and the shards')
+    parser.add_argument('exports', nargs='*', help='user_data.json (or .zip) exports to ingest')
+    parser.add_argument('--range-size', type=int, default=None,
+                        help='Group this many consecutive user_ids per shard (default: one per user)')
+    parser.add_argument('--delete-user', type=int, action='append', default=[])
+    parser.add_argument('--view', help='Query a standard view across the shards')
+    parser.add_argument('--user-id', type=int, action='append', dest='user_ids')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--bulk-load', action='store_true')
+    args = parser.parse_intermixed_args()
+
+    with Federation(args.directory, range_size=args.range_size, workers=args.workers) as federation:
+        for json_path in args.exports:
+            if not os.path.exists(json_path):
+                print(f"Export file {json_path} not found!")
+                continue
+            result = federation.ingest(json_path, verbose=False, bulk_load=args.bulk_load)
+            print(f"Loaded {result['total_records']:,} records for {result['username']} "
+                  f"into {result['shard_file']} in {result['timings']['total']:.2f}s")
+        for user_id in args.delete_user:
+            shard_file = federation.delete_user(user_id)
+            print(f"Deleted user {user_id} from {shard_file}" if shard_file else f"User {user_id} not found!")
+        if args.view:
+            started = time.perf_counter()
+            rows = federation.query_view(args.view, args.user_ids)
+            elapsed = time.perf_counter() - started
+            for row in rows[:args.limit]:
+                print('  ' + ', '.join(f"{key}={value}" for key, value in row.items()))
+            print(f"{len(rows)} row(s) from {len(federation.shard_files(args.user_ids))} shard(s) "
+                  f"in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
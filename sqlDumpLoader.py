@@ -0,0 +1,472 @@
+import sqlite3
+import os
+import re
+import json
+import time
+
+from ingestDb import (
+    DEFAULT_DB_NAME, DEFAULT_BATCH_SIZE, VALIDATION_MODES, TikTokIngester, generate_user_id_from_username
+)
+from createDb import PRAGMA_PROFILES
+from storageLayout import table_layouts, storage_table
+from summaryTables import refresh_summaries, rebuild_monthly_activity, verify_row_counts
+from rowHashes import backfill_row_hashes
+
+DEFAULT_CHUNK_STATEMENTS = 20000
+
+CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sql_dump_checkpoints (
+    file_path TEXT PRIMARY KEY,
+    byte_offset INTEGER NOT NULL DEFAULT 0,
+    statements INTEGER NOT NULL DEFAULT 0,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    user_ids TEXT,
+    -- {table: [rowid before the first chunk, rowid after the last one, [user ids]]}
+    row_ranges TEXT,
+    status TEXT NOT NULL,
+    file_size INTEGER,
+    file_mtime REAL,
+    message TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+_INSERT_RE = re.compile(
+    r'INSERT\s+(?:OR\s+\w+\s+)?INTO\s+["`\[]?(\w+)["`\]]?\s*\(([^)]*)\)\s*VALUES\s*', re.I
+)
+# One literal and the separator after it; strings use '' for a quote
+_VALUE_RE = re.compile(
+    r"\s*(?:'([^']*(?:''[^']*)*)'|(NULL)|([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?))\s*([,)])", re.I
+)
+_INTEGER_RE = re.compile(r'[-+]?\d+$')
+_TUPLE_GAP_RE = re.compile(r'\s*([(,;])\s*')
+_DDL_RE = re.compile(r'(CREATE|DROP|ALTER)\s', re.I)
+_INSERT_TABLE_RE = re.compile(r'INSERT\s+(?:OR\s+\w+\s+)?INTO\s+["`\[]?(\w+)', re.I)
+
+
+def ensure_checkpoint_table(conn):
+    conn.executescript(CHECKPOINT_SCHEMA)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sql_dump_checkpoints)")]
+    if 'row_ranges' not in columns:
+        conn.execute("ALTER TABLE sql_dump_checkpoints ADD COLUMN row_ranges TEXT")
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+
+def iter_statements(handle, offset=0):
+    """Yield (statement, end byte offset) from a binary dump handle
+
+    Lines are joined until sqlite3.complete_statement() accepts them, so
+    ';' and newlines inside string literals stay part of their statement.
+    """
+    handle.seek(offset)
+    pending = ''
+    for line in handle:
+        offset += len(line)
+        text = line.decode('utf-8')
+        if not pending and (not text.strip() or text.lstrip().startswith('--')):
+            continue
+        pending += text
+        if sqlite3.complete_statement(pending):
+            yield pending.strip(), offset
+            pending = ''
+    if pending.strip():
+        yield pending.strip(), offset
+
+
+def _literal(match):
+    text, null, number = match.group(1, 2, 3)
+    if text is not None:
+        return text.replace("''", "'")
+    if null is not None:
+        return None
+    return int(number) if _INTEGER_RE.match(number) else float(number)
+
+
+def parse_insert(statement):
+    """(table, columns, [row tuples]) for an INSERT ... VALUES statement
+
+    Returns None for anything else, including values that are not plain
+    literals; SqlDumpLoader skips such INSERTs and runs other statements as written.
+    """
+    header = _INSERT_RE.match(statement)
+    if header is None:
+        return None
+    columns = [column.strip().strip('"`[]') for column in header.group(2).split(',')]
+    rows = []
+    pos = header.end()
+    while True:
+        gap = _TUPLE_GAP_RE.match(statement, pos)
+        if gap is None or gap.group(1) != '(':
+            return None
+        pos = gap.end()
+        values = []
+        while True:
+            match = _VALUE_RE.match(statement, pos)
+            if match is None:
+                return None
+            values.append(_literal(match))
+            pos = match.end()
+            if match.group(4) == ')':
+                break
+        if len(values) != len(columns):
+            return None
+        rows.append(tuple(values))
+        tail = _TUPLE_GAP_RE.match(statement, pos)
+        if tail is None or tail.group(1) == ';':
+            rest = statement[tail.end():] if tail else statement[pos:]
+            return (header.group(1), columns, rows) if not rest.strip() else None
+        if tail.group(1) != ',':
+            return None
+        pos = tail.end()
+
+
+class SqlDumpLoader:
+    """Load the tiktok_data.sql dumps written by tiktok-extractor.js
+
+    Consecutive single-row INSERTs are parsed in Python and grouped per
+    table into executemany batches; every chunk of statements is one
+    transaction that also records the byte offset reached, so a failed or
+    interrupted load resumes after the last committed chunk. users rows go
+    through the user registry (an upsert on the unique username index) and
+    the dump's user_id values are mapped to the stored ones. A dump that
+    changed since (or restart=True) starts over after unload() removed the
+    rows its earlier attempt committed.
+    """
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, batch_size=DEFAULT_BATCH_SIZE,
+                 chunk_statements=DEFAULT_CHUNK_STATEMENTS, execute_ddl=False, verbose=True, **options):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.chunk_statements = chunk_statements
+        # The dump's CREATE statements describe the extractor's own schema;
+        # the target database already has the full one
+        self.execute_ddl = execute_ddl
+        self.verbose = verbose
+        self.ingester = TikTokIngester(db_name, batch_size=batch_size, verbose=verbose, **options)
+        self.table_columns = {}
+        self.user_ids = {}
+        self.row_ranges = {}
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def _columns(self, conn, table):
+        """Insertable columns of table (None if it is not in the schema)"""
+        if table not in self.table_columns:
+            layouts = table_layouts(conn)
+            info = conn.execute(f"PRAGMA table_info({storage_table(table, layouts)})").fetchall()
+            # The surrogate key is assigned here, not taken from the dump
+            keys = {row[1] for row in info if row[5] and table != 'users'}
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            self.table_columns[table] = [column for column in columns if column not in keys] or None
+        return self.table_columns[table]
+
+    def _load_checkpoint(self, conn, path, signature, restart):
+        row = conn.execute(
+            "SELECT byte_offset, statements, row_count, user_ids, status, file_size, file_mtime, row_ranges "
+            "FROM sql_dump_checkpoints WHERE file_path = ?", (path,)
+        ).fetchone()
+        self.row_ranges = {}
+        if row is None:
+            return 0, 0, 0, {}, None
+        if restart or tuple(row[5:7]) != signature:
+            if not self.unload(conn, path):
+                return row[0], row[1], row[2], {}, 'refused'
+            return 0, 0, 0, {}, None
+        self.row_ranges = json.loads(row[7] or '{}')
+        user_ids = {int(key): value for key, value in json.loads(row[3] or '{}').items()}
+        return row[0], row[1], row[2], user_ids, row[4]
+
+    def unload(self, conn, path):
+        """Delete the rows earlier loads of path committed and recount the summaries
+
+        Rows are found by the rowid range each table grew by and the users
+        that loaded them, so the dump can be loaded again from the start.
+        Statements run verbatim (UPDATE, DELETE, --ddl) are not undone.
+        Returns False, changing nothing, when the checkpoint predates the
+        recorded ranges.
+        """
+        row = conn.execute(
+            "SELECT row_count, row_ranges FROM sql_dump_checkpoints WHERE file_path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return True
+        if row[1] is None and row[0]:
+            self.log(f"  {path} has {row[0]:,} rows from an earlier load that cannot be told apart; "
+                     f"run the unchanged dump again to resume, or remove them before restarting")
+            return False
+        ranges = json.loads(row[1] or '{}')
+        layouts = table_layouts(conn)
+        users = set()
+        try:
+            for table, (after, through, user_ids) in ranges.items():
+                if through <= after or not user_ids:
+                    continue
+                conn.execute(
+                    f"DELETE FROM {storage_table(table, layouts)} WHERE rowid > ? AND rowid <= ? "
+                    f"AND user_id IN ({', '.join('?' for _ in user_ids)})",
+                    [after, through] + user_ids
+                )
+                users.update(user_ids)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        if users:
+            users = sorted(users)
+            refresh_summaries(conn, users)
+            rebuild_monthly_activity(conn, users)
+            verify_row_counts(conn, list(ranges))
+            # Hashes cannot be matched to rows; rehash what the users have left
+            for table in ranges:
+                hashed = [user_id for user_id in users if conn.execute(
+                    "SELECT 1 FROM ingest_row_hashes WHERE table_name = ? AND user_id = ? LIMIT 1",
+                    (table, user_id)
+                ).fetchone()] if _has_table(conn, 'ingest_row_hashes') else []
+                if hashed:
+                    backfill_row_hashes(conn, [table], hashed)
+            self.log(f"  Removed {row[0]:,} rows loaded earlier from {os.path.basename(path)}")
+        # Last, so an interrupted unload is simply run again
+        conn.execute("DELETE FROM sql_dump_checkpoints WHERE file_path = ?", (path,))
+        conn.commit()
+        return True
+
+    def _save_checkpoint(self, conn, path, signature, offset, statements, rows, status, message=None):
+        conn.execute(
+            "INSERT INTO sql_dump_checkpoints "
+            "(file_path, byte_offset, statements, row_count, user_ids, row_ranges, status, file_size, "
+            "file_mtime, message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(file_path) DO UPDATE SET byte_offset = excluded.byte_offset, "
+            "statements = excluded.statements, row_count = excluded.row_count, "
+            "user_ids = excluded.user_ids, row_ranges = excluded.row_ranges, status = excluded.status, "
+            "file_size = excluded.file_size, file_mtime = excluded.file_mtime, message = excluded.message, "
+            "updated_at = CURRENT_TIMESTAMP",
+            (path, offset, statements, rows, json.dumps(self.user_ids), json.dumps(self.row_ranges), status,
+             signature[0], signature[1], message)
+        )
+
+    def _register_user(self, conn, columns, values):
+        known = self._columns(conn, 'users')
+        row = {column: value for column, value in zip(columns, values) if column in known}
+        if not row.get('username'):
+            raise ValueError('users insert without a username')
+        dump_id = row.get('user_id')
+        if dump_id is None:
+            row['user_id'] = generate_user_id_from_username(row['username'])
+        user_id = self.ingester.register_user(row)
+        if dump_id is not None:
+            self.user_ids[dump_id] = user_id
+        return user_id
+
+    def load(self, dump_path, restart=False):
+        """Load one dump file; returns a summary dict"""
+        path = os.path.abspath(dump_path)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        ingester = self.ingester
+        ingester.reset()
+        conn = ingester.connect()
+        ensure_checkpoint_table(conn)
+
+        offset, statements, total_rows, self.user_ids, status = self._load_checkpoint(
+            conn, path, signature, restart)
+        if status == 'done':
+            self.log(f"{dump_path} was already loaded ({total_rows:,} rows)")
+            return self._summary(statements, total_rows, 0, 'done', offset)
+        if status == 'refused':
+            return self._summary(0, 0, 0, 'refused', 0, 'rows of an earlier load cannot be removed')
+        if offset:
+            self.log(f"Resuming {dump_path} at byte {offset:,} ({statements:,} statements loaded)")
+        if self.user_ids:
+            # The current user is whoever the dump registered last
+            ingester.user_id = list(self.user_ids.values())[-1]
+        layouts = table_layouts(conn)
+        ingester.begin_load()
+
+        started = time.perf_counter()
+        resumed_rows = total_rows
+        pending = {}
+        chunk_counts = {}
+        user_counts = {}
+        chunk_size = 0
+        verbatim = 0
+        dropped = {}
+        refused = {}
+
+        def flush(key):
+            table, columns, user_id = key
+            rows = pending.pop(key)
+            if table not in self.row_ranges:
+                last = conn.execute(
+                    f"SELECT COALESCE(MAX(rowid), 0) FROM {storage_table(table, layouts)}").fetchone()[0]
+                self.row_ranges[table] = [last, last, []]
+            if user_id not in self.row_ranges[table][2]:
+                self.row_ranges[table][2].append(user_id)
+            ingester.user_id = user_id
+            inserted = ingester.insert_batch(table, columns, rows)
+            chunk_counts[table] = chunk_counts.get(table, 0) + inserted
+            counts = user_counts.setdefault(user_id, {})
+            counts[table] = counts.get(table, 0) + inserted
+
+        def commit_chunk(end, report=True):
+            nonlocal chunk_counts, user_counts, chunk_size, statements, total_rows, committed
+            for key in list(pending):
+                flush(key)
+            # A chunk can hold rows of several users
+            ingester.record_deltas(chunk_counts, user_counts)
+            for table in chunk_counts:
+                self.row_ranges[table][1] = conn.execute(
+                    f"SELECT COALESCE(MAX(rowid), 0) FROM {storage_table(table, layouts)}").fetchone()[0]
+            loaded = sum(chunk_counts.values())
+            self._save_checkpoint(conn, path, signature, end, statements + chunk_size,
+                                  total_rows + loaded, 'running')
+            conn.commit()
+            statements += chunk_size
+            total_rows += loaded
+            committed = end
+            chunk_counts = {}
+            user_counts = {}
+            chunk_size = 0
+            if not report:
+                return
+            elapsed = time.perf_counter() - started
+            rate = (total_rows - resumed_rows) / elapsed if elapsed else 0
+            self.log(f"  {end / max(signature[0], 1):6.1%}  {statements:,} statements, "
+                     f"{total_rows:,} rows ({rate:,.0f} rows/s)")
+
+        end = committed = previous = offset
+        try:
+            with open(path, 'rb') as handle:
+                for statement, end in iter_statements(handle, offset):
+                    start, previous = previous, end
+                    chunk_size += 1
+                    parsed = parse_insert(statement)
+                    if parsed is None:
+                        if _DDL_RE.match(statement) and not self.execute_ddl:
+                            continue
+                        insert = _INSERT_TABLE_RE.match(statement)
+                        if insert:
+                            # Rows we cannot read would miss the user id mapping and the
+                            # summaries, FTS and row hashes kept per inserted batch
+                            refused[insert.group(1)] = refused.get(insert.group(1), 0) + 1
+                            continue
+                        for key in list(pending):
+                            flush(key)
+                        conn.execute(statement)
+                        verbatim += 1
+                        continue
+                    table, columns, rows = parsed
+                    if table == 'users':
+                        # The registry commits, so close the chunk before it
+                        chunk_size -= 1
+                        commit_chunk(start, report=False)
+                        for values in rows:
+                            self._register_user(conn, columns, values)
+                        total_rows += len(rows)
+                        chunk_size += 1
+                        continue
+                    known = self._columns(conn, table)
+                    if known is None:
+                        dropped[table] = dropped.get(table, 0) + len(rows)
+                        continue
+                    if 'user_id' not in columns:
+                        raise ValueError(f"{table} insert without a user_id column")
+                    user_index = columns.index('user_id')
+                    kept = [(index, column) for index, column in enumerate(columns)
+                            if column in known and column != 'user_id']
+                    insert_columns = ('user_id',) + tuple(column for _, column in kept)
+                    for values in rows:
+                        user_id = self.user_ids.get(values[user_index], values[user_index])
+                        key = (table, insert_columns, user_id)
+                        batch = pending.setdefault(key, [])
+                        batch.append({column: values[index] for index, column in kept})
+                        if len(batch) >= self.batch_size:
+                            flush(key)
+                    if chunk_size >= self.chunk_statements:
+                        commit_chunk(end)
+                commit_chunk(end)
+        except (sqlite3.Error, ValueError) as e:
+            conn.rollback()
+            if ingester.storage is not None:
+                ingester.storage.reset()
+            # Keep the offset of the last committed chunk for the next run
+            self._save_checkpoint(conn, path, signature, committed, statements, total_rows, 'failed', str(e))
+            conn.commit()
+            self.log(f"  Failed after {statements:,} statements: {e}")
+            self.log("  Run again to resume from the last committed chunk")
+            return self._summary(statements, total_rows, time.perf_counter() - started, 'failed', committed,
+                                 str(e), dropped, verbatim, refused)
+
+        ingester.finish_load()
+        self._save_checkpoint(conn, path, signature, end, statements, total_rows, 'done')
+        conn.commit()
+        return self._summary(statements, total_rows, time.perf_counter() - started, 'done', end,
+                             None, dropped, verbatim, refused)
+
+    def _summary(self, statements, rows, seconds, status, offset, error=None, dropped=None, verbatim=0,
+                 refused=None):
+        return {
+            'status': status,
+            'statements': statements,
+            'rows': rows,
+            'byte_offset': offset,
+            'seconds': seconds,
+            'statistics': dict(self.ingester.statistics),
+            'user_ids': dict(self.user_ids),
+            'dropped': dict(dropped or {}),
+            'verbatim': verbatim,
+            # INSERT statements skipped because their values are not plain literals
+            'refused': dict(refused or {}),
+            'error': error
+        }
+
+    def close(self):
+        self.ingester.close()
+
+
+def main():
+    """Command line entry point: python sqlDumpLoader.py tiktok_data.sql [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load a tiktok_data.sql dump from the browser extractor')
+    parser.add_argument('dump_path', help='SQL file written by downloadSQL/exportInChunks')
+    parser.add_argument('db_name', nargs='?', default=DEFAULT_DB_NAME)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--chunk-statements', type=int, default=DEFAULT_CHUNK_STATEMENTS,
+                        help='Statements per transaction (and per resume checkpoint)')
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Build indexes and run validation after loading instead of per row')
+    parser.add_argument('--validation', choices=VALIDATION_MODES, default='triggers')
+    parser.add_argument('--pragmas', choices=sorted(PRAGMA_PROFILES), default=None)
+    parser.add_argument('--ddl', action='store_true', help="Also execute the dump's CREATE statements")
+    parser.add_argument('--restart', action='store_true',
+                        help='Remove the rows loaded from this dump earlier and start over')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dump_path):
+        print(f"Dump file {args.dump_path} not found!")
+        return
+
+    loader = SqlDumpLoader(args.db_name, batch_size=args.batch_size, chunk_statements=args.chunk_statements,
+                           execute_ddl=args.ddl, bulk_load=args.bulk_load, validation=args.validation,
+                           pragma_profile=args.pragmas)
+    try:
+        result = loader.load(args.dump_path, restart=args.restart)
+    finally:
+        loader.close()
+
+    for table, count in sorted(result['dropped'].items()):
+        print(f"  Skipped {count:,} rows for {table} (not in the schema)")
+    for table, count in sorted(result['refused'].items()):
+        print(f"  Skipped {count:,} INSERT statement(s) for {table} (values are not plain literals)")
+    print(f"\n{result['status'].capitalize()}: {result['rows']:,} rows from {result['statements']:,} "
+          f"statements in {result['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,652 @@
+import sqlite3
+import os
+import re
+import time
+from datetime import date
+
+# table: link column stored as an id into the links dictionary
+LINK_COLUMNS = {
+    'posts': 'video_link',
+    'liked_videos': 'video_link',
+    'favorite_videos': 'video_link',
+    'reposts': 'video_link',
+    'share_history': 'shared_link',
+    'watched_lives': 'live_link',
+}
+
+# Bookkeeping timestamps stay text; users is upserted by userRegistry and stays a table
+EPOCH_EXCLUDED_COLUMNS = ('created_at', 'updated_at')
+EPOCH_EXCLUDED_TABLES = ('users',)
+
+LOOKUP_CHUNK = 500
+
+STORAGE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS links (
+    link_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    video_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS storage_layout (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, column_name)
+);
+'''
+
+# Video id of a share link, the same value normalizer.extract_video_hash() gives
+_SHARE_PREFIX = 'https://www.tiktokv.com/share/video/'
+VIDEO_ID_SQL = (
+    "CASE WHEN {url} GLOB '" + _SHARE_PREFIX + "[0-9]*' "
+    "AND rtrim(substr({url}, " + str(len(_SHARE_PREFIX) + 1) + "), '/') NOT GLOB '*[^0-9]*' "
+    "THEN rtrim(substr({url}, " + str(len(_SHARE_PREFIX) + 1) + "), '/') END"
+)
+
+# Epoch dates: the two formats the ingester writes become Unix seconds (UTC);
+# anything else is stored as given so validation can log it
+EPOCH_MIN = -2208988800  # 1900-01-01
+EPOCH_MAX = 4102444800  # 2100-01-01
+EPOCH_SQL = (
+    "CASE WHEN typeof({value}) = 'text' "
+    "AND ({value} GLOB '????-??-?? ??:??:??' OR {value} GLOB '????-??-??') "
+    "AND strftime('%s', {value}) IS NOT NULL "
+    "THEN CAST(strftime('%s', {value}) AS INTEGER) ELSE {value} END"
+)
+DATETIME_SQL = "CASE WHEN typeof({value}) = 'integer' THEN datetime({value}, 'unixepoch') ELSE {value} END"
+EPOCH_CHECK = (
+    "{column} IS NOT NULL AND {column} != '' "
+    f"AND (typeof({{column}}) != 'integer' OR {{column}} NOT BETWEEN {EPOCH_MIN} AND {EPOCH_MAX})"
+)
+
+_DAY_TEXT_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_TRIGGER_DATE_RE = re.compile(r'WHEN\s*\(\s*NEW\.(\w+) IS NOT NULL.*?\)\s*BEGIN', re.S)
+_day_cache = {}
+
+
+def encoded_table(table):
+    return f"{table}_enc"
+
+
+def link_id_column(column):
+    return f"{column}_id"
+
+
+def table_layouts(conn):
+    """{table: {column: encoding}} for every table stored in encoded form"""
+    has_layout = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='storage_layout'"
+    ).fetchone()
+    if not has_layout:
+        return {}
+    layouts = {}
+    for table, column, encoding in conn.execute(
+            "SELECT table_name, column_name, encoding FROM storage_layout ORDER BY table_name"):
+        layouts.setdefault(table, {})[column] = encoding
+    return layouts
+
+
+def storage_table(table, layouts):
+    """Physical table holding a logical table's rows"""
+    return encoded_table(table) if table in layouts else table
+
+
+def is_epoch_column(table, column, layouts):
+    return layouts.get(table, {}).get(column) == 'epoch'
+
+
+def date_columns():
+    """{table: [TIMESTAMP columns]} of the schema that can be stored as epoch seconds"""
+    from createDb import iter_schema_statements, statement_kind, _schema_object_name
+
+    columns = {}
+    for statement in iter_schema_statements():
+        if statement_kind(statement) != 'table':
+            continue
+        table = _schema_object_name(statement)
+        if table in EPOCH_EXCLUDED_TABLES or table.endswith('_validation_log'):
+            continue
+        names = [name for name in re.findall(r'^\s+(\w+)\s+TIMESTAMP\b', statement, re.M)
+                 if name not in EPOCH_EXCLUDED_COLUMNS]
+        if names:
+            columns[table] = names
+    return columns
+
+
+def _day_seconds(text):
+    """Unix seconds of a 'YYYY-MM-DD' day, or None; cached per calendar day"""
+    seconds = _day_cache.get(text)
+    if seconds is None:
+        match = _DAY_TEXT_RE.fullmatch(text)
+        if not match:
+            return None
+        year, month, day = (int(part) for part in match.groups())
+        # Years outside datetime's range (such as 0000) stay text for validation to flag
+        if not 1 <= year <= 9999 or not 1 <= month <= 12 or not 1 <= day <= 31:
+            return None
+        # Day overflow rolls into the next month like SQLite's strftime('%s')
+        ordinal = date(year, month, 1).toordinal() + day - 1
+        seconds = _day_cache[text] = (ordinal - _EPOCH_ORDINAL) * 86400
+    return seconds
+
+
+def to_epoch(value):
+    """Unix seconds for 'YYYY-MM-DD[ HH:MM:SS]' text (as UTC); other values unchanged"""
+    if not isinstance(value, str):
+        return value
+    if len(value) == 10:
+        seconds = _day_seconds(value)
+        return value if seconds is None else seconds
+    if len(value) != 19 or value[10] != ' ' or value[13] != ':' or value[16] != ':':
+        return value
+    seconds = _day_seconds(value[:10])
+    hour, minute, second = value[11:13], value[14:16], value[17:19]
+    if seconds is None or not (hour + minute + second).isdecimal():
+        return value
+    hour, minute, second = int(hour), int(minute), int(second)
+    if hour > 24 or minute > 59 or second > 59:
+        return value
+    return seconds + hour * 3600 + minute * 60 + second
+
+
+def _columns(conn, table):
+    """[(name, is primary key)] in declaration order"""
+    return [(row[1], bool(row[5])) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _physical_column(column, layout):
+    return link_id_column(column) if layout.get(column) == 'link' else column
+
+
+def _encoded_value(column, layout, prefix):
+    """SQL turning a plain value of source prefix into its stored form"""
+    value = f"{prefix}.{column}"
+    encoding = layout.get(column)
+    if encoding == 'link':
+        return f"(SELECT link_id FROM links WHERE url = {value})"
+    if encoding == 'epoch':
+        return EPOCH_SQL.format(value=value)
+    return value
+
+
+def _decoded_value(column, layout, prefix):
+    """SQL turning a stored value of physical table prefix back into plain form"""
+    encoding = layout.get(column)
+    if encoding == 'link':
+        return f"(SELECT url FROM links WHERE link_id = {prefix}.{link_id_column(column)})"
+    if encoding == 'epoch':
+        return DATETIME_SQL.format(value=f"{prefix}.{column}")
+    return f"{prefix}.{column}"
+
+
+def _intern_sql(column, source):
+    """Add the link values of source (a table, or NEW in a trigger) missing from links"""
+    if source == 'NEW':
+        value = f"NEW.{column}"
+        return (
+            f"INSERT OR IGNORE INTO links (url, video_id) "
+            f"SELECT {value}, {VIDEO_ID_SQL.format(url=value)} WHERE {value} IS NOT NULL"
+        )
+    return (
+        f"INSERT OR IGNORE INTO links (url, video_id) "
+        f"SELECT DISTINCT {column}, {VIDEO_ID_SQL.format(url=column)} "
+        f"FROM {source} WHERE {column} IS NOT NULL"
+    )
+
+
+def _encoded_table_sql(plain_sql, table, layout):
+    create = re.sub(rf'\b{table}\b', encoded_table(table), plain_sql, count=1)
+    for column, encoding in layout.items():
+        if encoding == 'link':
+            create = re.sub(rf'\b{column}\s+TEXT\b',
+                            f'{link_id_column(column)} INTEGER REFERENCES links(link_id)', create)
+        elif encoding == 'epoch':
+            create = re.sub(rf'\b{column}\s+TIMESTAMP\b', f'{column} INTEGER', create)
+    return create
+
+
+def plain_table_sql(conn, table, layouts):
+    """CREATE TABLE statement of a table in its plain (unencoded) form"""
+    layout = layouts.get(table)
+    name = encoded_table(table) if layout else table
+    create = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name = ?", (name,)
+    ).fetchone()[0]
+    if not layout:
+        return create
+    create = re.sub(rf'\b{name}\b', table, create, count=1)
+    for column, encoding in layout.items():
+        if encoding == 'link':
+            create = re.sub(rf'\b{link_id_column(column)}\s+INTEGER REFERENCES links\(link_id\)',
+                            f'{column} TEXT', create)
+        elif encoding == 'epoch':
+            create = re.sub(rf'\b{column}\s+INTEGER\b', f'{column} TIMESTAMP', create)
+    return create
+
+
+def _view_ddl(table, columns, layout):
+    select_list = []
+    joins = []
+    for index, (column, _) in enumerate(columns):
+        if layout.get(column) == 'link':
+            alias = f"l{index}"
+            select_list.append(f"{alias}.url AS {column}")
+            joins.append(f"LEFT JOIN links {alias} ON {alias}.link_id = e.{link_id_column(column)}")
+        elif layout.get(column) == 'epoch':
+            select_list.append(f"{_decoded_value(column, layout, 'e')} AS {column}")
+        else:
+            select_list.append(f"e.{column}")
+    return (
+        f"CREATE VIEW {table} AS SELECT {', '.join(select_list)} "
+        f"FROM {encoded_table(table)} e {' '.join(joins)}"
+    )
+
+
+def _trigger_ddl(table, columns, layout):
+    """INSTEAD OF triggers so the view accepts writes like the original table"""
+    physical = encoded_table(table)
+    primary_key = next(column for column, is_key in columns if is_key)
+    interns = ' '.join(f"{_intern_sql(column, 'NEW')};" for column, _ in columns
+                       if layout.get(column) == 'link')
+    names = [column for column, _ in columns]
+    insert_columns = ', '.join(_physical_column(column, layout) for column in names)
+    insert_values = ', '.join(_encoded_value(column, layout, 'NEW') for column in names)
+    assignments = ', '.join(
+        f"{_physical_column(column, layout)} = {_encoded_value(column, layout, 'NEW')}" for column in names
+    )
+    return [
+        f"CREATE TRIGGER {table}_insert INSTEAD OF INSERT ON {table} BEGIN {interns} "
+        f"INSERT INTO {physical} ({insert_columns}) VALUES ({insert_values}); END",
+        f"CREATE TRIGGER {table}_update INSTEAD OF UPDATE ON {table} BEGIN {interns} "
+        f"UPDATE {physical} SET {assignments} WHERE {primary_key} = OLD.{primary_key}; END",
+        f"CREATE TRIGGER {table}_delete INSTEAD OF DELETE ON {table} BEGIN "
+        f"DELETE FROM {physical} WHERE {primary_key} = OLD.{primary_key}; END",
+    ]
+
+
+def _retarget(statement, source, target):
+    return re.sub(rf'\bON\s+{source}(?=[\s(])', f'ON {target}', statement)
+
+
+def layout_statement(statement, layouts):
+    """Fit a schema index or trigger statement to the storage layout
+
+    Encoded tables are views, which cannot carry indexes or BEFORE
+    triggers, so those live on the <table>_enc table instead. Date checks
+    on epoch columns become numeric bounds checks.
+    """
+    for table, layout in layouts.items():
+        retargeted = _retarget(statement, table, encoded_table(table))
+        if retargeted == statement:
+            continue
+        statement = retargeted
+        match = _TRIGGER_DATE_RE.search(statement)
+        if match and layout.get(match.group(1)) == 'epoch':
+            check = EPOCH_CHECK.format(column=f"NEW.{match.group(1)}")
+            statement = statement[:match.start()] + f"WHEN ({check})\nBEGIN" + statement[match.end():]
+    return statement
+
+
+def _dependent_objects(conn, table):
+    """(name, CREATE statement) of the indexes and triggers defined on a table"""
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+        "AND tbl_name = ? AND sql IS NOT NULL ORDER BY type, name", (table,)
+    ).fetchall()
+
+
+def _schema_statements():
+    """Index and trigger DDL of the schema by name"""
+    from createDb import iter_schema_statements, statement_kind, _schema_object_name
+
+    return {
+        _schema_object_name(statement): statement for statement in iter_schema_statements()
+        if statement_kind(statement) in ('index', 'trigger')
+    }
+
+
+def set_table_layout(conn, table, layout):
+    """Store table with exactly the given {column: encoding} ({} = plain)
+
+    Rows are copied into the new physical table in one transaction. An
+    encoded table lives in <table>_enc and <table> becomes a view with
+    INSTEAD OF triggers, so existing readers and writers keep working.
+    Indexes and triggers are recreated on the physical table. Returns the
+    number of rows copied, or None if the layout was already in place.
+    """
+    conn.executescript(STORAGE_SCHEMA)
+    layouts = table_layouts(conn)
+    current = layouts.get(table, {})
+    if current == layout:
+        return None
+    new_layouts = {name: value for name, value in layouts.items() if name != table}
+    if layout:
+        new_layouts[table] = layout
+    old_physical = storage_table(table, layouts)
+    new_physical = storage_table(table, new_layouts)
+    schema = _schema_statements()
+
+    conn.commit()
+    try:
+        conn.execute("BEGIN")
+        plain_sql = plain_table_sql(conn, table, layouts)
+        # Logical columns from <table>; views report no primary key, the physical table does
+        primary_key = next(name for name, is_key in _columns(conn, old_physical) if is_key)
+        columns = [(name, name == primary_key) for name, _ in _columns(conn, table)]
+        names = [name for name, _ in columns]
+        own_indexes = {f"idx_{old_physical}_{link_id_column(column)}" for column in current}
+        dependents = [(name, sql) for name, sql in _dependent_objects(conn, old_physical)
+                      if name not in own_indexes]
+
+        if current:
+            # Decode into a scratch table so the new layout starts from plain values
+            decoded = ', '.join(f"{_decoded_value(name, current, 'e')} AS {name}" for name in names)
+            conn.execute(
+                f"CREATE TEMP TABLE layout_rows AS SELECT {decoded} FROM {old_physical} e ORDER BY e.rowid"
+            )
+            for suffix in ('insert', 'update', 'delete'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+            conn.execute(f"DROP VIEW {table}")
+            conn.execute(f"DROP TABLE {old_physical}")
+            source = 'temp.layout_rows'
+        else:
+            source = table
+
+        if layout:
+            for column, encoding in layout.items():
+                if encoding == 'link':
+                    conn.execute(_intern_sql(column, source))
+            conn.execute(_encoded_table_sql(plain_sql, table, layout))
+        else:
+            conn.execute(plain_sql)
+        cursor = conn.execute(
+            f"INSERT INTO {new_physical} ({', '.join(_physical_column(name, layout) for name in names)}) "
+            f"SELECT {', '.join(_encoded_value(name, layout, 't') for name in names)} "
+            f"FROM {source} t ORDER BY t.rowid"
+        )
+        copied = cursor.rowcount
+        conn.execute(f"DROP TABLE {source}")
+
+        for name, sql in dependents:
+            if name in schema:
+                conn.execute(layout_statement(schema[name], new_layouts))
+            else:
+                conn.execute(_retarget(sql, old_physical, new_physical))
+        if layout:
+            for column, encoding in layout.items():
+                if encoding == 'link':
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{new_physical}_{link_id_column(column)} "
+                        f"ON {new_physical}({link_id_column(column)})"
+                    )
+            conn.execute(_view_ddl(table, columns, layout))
+            for statement in _trigger_ddl(table, columns, layout):
+                conn.execute(statement)
+
+        conn.execute("DELETE FROM storage_layout WHERE table_name = ?", (table,))
+        conn.executemany(
+            "INSERT INTO storage_layout (table_name, column_name, encoding) VALUES (?, ?, ?)",
+            [(table, column, encoding) for column, encoding in layout.items()]
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return copied
+
+
+def _change_layouts(conn, changes, verbose):
+    """Apply {table: layout} with set_table_layout(); returns {table: rows copied}"""
+    copied = {}
+    for table, layout in changes.items():
+        started = time.perf_counter()
+        count = set_table_layout(conn, table, layout)
+        if count is None:
+            continue
+        copied[table] = count
+        if verbose:
+            print(f"  {table}: {count:,} rows rewritten in {time.perf_counter() - started:.2f}s")
+    return copied
+
+
+def enable_link_encoding(conn, tables=None, verbose=False):
+    """Store link columns as ids into the links table
+
+    Rows move to <table>_enc with an integer link id in place of the URL
+    text and <table> becomes a view that joins the URL back.
+    Returns {table: rows copied}.
+    """
+    layouts = table_layouts(conn)
+    changes = {}
+    for table in tables or list(LINK_COLUMNS):
+        if table not in LINK_COLUMNS:
+            raise ValueError(f"No link column is defined for {table}")
+        changes[table] = dict(layouts.get(table, {}), **{LINK_COLUMNS[table]: 'link'})
+    return _change_layouts(conn, changes, verbose)
+
+
+def disable_link_encoding(conn, tables=None, verbose=False):
+    """Turn link ids back into URL text columns"""
+    layouts = table_layouts(conn)
+    changes = {
+        table: {column: encoding for column, encoding in layouts[table].items() if encoding != 'link'}
+        for table in tables or list(layouts) if table in layouts
+    }
+    copied = _change_layouts(conn, changes, verbose)
+    prune_links(conn)
+    return copied
+
+
+def enable_epoch_dates(conn, tables=None, verbose=False):
+    """Store the date columns of tables (every dated table by default) as Unix seconds
+
+    The view renders them back as 'YYYY-MM-DD HH:MM:SS' text, while range
+    filters on <table>_enc compare integers on the same *_user_date indexes.
+    Returns {table: rows copied}.
+    """
+    columns = date_columns()
+    layouts = table_layouts(conn)
+    changes = {}
+    for table in tables or list(columns):
+        if table not in columns:
+            raise ValueError(f"{table} has no date columns to encode")
+        changes[table] = dict(layouts.get(table, {}), **{column: 'epoch' for column in columns[table]})
+    return _change_layouts(conn, changes, verbose)
+
+
+def disable_epoch_dates(conn, tables=None, verbose=False):
+    """Turn epoch date columns back into TIMESTAMP text"""
+    layouts = table_layouts(conn)
+    changes = {
+        table: {column: encoding for column, encoding in layouts[table].items() if encoding != 'epoch'}
+        for table in tables or list(layouts) if table in layouts
+    }
+    return _change_layouts(conn, changes, verbose)
+
+
+def prune_links(conn):
+    """Delete links no encoded table refers to; returns the number removed"""
+    layouts = table_layouts(conn)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='links'").fetchone():
+        return 0
+    references = [
+        f"SELECT {link_id_column(column)} FROM {encoded_table(table)}"
+        for table, layout in layouts.items() for column, encoding in layout.items() if encoding == 'link'
+    ]
+    if references:
+        sql = f"DELETE FROM links WHERE link_id NOT IN ({' UNION '.join(references)})"
+    else:
+        sql = "DELETE FROM links"
+    cursor = conn.execute(sql)
+    conn.commit()
+    return cursor.rowcount
+
+
+def insert_select(conn, table, columns, source, layouts):
+    """(target table, target columns, select expressions) to copy rows of source into table
+
+    Link values of source are interned first so an encoded table is filled
+    with one INSERT ... SELECT instead of row by row through its view.
+    The caller owns the transaction.
+    """
+    layout = layouts.get(table)
+    if not layout:
+        return table, list(columns), list(columns)
+    for column in columns:
+        if layout.get(column) == 'link':
+            conn.execute(_intern_sql(column, source))
+    return (
+        encoded_table(table),
+        [_physical_column(column, layout) for column in columns],
+        [_encoded_value(column, layout, source) for column in columns],
+    )
+
+
+class LinkDictionary:
+    """url -> link_id with an in-process cache; new URLs are interned in batches"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cache = {}
+
+    def clear(self):
+        """Forget cached ids (after a rollback they may not exist)"""
+        self.cache.clear()
+
+    def _prefetch(self, urls):
+        for start in range(0, len(urls), LOOKUP_CHUNK):
+            chunk = urls[start:start + LOOKUP_CHUNK]
+            placeholders = ', '.join('?' for _ in chunk)
+            self.cache.update(self.conn.execute(
+                f"SELECT url, link_id FROM links WHERE url IN ({placeholders})", chunk
+            ))
+
+    def ids(self, urls):
+        """link_id for each URL (None stays None); the caller owns the transaction"""
+        missing = list({url for url in urls if url is not None and url not in self.cache})
+        if missing:
+            self._prefetch(missing)
+            missing = [url for url in missing if url not in self.cache]
+            if missing:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO links (url, video_id) VALUES (?1, {VIDEO_ID_SQL.format(url='?1')})",
+                    [(url,) for url in missing]
+                )
+                self._prefetch(missing)
+        cache = self.cache
+        return [None if url is None else cache[url] for url in urls]
+
+
+class StorageEncoder:
+    """Rewrites ingester batches for tables stored in encoded form"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.layouts = table_layouts(conn)
+        self.links = LinkDictionary(conn)
+
+    def reset(self):
+        self.links.clear()
+
+    def encode(self, table, columns, params):
+        """(physical table, physical columns, params) for one executemany batch"""
+        layout = self.layouts[table]
+        for index, column in enumerate(columns):
+            encoding = layout.get(column)
+            if encoding == 'link':
+                urls = [values[index] for values in params]
+                ids = self.links.ids([url if url is None or isinstance(url, str) else str(url) for url in urls])
+                for values, link_id in zip(params, ids):
+                    values[index] = link_id
+            elif encoding == 'epoch':
+                for values in params:
+                    values[index] = to_epoch(values[index])
+        return encoded_table(table), [_physical_column(column, layout) for column in columns], params
+
+
+def _table_bytes(conn, tables):
+    """Bytes used by tables and their indexes, or None without the dbstat module"""
+    try:
+        sizes = {}
+        for table in tables:
+            names = [table] + [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name = ?", (table,)
+            )]
+            placeholders = ', '.join('?' for _ in names)
+            sizes[table] = conn.execute(
+                f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({placeholders})", names
+            ).fetchone()[0]
+        return sizes
+    except sqlite3.OperationalError:
+        return None
+
+
+def storage_report(conn, tables=None):
+    """[(table, layout, rows, bytes)] for the encodable tables and the links dictionary"""
+    layouts = table_layouts(conn)
+    tables = [storage_table(table, layouts) for table in tables or sorted(set(LINK_COLUMNS) | set(layouts))]
+    has_links = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='links'").fetchone()
+    if has_links:
+        tables.append('links')
+    sizes = _table_bytes(conn, tables) or {}
+    report = []
+    for table in tables:
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if table == 'links':
+            layout = 'dictionary'
+        elif table.endswith('_enc'):
+            layout = '+'.join(sorted(set(layouts[table[:-len('_enc')]].values())))
+        else:
+            layout = 'plain'
+        report.append((table, layout, rows, sizes.get(table)))
+    return report
+
+
+def main():
+    """Command line entry point: python storageLayout.py tikData.db"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Switch tables between plain and encoded storage')
+    parser.add_argument('db_name')
+    parser.add_argument('--encode-links', action='store_true', help='Store link columns as ids into links')
+    parser.add_argument('--decode-links', action='store_true', help='Restore plain URL text columns')
+    parser.add_argument('--epoch-dates', action='store_true', help='Store date columns as Unix seconds')
+    parser.add_argument('--text-dates', action='store_true', help='Restore TIMESTAMP text date columns')
+    parser.add_argument('--table', action='append', dest='tables')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM afterwards to return freed pages')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    from createDb import connect
+    conn = connect(args.db_name)
+    if args.encode_links:
+        print("Encoding link columns...")
+        enable_link_encoding(conn, args.tables, verbose=True)
+    if args.decode_links:
+        print("Decoding link columns...")
+        disable_link_encoding(conn, args.tables, verbose=True)
+    if args.epoch_dates:
+        print("Storing date columns as epoch seconds...")
+        enable_epoch_dates(conn, args.tables, verbose=True)
+    if args.text_dates:
+        print("Restoring text date columns...")
+        disable_epoch_dates(conn, args.tables, verbose=True)
+    if args.vacuum:
+        started = time.perf_counter()
+        conn.execute("VACUUM")
+        print(f"Vacuumed in {time.perf_counter() - started:.2f}s")
+
+    print(f"\n{'Table':<26} {'Layout':<12} {'Rows':>10} {'Size':>12}")
+    for table, layout, rows, size in storage_report(conn, args.tables):
+        size_text = f"{size / 1024:,.0f} KB" if size is not None else 'n/a'
+        print(f"{table:<26} {layout:<12} {rows:>10,} {size_text:>12}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
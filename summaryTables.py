@@ -0,0 +1,441 @@
+import sqlite3
+import os
+import time
+
+from createDb import SCHEMA_SQL, iter_schema_statements, statement_kind, _schema_object_name, connect
+from storageLayout import table_layouts, storage_table, is_epoch_column
+
+# Counter column in user_activity_counts for each counted table
+ACTIVITY_COLUMNS = {
+    'posts': 'total_posts',
+    'comments': 'total_comments',
+    'liked_videos': 'total_likes',
+    'followers': 'total_followers',
+    'following': 'total_following',
+    'searches': 'total_searches',
+    'live_sessions': 'total_lives',
+}
+
+# Event date and activity_type of every dated table in the monthly rollup
+# (the first four keep the activity_type names of vw_monthly_activity)
+MONTHLY_SOURCES = {
+    'posts': ('post_date', 'posts'),
+    'comments': ('comment_date', 'comments'),
+    'liked_videos': ('like_date', 'likes'),
+    'searches': ('search_date', 'searches'),
+    'direct_messages': ('message_date', 'direct_messages'),
+    'group_chats': ('message_date', 'group_chats'),
+    'followers': ('follow_date', 'followers'),
+    'following': ('follow_date', 'following'),
+    'login_history': ('login_date', 'logins'),
+    'coin_purchases': ('purchase_date', 'coin_purchases'),
+    'favorite_collections': ('favorite_date', 'favorite_collections'),
+    'favorite_videos': ('favorite_date', 'favorite_videos'),
+    'favorite_effects': ('effect_date', 'favorite_effects'),
+    'favorite_hashtags': ('favorite_date', 'favorite_hashtags'),
+    'favorite_sounds': ('favorite_date', 'favorite_sounds'),
+    'blocked_users': ('block_date', 'blocked_users'),
+    'deleted_posts': ('delete_date', 'deleted_posts'),
+    'live_sessions': ('live_start_time', 'live_sessions'),
+    'watched_lives': ('watch_time', 'watched_lives'),
+    'live_comments': ('comment_time', 'live_comments'),
+    'reposts': ('repost_date', 'reposts'),
+    'share_history': ('share_date', 'shares'),
+    'sent_gifts': ('send_date', 'sent_gifts'),
+    'purchased_gifts': ('purchase_date', 'purchased_gifts'),
+    'product_browsing': ('browsing_date', 'product_browsing'),
+}
+
+# Tables listed by vw_table_statistics
+TABLE_STATISTICS_TABLES = [
+    'users', 'posts', 'comments', 'liked_videos', 'followers', 'following', 'searches', 'login_history'
+]
+
+SUMMARY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS user_activity_counts (
+    user_id INTEGER PRIMARY KEY,
+    total_posts INTEGER NOT NULL DEFAULT 0,
+    total_comments INTEGER NOT NULL DEFAULT 0,
+    total_likes INTEGER NOT NULL DEFAULT 0,
+    total_followers INTEGER NOT NULL DEFAULT 0,
+    total_following INTEGER NOT NULL DEFAULT 0,
+    total_searches INTEGER NOT NULL DEFAULT 0,
+    total_lives INTEGER NOT NULL DEFAULT 0,
+    last_login TIMESTAMP,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Same columns as vw_user_activity_summary, read from the counters
+CREATE VIEW IF NOT EXISTS vw_user_activity_summary_mat AS
+SELECT
+    u.user_id,
+    u.username,
+    u.display_name,
+    u.follower_count,
+    u.following_count,
+    COALESCE(a.total_posts, 0) as total_posts,
+    COALESCE(a.total_comments, 0) as total_comments,
+    COALESCE(a.total_likes, 0) as total_likes,
+    COALESCE(a.total_followers, 0) as total_followers,
+    COALESCE(a.total_following, 0) as total_following,
+    a.last_login,
+    COALESCE(a.total_searches, 0) as total_searches,
+    COALESCE(a.total_lives, 0) as total_lives,
+    u.created_at,
+    u.updated_at
+FROM users u
+LEFT JOIN user_activity_counts a ON a.user_id = u.user_id
+WHERE u.is_deleted = 0;
+
+-- Same columns as vw_engagement_metrics, read from the counters
+CREATE VIEW IF NOT EXISTS vw_engagement_metrics_mat AS
+SELECT
+    u.user_id,
+    u.username,
+    COALESCE(a.total_posts, 0) as posts,
+    COALESCE(a.total_comments, 0) as comments,
+    COALESCE(a.total_likes, 0) as likes,
+    COALESCE(a.total_followers, 0) as followers,
+    COALESCE(a.total_following, 0) as following,
+    COALESCE(a.total_searches, 0) as searches,
+    COALESCE(a.total_lives, 0) as lives,
+    COALESCE(a.total_posts, 0) + COALESCE(a.total_comments, 0) + COALESCE(a.total_likes, 0) as total_engagement
+FROM users u
+LEFT JOIN user_activity_counts a ON a.user_id = u.user_id
+WHERE u.is_deleted = 0
+ORDER BY total_engagement DESC;
+
+-- Rows per user, calendar month and activity type; rows whose date does
+-- not parse have no month and are left out
+CREATE TABLE IF NOT EXISTS monthly_activity (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    activity_type TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, activity_type)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_monthly_activity_month ON monthly_activity(month, activity_type);
+
+CREATE VIEW IF NOT EXISTS vw_monthly_activity_mat AS
+SELECT user_id, month, activity_type, count
+FROM monthly_activity
+ORDER BY month DESC, user_id, activity_type;
+
+-- Row count of every data table, kept current by the ingester
+CREATE TABLE IF NOT EXISTS table_row_counts (
+    table_name TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    verified_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Same rows as vw_table_statistics; users still leaves out soft-deleted
+-- rows, found through idx_users_is_deleted
+CREATE VIEW IF NOT EXISTS vw_table_statistics_mat AS
+SELECT
+    table_name,
+    CASE WHEN table_name = 'users'
+         THEN row_count - (SELECT COUNT(*) FROM users WHERE is_deleted = 1)
+         ELSE row_count END as row_count
+FROM table_row_counts
+WHERE table_name IN ('users', 'posts', 'comments', 'liked_videos', 'followers', 'following', 'searches', 'login_history')
+ORDER BY row_count DESC;
+'''
+
+SUMMARY_VIEWS = {
+    'vw_user_activity_summary': 'vw_user_activity_summary_mat',
+    'vw_engagement_metrics': 'vw_engagement_metrics_mat',
+    'vw_monthly_activity': 'vw_monthly_activity_mat',
+    'vw_table_statistics': 'vw_table_statistics_mat',
+}
+
+LAST_LOGIN_SQL = "(SELECT MAX(login_date) FROM login_history l WHERE l.user_id = {user_id})"
+
+
+def ensure_summary_tables(conn):
+    """Create the summary tables and views; new tables are filled from scratch
+
+    Returns True when any summary was (re)built.
+    """
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' "
+        "AND name IN ('user_activity_counts', 'monthly_activity', 'table_row_counts')"
+    )}
+    conn.executescript(SUMMARY_SCHEMA)
+    if 'user_activity_counts' not in existing:
+        refresh_summaries(conn)
+    if 'monthly_activity' not in existing:
+        rebuild_monthly_activity(conn)
+    if 'table_row_counts' not in existing:
+        verify_row_counts(conn)
+    return len(existing) < 3
+
+
+def summary_view(name, materialized=True):
+    """View to query for name: the live view or its materialized counterpart"""
+    return SUMMARY_VIEWS[name] if materialized else name
+
+
+def record_activity(conn, user_id, table_counts):
+    """Add per-table row deltas for one user; the caller owns the transaction
+
+    Runs in the same transaction as the inserted rows, so the counters stay
+    in step with the tables without rescanning them.
+    """
+    deltas = {ACTIVITY_COLUMNS[t]: n for t, n in table_counts.items() if t in ACTIVITY_COLUMNS and n}
+    if not deltas and not table_counts.get('login_history'):
+        return
+    columns = list(deltas)
+    assignments = [f"{column} = {column} + excluded.{column}" for column in columns]
+    if table_counts.get('login_history'):
+        columns.append('last_login')
+        assignments.append("last_login = excluded.last_login")
+    assignments.append("refreshed_at = CURRENT_TIMESTAMP")
+    values = [deltas[column] for column in deltas]
+    selects = ['?'] * len(values)
+    if 'last_login' in columns:
+        selects.append(LAST_LOGIN_SQL.format(user_id='?'))
+        values.append(user_id)
+    conn.execute(
+        f"INSERT INTO user_activity_counts (user_id, {', '.join(columns)}) "
+        f"SELECT ?, {', '.join(selects)} WHERE true "
+        f"ON CONFLICT(user_id) DO UPDATE SET {', '.join(assignments)}",
+        [user_id] + values
+    )
+
+
+def _month_rows_sql(table, scope, layouts):
+    """Monthly counts read from the physical table (integer dates when epoch-encoded)"""
+    column, activity_type = MONTHLY_SOURCES[table]
+    if is_epoch_column(table, column, layouts):
+        month = f"strftime('%Y-%m', {column}, 'unixepoch')"
+    else:
+        month = f"strftime('%Y-%m', {column})"
+    return (
+        f"SELECT user_id, {month}, '{activity_type}', COUNT(*) FROM {storage_table(table, layouts)} "
+        f"WHERE {scope} AND {month} IS NOT NULL GROUP BY user_id, {month}"
+    )
+
+
+def record_monthly(conn, table_counts):
+    """Fold newly inserted rows into monthly_activity; the caller owns the transaction
+
+    table_counts holds the rows each table received in the current
+    transaction. A single writer appends them with increasing rowids, so
+    they are the top rows of each table and only that rowid range is read.
+    """
+    layouts = table_layouts(conn)
+    for table, count in table_counts.items():
+        if table not in MONTHLY_SOURCES or not count:
+            continue
+        # Encoded tables are views without rowids; read their physical table
+        scope = f"rowid > (SELECT MAX(rowid) FROM {storage_table(table, layouts)}) - {int(count)}"
+        conn.execute(
+            f"INSERT INTO monthly_activity (user_id, month, activity_type, count) "
+            f"{_month_rows_sql(table, scope, layouts)} "
+            f"ON CONFLICT(user_id, month, activity_type) DO UPDATE SET count = count + excluded.count"
+        )
+
+
+def rebuild_monthly_activity(conn, user_ids=None):
+    """Recompute monthly_activity from every dated table (or only user_ids)"""
+    scope = '1'
+    params = []
+    if user_ids is not None:
+        params = list(user_ids)
+        scope = f"user_id IN ({', '.join('?' for _ in params)})"
+
+    layouts = table_layouts(conn)
+    started = time.perf_counter()
+    try:
+        conn.execute(f"DELETE FROM monthly_activity WHERE {scope}", params)
+        for table in MONTHLY_SOURCES:
+            conn.execute(
+                f"INSERT INTO monthly_activity (user_id, month, activity_type, count) "
+                f"{_month_rows_sql(table, scope, layouts)}",
+                params
+            )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return time.perf_counter() - started
+
+
+def monthly_series(conn, user_id=None, activity_types=None):
+    """[(month, activity_type, count)] from the rollup, oldest month first"""
+    clauses = []
+    params = []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if activity_types:
+        clauses.append(f"activity_type IN ({', '.join('?' for _ in activity_types)})")
+        params.extend(activity_types)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    return conn.execute(
+        f"SELECT month, activity_type, SUM(count) FROM monthly_activity {where} "
+        f"GROUP BY month, activity_type ORDER BY month, activity_type",
+        params
+    ).fetchall()
+
+
+def counted_tables():
+    """Data tables of the schema tracked in table_row_counts"""
+    return [
+        _schema_object_name(statement) for statement in iter_schema_statements(SCHEMA_SQL)
+        if statement_kind(statement) == 'table'
+        and not _schema_object_name(statement).endswith('_validation_log')
+    ]
+
+
+def record_row_counts(conn, table_counts):
+    """Add inserted row counts to the catalog; the caller owns the transaction"""
+    conn.executemany(
+        "INSERT INTO table_row_counts (table_name, row_count) VALUES (?, ?) "
+        "ON CONFLICT(table_name) DO UPDATE SET row_count = row_count + excluded.row_count, "
+        "updated_at = CURRENT_TIMESTAMP",
+        [(table, count) for table, count in table_counts.items() if count]
+    )
+
+
+def verify_row_counts(conn, tables=None, fix=True):
+    """Recount tables with COUNT(*) and compare with the catalog
+
+    Returns [(table, catalog_count, actual_count)] for the tables that were
+    off; with fix=True the catalog is corrected and marked verified.
+    """
+    catalog = dict(conn.execute("SELECT table_name, row_count FROM table_row_counts"))
+    mismatches = []
+    try:
+        for table in tables or counted_tables():
+            actual = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if catalog.get(table) != actual:
+                mismatches.append((table, catalog.get(table), actual))
+            if fix:
+                conn.execute(
+                    "INSERT INTO table_row_counts (table_name, row_count, verified_at) "
+                    "VALUES (?, ?, CURRENT_TIMESTAMP) "
+                    "ON CONFLICT(table_name) DO UPDATE SET row_count = excluded.row_count, "
+                    "verified_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP",
+                    (table, actual)
+                )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return mismatches
+
+
+def table_statistics(conn, materialized=True):
+    """[(table_name, row_count)] as in vw_table_statistics, from the catalog by default"""
+    return conn.execute(f"SELECT * FROM {summary_view('vw_table_statistics', materialized)}").fetchall()
+
+
+def refresh_summaries(conn, user_ids=None):
+    """Recount the summaries of user_ids (every user when None) from the tables
+
+    Each count is an index range scan on (user_id, date), so refreshing a
+    few changed users costs only their own rows.
+    """
+    counts = ', '.join(
+        f"(SELECT COUNT(*) FROM {table} t WHERE t.user_id = u.user_id)"
+        for table in ACTIVITY_COLUMNS
+    )
+    scope = ''
+    params = []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        scope = f"WHERE u.user_id IN ({', '.join('?' for _ in user_ids)})"
+        params = user_ids
+
+    started = time.perf_counter()
+    try:
+        if user_ids is None:
+            conn.execute("DELETE FROM user_activity_counts")
+        conn.execute(
+            f"INSERT OR REPLACE INTO user_activity_counts "
+            f"(user_id, {', '.join(ACTIVITY_COLUMNS.values())}, last_login) "
+            f"SELECT u.user_id, {counts}, {LAST_LOGIN_SQL.format(user_id='u.user_id')} "
+            f"FROM users u {scope}",
+            params
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return time.perf_counter() - started
+
+
+def activity_summary(conn, materialized=True, user_ids=None):
+    """Rows of vw_user_activity_summary, from the counters unless materialized=False"""
+    return _query_view(conn, summary_view('vw_user_activity_summary', materialized), user_ids)
+
+
+def engagement_metrics(conn, materialized=True, user_ids=None):
+    """Rows of vw_engagement_metrics, from the counters unless materialized=False"""
+    return _query_view(conn, summary_view('vw_engagement_metrics', materialized), user_ids)
+
+
+def _query_view(conn, view, user_ids):
+    sql = f"SELECT * FROM {view}"
+    params = []
+    if user_ids is not None:
+        params = list(user_ids)
+        sql += f" WHERE user_id IN ({', '.join('?' for _ in params)})"
+    cursor = conn.execute(sql, params)
+    columns = [description[0] for description in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def main():
+    """Command line entry point: python summaryTables.py [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh or query the materialized activity summaries')
+    parser.add_argument('db_name', nargs='?', default='tikData.db')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Recount the activity counters and rebuild monthly_activity')
+    parser.add_argument('--user-id', type=int, action='append', dest='user_ids',
+                        help='Limit refresh or output to these users')
+    parser.add_argument('--live', action='store_true', help='Query the live views instead')
+    parser.add_argument('--verify-counts', action='store_true',
+                        help='Recount every table and correct table_row_counts')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    conn = connect(args.db_name, 'analytics')
+    if args.verify_counts:
+        ensure_summary_tables(conn)
+        started = time.perf_counter()
+        mismatches = verify_row_counts(conn)
+        for table, expected, actual in mismatches:
+            print(f"  {table}: catalog {expected}, actual {actual:,}")
+        print(f"Verified {len(counted_tables())} tables in {time.perf_counter() - started:.3f}s, "
+              f"{len(mismatches)} corrected")
+        conn.close()
+        return
+
+    if not ensure_summary_tables(conn) and args.refresh:
+        elapsed = refresh_summaries(conn, args.user_ids)
+        print(f"Refreshed activity counters in {elapsed:.3f}s")
+        elapsed = rebuild_monthly_activity(conn, args.user_ids)
+        print(f"Rebuilt monthly_activity in {elapsed:.3f}s")
+
+    started = time.perf_counter()
+    rows = engagement_metrics(conn, materialized=not args.live, user_ids=args.user_ids)
+    elapsed = time.perf_counter() - started
+    for row in rows[:20]:
+        print(f"  {row['username']}: {row['total_engagement']:,} engagements "
+              f"({row['posts']} posts, {row['comments']} comments, {row['likes']} likes)")
+    print(f"{len(rows)} user(s) from {'live' if args.live else 'materialized'} view in {elapsed:.3f}s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import sqlite3
+
+MAX_USER_ID = 1000000
+LOOKUP_CHUNK = 500
+
+
+def _username_index_is_unique(conn):
+    for row in conn.execute("PRAGMA index_list(users)"):
+        if row[1] == 'idx_users_username':
+            return bool(row[2])
+    return False
+
+
+def _user_foreign_keys(conn):
+    """(table, column) pairs that reference users.user_id"""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    references = []
+    for table in tables:
+        for row in conn.execute(f"PRAGMA foreign_key_list({table})"):
+            if row[2] == 'users':
+                references.append((table, row[3]))
+    return references
+
+
+def merge_duplicate_users(conn):
+    """Fold rows sharing a username into the one with the lowest user_id
+
+    Child rows are re-pointed before the duplicates are deleted (the
+    foreign keys cascade on delete) and empty profile columns of the kept
+    row are filled from the merged ones. Returns the number of rows merged.
+    """
+    duplicates = conn.execute(
+        "SELECT username, MIN(user_id) FROM users GROUP BY username HAVING COUNT(*) > 1"
+    ).fetchall()
+    if not duplicates:
+        return 0
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")
+               if row[1] not in ('user_id', 'username', 'created_at', 'updated_at')]
+    references = _user_foreign_keys(conn)
+    merged = 0
+    for username, keep_id in duplicates:
+        others = [row[0] for row in conn.execute(
+            "SELECT user_id FROM users WHERE username = ? AND user_id != ? ORDER BY user_id",
+            (username, keep_id)
+        )]
+        placeholders = ', '.join('?' for _ in others)
+        for table, column in references:
+            conn.execute(
+                f"UPDATE {table} SET {column} = ? WHERE {column} IN ({placeholders})",
+                [keep_id] + others
+            )
+        assignments = ', '.join(
+            f"{column} = COALESCE({column}, (SELECT {column} FROM users o "
+            f"WHERE o.user_id IN ({placeholders}) AND o.{column} IS NOT NULL ORDER BY o.user_id LIMIT 1))"
+            for column in columns
+        )
+        conn.execute(f"UPDATE users SET {assignments} WHERE user_id = ?",
+                     others * len(columns) + [keep_id])
+        conn.execute(f"DELETE FROM users WHERE user_id IN ({placeholders})", others)
+        merged += len(others)
+    return merged
+
+
+def ensure_user_registry(conn):
+    """Upgrade an older database to a unique username index
+
+    Databases created before usernames were unique may hold duplicates
+    (the old trigger only logged them), so those are merged first.
+    """
+    if _username_index_is_unique(conn):
+        return 0
+    try:
+        merged = merge_duplicate_users(conn)
+        conn.execute("DROP TRIGGER IF EXISTS prevent_duplicate_username")
+        conn.execute("DROP INDEX IF EXISTS idx_users_username")
+        conn.execute("CREATE UNIQUE INDEX idx_users_username ON users(username)")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return merged
+
+
+class UserRegistry:
+    """Register users by username with upserts and an in-process id cache
+
+    A username always maps to the user_id it was first stored with, so
+    re-ingesting an export updates that row instead of creating another.
+    New users keep their hashed id unless another username already owns
+    it, in which case the next free id is taken.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cache = {}
+        # Rows the last register_many() call inserted (the rest were updates)
+        self.inserted = 0
+        ensure_user_registry(conn)
+
+    def lookup(self, username):
+        """user_id stored for username, or None"""
+        if username not in self.cache:
+            row = self.conn.execute(
+                "SELECT user_id FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.cache[username] = row[0]
+        return self.cache[username]
+
+    def forget(self):
+        """Drop cached ids, e.g. after rolling back uncommitted registrations"""
+        self.cache = {}
+        self.inserted = 0
+
+    def _prefetch(self, usernames):
+        missing = [name for name in usernames if name not in self.cache]
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            placeholders = ', '.join('?' for _ in chunk)
+            self.cache.update(self.conn.execute(
+                f"SELECT username, user_id FROM users WHERE username IN ({placeholders})", chunk
+            ))
+
+    def _free_id(self, user_id, claimed):
+        """user_id itself, or the next id not used by the table or this batch"""
+        while user_id in claimed or self.conn.execute(
+                "SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone():
+            user_id = user_id % MAX_USER_ID + 1
+        return user_id
+
+    def register(self, user_row, commit=True):
+        """Insert or refresh one users row; returns its user_id"""
+        return self.register_many([user_row], commit)[user_row['username']]
+
+    def register_many(self, user_rows, commit=True):
+        """Insert or refresh many users rows in one transaction
+
+        Rows for the same username are merged (later non-null values win).
+        With commit=False the rows stay in the caller's transaction, so it
+        can record them in the same commit; if it rolls back, it must call
+        forget(). Returns {username: user_id}.
+        """
+        rows = {}
+        for user_row in user_rows:
+            merged = rows.setdefault(user_row['username'], {})
+            merged.update({k: v for k, v in user_row.items() if v is not None or k not in merged})
+
+        self._prefetch(list(rows))
+        claimed = set()
+        updates = {}
+        inserts = {}
+        for username, row in rows.items():
+            known = self.cache.get(username)
+            if known is None:
+                row['user_id'] = self._free_id(row['user_id'], claimed)
+                claimed.add(row['user_id'])
+                target = inserts
+            else:
+                row['user_id'] = known
+                target = updates
+            columns = tuple(column for column in row if row[column] is not None)
+            target.setdefault(columns, []).append(row)
+
+        conn = self.conn
+        try:
+            for columns, group in updates.items():
+                assignments = ', '.join(f"{c} = ?" for c in columns if c not in ('user_id', 'username'))
+                if assignments:
+                    conn.executemany(
+                        f"UPDATE users SET {assignments} WHERE user_id = ?",
+                        [[row[c] for c in columns if c not in ('user_id', 'username')] + [row['user_id']]
+                         for row in group]
+                    )
+            for columns, group in inserts.items():
+                # ON CONFLICT covers a concurrent writer registering the same username
+                assignments = ', '.join(f"{c} = excluded.{c}" for c in columns
+                                        if c not in ('user_id', 'username'))
+                conflict = f"DO UPDATE SET {assignments}" if assignments else "DO NOTHING"
+                conn.executemany(
+                    f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                    f"ON CONFLICT(username) {conflict}",
+                    [[row[c] for c in columns] for row in group]
+                )
+            if commit:
+                conn.commit()
+        except sqlite3.Error:
+            if commit:
+                conn.rollback()
+            raise
+
+        self.inserted = sum(len(group) for group in inserts.values())
+        if inserts:
+            # Read back stored ids: a conflicting insert keeps the other writer's id
+            self._prefetch([row['username'] for group in inserts.values() for row in group])
+        return {username: self.cache.get(username, row['user_id']) for username, row in rows.items()}
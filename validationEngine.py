@@ -0,0 +1,217 @@
+import os
+import time
+
+from storageLayout import table_layouts, storage_table, encoded_table, layout_statement, is_epoch_column, EPOCH_CHECK
+
+# (table, column, primary key, trigger) for each validate_*_date trigger
+DATE_VALIDATION_RULES = [
+    ('posts', 'post_date', 'post_id', 'validate_post_date'),
+    ('comments', 'comment_date', 'comment_id', 'validate_comment_date'),
+    ('direct_messages', 'message_date', 'message_id', 'validate_message_date'),
+    ('liked_videos', 'like_date', 'like_id', 'validate_like_date'),
+    ('login_history', 'login_date', 'login_id', 'validate_login_date'),
+    ('searches', 'search_date', 'search_id', 'validate_search_date'),
+]
+
+# Per-row triggers the engine replaces
+VALIDATION_TRIGGERS = [rule[3] for rule in DATE_VALIDATION_RULES] + ['validate_user_data']
+
+# Same checks as the trigger WHEN clauses; {column} is filled per rule
+DATE_FORMAT_CONDITION = """{column} IS NOT NULL
+              AND {column} != ''
+              AND {column} NOT GLOB '????-??-?? ??:??:??'
+              AND {column} NOT GLOB '????-??-??T??:??:??*'
+              AND {column} NOT GLOB '????-??-??'"""
+
+
+def date_rule(table, column, primary_key, trigger=None):
+    """Rule logging badly formatted dates of one column to date_validation_log
+
+    Epoch-encoded columns (storageLayout.py) get a numeric bounds check instead.
+    """
+    return {
+        'name': f"{table}.{column}",
+        'table': table,
+        'column': column,
+        'trigger': trigger,
+        'condition': DATE_FORMAT_CONDITION.format(column=column),
+        'epoch_condition': EPOCH_CHECK.format(column=column),
+        'sql': f'''
+            INSERT INTO date_validation_log (table_name, user_id, column_name, invalid_value, row_id, validation_type)
+            SELECT '{table}', user_id, '{column}', {column}, {primary_key}, 'format_validation'
+            FROM {{source}} AS t
+            WHERE {{scope}} AND {{condition}}
+        '''
+    }
+
+
+def data_rule(name, column, issue_type, condition):
+    """Rule on the users table logging to data_validation_log"""
+    return {
+        'name': name,
+        'table': 'users',
+        'column': column,
+        'trigger': 'validate_user_data',
+        'condition': f"({condition})",
+        'sql': f'''
+            INSERT INTO data_validation_log (table_name, user_id, column_name, issue_type, invalid_value, validation_type)
+            SELECT 'users', user_id, '{column}', '{issue_type}', {column}, 'data_validation'
+            FROM {{source}} AS t
+            WHERE {{scope}} AND {{condition}}
+        '''
+    }
+
+
+VALIDATION_RULES = [date_rule(*rule) for rule in DATE_VALIDATION_RULES] + [
+    data_rule('users.username_length', 'username', 'length_validation',
+              "LENGTH(username) < 3 OR LENGTH(username) > 50"),
+    data_rule('users.email_format', 'email', 'format_validation',
+              "email IS NOT NULL AND email != '' AND email NOT LIKE '%_@_%._%'"),
+]
+
+
+def validated_tables(rules=None):
+    """Tables checked by a rule set"""
+    return sorted({rule['table'] for rule in (rules or VALIDATION_RULES)})
+
+
+def all_date_column_rules(conn):
+    """Date rules for every TIMESTAMP column, not only the six with triggers"""
+    rules = []
+    # Encoded tables are checked under their logical (view) name
+    layouts = table_layouts(conn)
+    logical = {encoded_table(table): table for table in layouts}
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' "
+        "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '%validation_log'"
+    )]
+    for table in tables:
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        if 'user_id' not in [row[1] for row in info]:
+            # Bookkeeping tables such as table_row_counts; the log is per user
+            continue
+        primary_key = next((row[1] for row in info if row[5]), 'rowid')
+        for row in info:
+            is_date = row[2].upper() == 'TIMESTAMP' or is_epoch_column(logical.get(table), row[1], layouts)
+            if is_date and row[1] not in ('created_at', 'updated_at'):
+                rules.append(date_rule(logical.get(table, table), row[1], primary_key))
+    return rules
+
+
+def row_watermarks(conn, rules=None):
+    """Highest rowid per validated data table; pass as since= to check only newer rows
+
+    users is left out: its rowid is the hashed user_id, not insertion order.
+    Scope it with run_validation(users_before=...) instead.
+    """
+    layouts = table_layouts(conn)
+    return {
+        table: conn.execute(
+            f"SELECT COALESCE(MAX(rowid), 0) FROM {storage_table(table, layouts)}"
+        ).fetchone()[0]
+        for table in validated_tables(rules) if table != 'users'
+    }
+
+
+def run_validation(conn, since=None, user_ids=None, rules=None, verbose=False, users_before=None):
+    """Run every rule as one INSERT ... SELECT pass and time it
+
+    since limits each table to rows with rowid above its watermark,
+    users_before (a table of user_id) limits the users rules to users not in
+    it, and user_ids limits the scan to those users; with none of them,
+    whole tables are checked. Returns [{'rule', 'table', 'issues', 'seconds'}].
+    """
+    rules = rules or VALIDATION_RULES
+    since = since or {}
+    layouts = table_layouts(conn)
+    report = []
+
+    for rule in rules:
+        scope = ['1']
+        params = []
+        if rule['table'] in since:
+            scope.append('t.rowid > ?')
+            params.append(since[rule['table']])
+        if users_before and rule['table'] == 'users':
+            scope.append(f"t.user_id NOT IN (SELECT user_id FROM {users_before})")
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            scope.append(f"t.user_id IN ({', '.join('?' for _ in user_ids)})")
+            params.extend(user_ids)
+
+        started = time.perf_counter()
+        condition = rule['condition']
+        if is_epoch_column(rule['table'], rule['column'], layouts):
+            condition = rule['epoch_condition']
+        sql = rule['sql'].format(scope=' AND '.join(scope), source=storage_table(rule['table'], layouts),
+                                 condition=condition)
+        cursor = conn.execute(sql, params)
+        elapsed = time.perf_counter() - started
+        report.append({
+            'rule': rule['name'],
+            'table': rule['table'],
+            'issues': cursor.rowcount,
+            'seconds': elapsed
+        })
+        if verbose:
+            print(f"  {rule['name']}: {cursor.rowcount} issue(s) in {elapsed:.3f}s")
+
+    conn.commit()
+    return report
+
+
+def drop_validation_triggers(conn):
+    """Remove the per-row validation triggers; run_validation() takes their place"""
+    for trigger in VALIDATION_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.commit()
+
+
+def restore_validation_triggers(conn):
+    """Recreate the per-row validation triggers from the schema"""
+    from createDb import iter_schema_statements, statement_kind, _schema_object_name
+
+    layouts = table_layouts(conn)
+    for statement in iter_schema_statements():
+        if statement_kind(statement) == 'trigger' and _schema_object_name(statement) in VALIDATION_TRIGGERS:
+            conn.execute(layout_statement(statement, layouts))
+    conn.commit()
+
+
+def main():
+    """Command line entry point: python validationEngine.py [tikData.db]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Validate a TikTok database in bulk')
+    parser.add_argument('db_name', nargs='?', default='tikData.db')
+    parser.add_argument('--all-dates', action='store_true',
+                        help='Check every TIMESTAMP column, not only the trigger-covered ones')
+    parser.add_argument('--user-id', type=int, action='append', dest='user_ids')
+    parser.add_argument('--drop-triggers', action='store_true',
+                        help='Drop the per-row validation triggers after validating')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_name):
+        print(f"Database {args.db_name} not found!")
+        return
+
+    from createDb import connect
+    conn = connect(args.db_name)
+    rules = VALIDATION_RULES
+    if args.all_dates:
+        covered = {rule['name'] for rule in rules}
+        rules = rules + [rule for rule in all_date_column_rules(conn) if rule['name'] not in covered]
+
+    print(f"Running {len(rules)} validation rules on {args.db_name}...")
+    report = run_validation(conn, user_ids=args.user_ids, rules=rules, verbose=True)
+    print(f"\nTotal issues logged: {sum(item['issues'] for item in report)}")
+    print(f"Total time: {sum(item['seconds'] for item in report):.3f}s")
+
+    if args.drop_triggers:
+        drop_validation_triggers(conn)
+        print("Per-row validation triggers dropped")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()